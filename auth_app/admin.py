@@ -8,7 +8,7 @@ class UserModelInline(admin.StackedInline):
     model = UserModel
     can_delete = False
     verbose_name_plural = 'Benutzer Profil'
-    readonly_fields = ('uidb64', 'token')
+    readonly_fields = ('uidb64', 'token', 'created_at')
 
 
 class UserAdmin(BaseUserAdmin):
@@ -26,17 +26,17 @@ admin.site.register(User, UserAdmin)
 
 @admin.register(UserModel)
 class UserModelAdmin(admin.ModelAdmin):
-    list_display = ('user', 'uidb64', 'get_email', 'get_is_active')
+    list_display = ('user', 'uidb64', 'get_email', 'get_is_active', 'created_at')
     list_filter = ('user__is_active',)
     search_fields = ('user__username', 'user__email', 'token', 'uidb64')
-    readonly_fields = ('uidb64',)
+    readonly_fields = ('uidb64', 'created_at')
     
     fieldsets = (
         ('Benutzer Information', {
             'fields': ('user',)
         }),
         ('Verifizierung', {
-            'fields': ('uidb64', 'token')
+            'fields': ('uidb64', 'token', 'created_at')
         }),
     )
     
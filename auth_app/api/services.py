@@ -1,5 +1,7 @@
 import secrets
+from datetime import timedelta
 from django.conf import settings
+from django.utils import timezone
 from auth_app.models import UserModel
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth.models import User
@@ -17,6 +19,9 @@ def activate_user_account(uidb64: str, token: str):
 
     if user_model.token != token:
         raise ValueError("Invalid activation token")
+
+    if is_token_expired(user_model, 'ACTIVATION_TOKEN_TTL', 7 * 24 * 3600):
+        raise ValueError("Activation link has expired")
     
     user.is_active = True
     user.save(update_fields=['is_active'])
@@ -29,6 +34,11 @@ def activate_user_account(uidb64: str, token: str):
     return "Account activated successfully"
 
 
+def is_token_expired(user_model: UserModel, ttl_setting: str, default_ttl: int) -> bool:
+    ttl = int(getattr(settings, ttl_setting, default_ttl))
+    return user_model.created_at < timezone.now() - timedelta(seconds=ttl)
+
+
 def create_jwt_tokens(user):
     refresh = RefreshToken.for_user(user)
     return str(refresh.access_token), str(refresh)
@@ -116,10 +126,15 @@ def get_refresh_token_from_cookies(response, access_token: str):
 
 
 def create_password_reset(user: User):
+    # An inactive account's row holds its activation token; rewriting it would restart the activation TTL.
+    if not user.is_active:
+        raise ValueError("Account is not activated")
+
     token = secrets.token_urlsafe(20)
 
     obj, created = UserModel.objects.get_or_create(user=user)
     obj.token = token
+    obj.created_at = timezone.now()
     obj.save()
 
     uidb64 = str(obj.uidb64)
@@ -129,14 +144,49 @@ def create_password_reset(user: User):
 
 def confirm_password_reset(uidb64: str, token: str, new_password: str):
     try:
-        user_model = UserModel.objects.select_related('user').get(uidb64=uidb64, token=token)
+        user_model = UserModel.objects.select_related('user').get(uidb64=uidb64, token=token, user__is_active=True)
     except UserModel.DoesNotExist:
         raise ValueError("Invalid password reset link")
 
+    if is_token_expired(user_model, 'PASSWORD_RESET_TOKEN_TTL', 24 * 3600):
+        user_model.delete()
+        raise ValueError("Password reset link has expired")
+
     user = user_model.user
     user.set_password(new_password)
     user.save(update_fields=['password'])
     
     user_model.delete()
 
-    
\ No newline at end of file
+    
+
+
+def purge_expired_activations(batch_size: int) -> int:
+    ttl = int(getattr(settings, 'ACTIVATION_TOKEN_TTL', 7 * 24 * 3600))
+    # Only accounts that never logged in; deactivated accounts keep their data.
+    expired = User.objects.filter(
+        is_active=False, is_staff=False, is_superuser=False, last_login__isnull=True,
+        usermodel__created_at__lt=timezone.now() - timedelta(seconds=ttl),
+    )
+
+    purged = 0
+    while True:
+        user_ids = list(expired.values_list('id', flat=True)[:batch_size])
+        if not user_ids:
+            return purged
+        User.objects.filter(id__in=user_ids).delete()
+        purged += len(user_ids)
+
+
+def purge_expired_password_resets(batch_size: int) -> int:
+    ttl = int(getattr(settings, 'PASSWORD_RESET_TOKEN_TTL', 24 * 3600))
+    expired = UserModel.objects.filter(
+        user__is_active=True, created_at__lt=timezone.now() - timedelta(seconds=ttl))
+
+    purged = 0
+    while True:
+        pks = list(expired.values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            return purged
+        UserModel.objects.filter(pk__in=pks).delete()
+        purged += len(pks)
@@ -2,9 +2,31 @@ from django.core.mail import send_mail
 from django.conf import settings
 from django.template.loader import render_to_string
 from django.utils.html import strip_tags
+from auth_app.models import UserModel
+from .services import purge_expired_activations, purge_expired_password_resets
+from core.jobs import read_job_payload
+from core.metrics import track_job
 
 
-def send_verification_email(to_email: str, token: str, uidb64: str):
+def load_user_model_for_job(user_id: int):
+    user_model = UserModel.objects.select_related('user').only(
+        'uidb64', 'token', 'user__email', 'user__is_active'
+    ).filter(user_id=user_id).first()
+    if user_model is None or not user_model.token:
+        print(f"No pending token for user {user_id}, skipping email.")
+        return None
+    return user_model
+
+
+@track_job
+def send_verification_email(payload: dict):
+    user_id = read_job_payload(payload, 'user_id')['user_id']
+    user_model = load_user_model_for_job(user_id)
+    if user_model is None or user_model.user.is_active:
+        return False
+
+    to_email, token, uidb64 = user_model.user.email, user_model.token, user_model.uidb64
+
     subject = 'Welcome to Videoflix!'
     from_email = getattr(settings, 'DEFAULT_FROM_EMAIL', None) or getattr(settings, 'EMAIL_HOST_USER', None)
 
@@ -33,10 +55,18 @@ def send_verification_email(to_email: str, token: str, uidb64: str):
         html_message=html,
         fail_silently=False,
     )
+    return True
+
 
+@track_job
+def send_password_reset_email(payload: dict):
+    user_id = read_job_payload(payload, 'user_id')['user_id']
+    user_model = load_user_model_for_job(user_id)
+    if user_model is None:
+        return False
+
+    to_email, token, uidb64 = user_model.user.email, user_model.token, user_model.uidb64
 
-def send_password_reset_email(to_email: str, token: str, uidb64: str):
-    print( uidb64, token )
     subject = 'Reset your Videoflix password'
     from_email = getattr(settings, 'DEFAULT_FROM_EMAIL', None) or getattr(settings, 'EMAIL_HOST_USER', None)
 
@@ -65,3 +95,16 @@ def send_password_reset_email(to_email: str, token: str, uidb64: str):
         html_message=html,
         fail_silently=False,
     )
+    return True
+
+
+@track_job
+def purge_expired_auth_tokens(payload: dict):
+    read_job_payload(payload)
+    batch_size = int(getattr(settings, 'AUTH_CLEANUP_BATCH_SIZE', 1000))
+
+    activations = purge_expired_activations(batch_size)
+    resets = purge_expired_password_resets(batch_size)
+
+    print(f"Purged {activations} expired activations and {resets} expired password resets.")
+    return {"activations": activations, "password_resets": resets}
@@ -5,15 +5,17 @@ from rest_framework.response import Response
 from .serializers import RegistrationSerializer, LoginSerializer, PasswordResetSerializer, PasswordConfirmSerializer
 from rest_framework_simplejwt.views import TokenObtainPairView
 import django_rq
-from django_rq import enqueue
 from .services import activate_user_account, create_jwt_tokens, clear_auth_cookies, set_auth_cookies, blacklist_refresh_token,create_access_token_from_refresh, get_refresh_token_from_cookies, create_password_reset, confirm_password_reset
-from .tasks import send_verification_email, send_password_reset_email
+from core.jobs import build_job_payload
+from core.throttling import RedisRateThrottle
 from rest_framework import views
 from django.conf import settings
-from django.contrib.auth.models import User
+from django.contrib.auth.models import User, update_last_login
 
 class RegistrationView(APIView):
     permission_classes = [AllowAny]
+    throttle_classes = [RedisRateThrottle]
+    throttle_scope = 'register'
 
     def post(self, request):
         serializer = RegistrationSerializer(data=request.data)
@@ -22,8 +24,7 @@ class RegistrationView(APIView):
             instance = serializer.save()
             
             queue = django_rq.get_queue('high', autocommit=True)
-            queue.enqueue(
-                send_verification_email, instance.email, instance.usermodel.token, instance.usermodel.uidb64)
+            queue.enqueue("auth_app.api.tasks.send_verification_email", build_job_payload(user_id=instance.id))
             
             return Response({
                 "user": {
@@ -49,6 +50,8 @@ class ActivationView(APIView):
 
 class LoginView(TokenObtainPairView):
     permission_classes = [AllowAny]
+    throttle_classes = [RedisRateThrottle]
+    throttle_scope = 'login'
 
     def post(self, request, *args, **kwargs):
         serializer = LoginSerializer(data=request.data)
@@ -56,6 +59,7 @@ class LoginView(TokenObtainPairView):
 
         user = serializer.validated_data['user']
         access_token, refresh_token = create_jwt_tokens(user)
+        update_last_login(None, user)
 
         res = Response({
             "message": "Login successful",
@@ -88,6 +92,8 @@ class LogoutView(APIView):
 
 class CookieRefreshView(views.APIView):
     permission_classes = [AllowAny]
+    throttle_classes = [RedisRateThrottle]
+    throttle_scope = 'token_refresh'
 
     def post(self, request, *args, **kwargs):
         refresh_cookie = getattr(settings, 'REFRESH_TOKEN_COOKIE_NAME', 'refresh_token')
@@ -113,6 +119,8 @@ class CookieRefreshView(views.APIView):
 
 class PasswordResetView(APIView):
     permission_classes = [AllowAny]
+    throttle_classes = [RedisRateThrottle]
+    throttle_scope = 'password_reset'
 
     def post(self, request):
         serializer = PasswordResetSerializer(data=request.data)
@@ -122,12 +130,12 @@ class PasswordResetView(APIView):
         
         try:
             user = User.objects.get(email=email)
-            uidb64, token = create_password_reset(user)
+            create_password_reset(user)
             
             queue = django_rq.get_queue('high', autocommit=True)
-            queue.enqueue(send_password_reset_email, email, token, uidb64)
+            queue.enqueue("auth_app.api.tasks.send_password_reset_email", build_job_payload(user_id=user.id))
             
-        except User.DoesNotExist:
+        except (User.DoesNotExist, ValueError):
             pass
         
         return Response(
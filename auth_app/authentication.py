@@ -1,4 +1,4 @@
-from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.authentication import JWTAuthentication, JWTStatelessUserAuthentication
 
 
 class CookieJWTAuthentication(JWTAuthentication):
@@ -23,4 +23,13 @@ class CookieJWTAuthentication(JWTAuthentication):
         if access_token is None:
             return None
         validated_token = self.get_validated_token(access_token)
-        return self.get_user(validated_token), validated_token
\ No newline at end of file
+        return self.get_user(validated_token), validated_token
+
+
+class CookieJWTStatelessAuthentication(CookieJWTAuthentication, JWTStatelessUserAuthentication):
+    """
+    Cookie JWT authentication that builds the user from the token claims.
+
+    Skips the per-request user lookup for high-volume endpoints that only
+    need the user id, such as player telemetry beacons.
+    """
@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import User
 import uuid
 
@@ -6,6 +7,7 @@ class UserModel(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     uidb64 = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     token = models.CharField(max_length=255, unique=True)
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
 
     def __str__(self):
         return self.user.email
\ No newline at end of file
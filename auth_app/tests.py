@@ -1,3 +1,133 @@
-from django.test import TestCase
+import unittest
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core import mail
+from datetime import timedelta
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from core.jobs import build_job_payload
+from rest_framework.settings import api_settings
+from .models import UserModel
+from .api.tasks import send_verification_email, send_password_reset_email, purge_expired_auth_tokens
+from .api.services import activate_user_account, create_password_reset
+
+try:
+    import fakeredis
+except ImportError:
+    fakeredis = None
+
+
+class EmailJobPayloadTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('test@example.com', 'test@example.com', 'secret', is_active=False)
+        self.user_model = UserModel.objects.create(user=self.user, token='first-token')
+
+    def test_verification_email_uses_current_token(self):
+        payload = build_job_payload(user_id=self.user.id)
+        UserModel.objects.filter(pk=self.user_model.pk).update(token='second-token')
+
+        self.assertTrue(send_verification_email(payload))
+        self.assertIn('second-token', mail.outbox[0].body)
+
+    def test_verification_email_skipped_after_activation(self):
+        payload = build_job_payload(user_id=self.user.id)
+        User.objects.filter(pk=self.user.pk).update(is_active=True)
+
+        self.assertFalse(send_verification_email(payload))
+        self.assertEqual(mail.outbox, [])
+
+    def test_password_reset_email_skipped_after_reset_is_used(self):
+        payload = build_job_payload(user_id=self.user.id)
+        self.user_model.delete()
+
+        self.assertFalse(send_password_reset_email(payload))
+        self.assertEqual(mail.outbox, [])
+
+
+@unittest.skipUnless(fakeredis, "fakeredis is not installed")
+class LoginThrottleTests(TestCase):
+    def setUp(self):
+        User.objects.create_user('test@example.com', 'test@example.com', 'secret-pass-123')
+        patcher = mock.patch('core.throttling.get_redis_connection', return_value=fakeredis.FakeRedis())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def login(self, ip):
+        return self.client.post('/api/login/', {'email': 'test@example.com', 'password': 'wrong'},
+                                content_type='application/json', REMOTE_ADDR=ip)
+
+    def test_login_is_limited_per_ip_with_retry_after(self):
+        rates = {**api_settings.DEFAULT_THROTTLE_RATES, 'login': '2/min'}
+        with override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': rates}):
+            statuses = [self.login('10.0.0.1').status_code for _ in range(2)]
+            blocked = self.login('10.0.0.1')
+            other_ip = self.login('10.0.0.2')
+
+        self.assertNotIn(429, statuses)
+        self.assertEqual(blocked.status_code, 429)
+        self.assertGreaterEqual(int(blocked['Retry-After']), 1)
+        self.assertNotEqual(other_ip.status_code, 429)
+
+    def test_successful_login_records_last_login(self):
+        response = self.client.post('/api/login/', {'email': 'test@example.com', 'password': 'secret-pass-123'},
+                                    content_type='application/json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNotNone(User.objects.get(email='test@example.com').last_login)
+
+
+class ExpiredTokenCleanupTests(TestCase):
+    def create_user(self, email, is_active, age):
+        user = User.objects.create_user(email, email, 'secret-pass-123', is_active=is_active)
+        UserModel.objects.create(user=user, token=f'token-{email}', created_at=timezone.now() - age)
+        return user
+
+    def test_expired_activation_link_is_rejected(self):
+        user = self.create_user('late@example.com', False, timedelta(days=30))
+
+        with self.assertRaisesMessage(ValueError, 'expired'):
+            activate_user_account(str(user.usermodel.uidb64), user.usermodel.token)
+
+    def test_reset_token_gets_fresh_timestamp(self):
+        user = self.create_user('reset@example.com', True, timedelta(days=30))
+        create_password_reset(user)
+
+        user.usermodel.refresh_from_db()
+        self.assertGreater(user.usermodel.created_at, timezone.now() - timedelta(minutes=1))
+
+    def test_reset_request_does_not_revive_expired_activation(self):
+        user = self.create_user('pending@example.com', False, timedelta(days=30))
+        token, created_at = user.usermodel.token, user.usermodel.created_at
+
+        with mock.patch('auth_app.api.views.django_rq.get_queue') as get_queue:
+            response = self.client.post('/api/password_reset/', {'email': user.email}, content_type='application/json')
+
+        self.assertEqual(response.status_code, 200)
+        get_queue.assert_not_called()
+        user.usermodel.refresh_from_db()
+        self.assertEqual((user.usermodel.token, user.usermodel.created_at), (token, created_at))
+        with self.assertRaisesMessage(ValueError, 'expired'):
+            activate_user_account(str(user.usermodel.uidb64), token)
+        response = self.client.post(f'/api/password_confirm/{user.usermodel.uidb64}/{token}/',
+                                    {'new_password': 'new-pass-123', 'confirm_password': 'new-pass-123'},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_purge_removes_expired_records_in_batches(self):
+        for i in range(3):
+            self.create_user(f'stale{i}@example.com', False, timedelta(days=30))
+        pending = self.create_user('pending@example.com', False, timedelta(hours=1))
+        reset_user = self.create_user('active@example.com', True, timedelta(days=2))
+        deactivated = self.create_user('deactivated@example.com', False, timedelta(days=30))
+        User.objects.filter(id=deactivated.id).update(last_login=timezone.now() - timedelta(days=60))
+
+        with override_settings(AUTH_CLEANUP_BATCH_SIZE=2):
+            report = purge_expired_auth_tokens(build_job_payload())
+
+        self.assertEqual(report, {"activations": 3, "password_resets": 1})
+        self.assertEqual(set(User.objects.values_list('email', flat=True)),
+                         {pending.email, reset_user.email, deactivated.email})
+        self.assertFalse(UserModel.objects.filter(user=reset_user).exists())
@@ -13,10 +13,15 @@ done
 
 echo "PostgreSQL ist bereit - fahre fort..."
 
-# Deine originalen Befehle (ohne wait_for_db)
-python manage.py collectstatic --noinput
-python manage.py makemigrations
-python manage.py migrate
+# Static files are collected at image build time; only a fresh static volume needs a rerun.
+if [ "${COLLECTSTATIC_ON_START:-False}" = "True" ] || [ ! -f static/staticfiles.json ]; then
+  python manage.py collectstatic --noinput
+fi
+
+# Migrations are committed to the repo; additional replicas can skip them with RUN_MIGRATIONS=False.
+if [ "${RUN_MIGRATIONS:-True}" = "True" ]; then
+  python manage.py migrate --noinput
+fi
 
 # Create a superuser using environment variables
 # (Dein Superuser-Erstellungs-Code bleibt gleich)
@@ -38,12 +43,30 @@ else:
     print(f"Superuser '{username}' already exists.")
 EOF
 
-python manage.py rqworker default &
-python manage.py rqworker default &
-python manage.py rqworker default &
-python manage.py rqworker default &
-python manage.py rqworker default &
-python manage.py rqworker high &
+export PROMETHEUS_MULTIPROC_DIR="${PROMETHEUS_MULTIPROC_DIR:-/tmp/prometheus}"
+rm -rf "$PROMETHEUS_MULTIPROC_DIR" && mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+
+# Default-queue transcodes fork per job; the high queue runs short jobs in-process.
+RQ_DEFAULT_WORKER_CLASS="${RQ_DEFAULT_WORKER_CLASS:-core.worker.DjangoWorker}"
+RQ_HIGH_WORKER_CLASS="${RQ_HIGH_WORKER_CLASS:-core.worker.DjangoSimpleWorker}"
+
+# Worker counts and ffmpeg threads from the container's CPU/memory limits (env vars override).
+eval "$(python -m core.sizing --shell)"
+echo "Sizing: $WEB_CONCURRENCY web workers x $GUNICORN_THREADS threads, $RQ_DEFAULT_WORKERS default + $RQ_HIGH_WORKERS high RQ workers, ffmpeg threads $FFMPEG_THREADS"
+
+for i in $(seq "$RQ_DEFAULT_WORKERS"); do
+  python manage.py rqworker default --worker-class "$RQ_DEFAULT_WORKER_CLASS" &
+done
+for i in $(seq "$RQ_HIGH_WORKERS"); do
+  python manage.py rqworker high --worker-class "$RQ_HIGH_WORKER_CLASS" &
+done
+python manage.py relay_outbox &
+python manage.py run_periodic_jobs &
+# Restarted if it exits; beacons it had not acknowledged stay pending in the stream and are reclaimed.
+(while true; do
+  python manage.py consume_qoe_events || echo "consume_qoe_events exited with $?, restarting in 5 seconds"
+  sleep 5
+done) &
 
 
-exec gunicorn core.wsgi:application --bind 0.0.0.0:8000 --reload --timeout 120 --graceful-timeout 120
+exec python -m gunicorn core.wsgi:application -c core/gunicorn.conf.py
@@ -0,0 +1,61 @@
+import random
+
+from contextvars import ContextVar
+
+from django.conf import settings
+
+
+REPLICA_STICKY_COOKIE = "db_primary"
+
+request_state = ContextVar("db_request_state", default=None)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        replicas = getattr(settings, 'DATABASE_REPLICAS', [])
+        state = request_state.get()
+        if not replicas or not state or not state["replica"]:
+            return None
+        if model._meta.label_lower not in getattr(settings, 'REPLICA_READ_MODELS', []):
+            return None
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        state = request_state.get()
+        if state:
+            state.update(replica=False, wrote=True)
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
+
+
+class ReplicaMiddleware:
+    safe_methods = ('GET', 'HEAD', 'OPTIONS')
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        state = {
+            "replica": request.method in self.safe_methods and REPLICA_STICKY_COOKIE not in request.COOKIES,
+            "wrote": False,
+        }
+        token = request_state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            request_state.reset(token)
+
+        if state["wrote"] and response.status_code < 400:
+            response.set_cookie(
+                REPLICA_STICKY_COOKIE, "1",
+                max_age=int(getattr(settings, 'REPLICA_STICKY_SECONDS', 10)),
+                httponly=True,
+                samesite=getattr(settings, 'AUTH_COOKIE_SAMESITE', 'Lax'),
+                secure=bool(getattr(settings, 'AUTH_COOKIE_SECURE', False)),
+            )
+        return response
@@ -0,0 +1,65 @@
+import gc, os
+
+from core.sizing import plan_processes
+
+
+plan = plan_processes()
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:8000")
+workers = plan["web_workers"]
+threads = plan["web_threads"]
+worker_class = "gthread" if threads > 1 else "sync"
+
+reload = os.environ.get("GUNICORN_RELOAD", "False").lower() == "true"
+preload_app = not reload
+
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 120))
+graceful_timeout = int(os.environ.get("GUNICORN_GRACEFUL_TIMEOUT", 120))
+keepalive = int(os.environ.get("GUNICORN_KEEPALIVE", 5))
+
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", 2000))
+max_requests_jitter = int(os.environ.get("GUNICORN_MAX_REQUESTS_JITTER", max_requests // 10))
+
+accesslog = os.environ.get("GUNICORN_ACCESSLOG") or None
+errorlog = "-"
+
+
+def read_memory_kb() -> dict:
+    memory = {}
+    for path, fields in (("/proc/self/status", ("VmRSS",)), ("/proc/self/smaps_rollup", ("Pss", "Shared_Clean", "Shared_Dirty"))):
+        try:
+            with open(path) as handle:
+                for line in handle:
+                    name, _, value = line.partition(":")
+                    if name in fields:
+                        memory[name] = int(value.split()[0])
+        except OSError:
+            continue
+    return memory
+
+
+def when_ready(server):
+    server.log.info(
+        "Sizing: %s web workers x %s threads on %s of %s CPUs, %s+%s RQ workers, ffmpeg threads %s, memory %s MB",
+        plan["web_workers"], plan["web_threads"], plan["web_cpus"], plan["cpus"],
+        plan["rq_default_workers"], plan["rq_high_workers"], plan["ffmpeg_threads"], plan["memory_mb"],
+    )
+    memory = read_memory_kb()
+    server.log.info("Master RSS after preload: %.1f MB", memory.get("VmRSS", 0) / 1024)
+    gc.freeze()
+
+
+def post_worker_init(worker):
+    memory = read_memory_kb()
+    shared = memory.get("Shared_Clean", 0) + memory.get("Shared_Dirty", 0)
+    worker.log.info(
+        "Worker %s started: RSS %.1f MB, PSS %.1f MB, shared %.1f MB",
+        worker.pid, memory.get("VmRSS", 0) / 1024, memory.get("Pss", 0) / 1024, shared / 1024,
+    )
+
+
+def child_exit(server, worker):
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)
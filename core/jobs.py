@@ -0,0 +1,15 @@
+JOB_PAYLOAD_VERSION = 1
+
+def build_job_payload(**fields) -> dict:
+    return {"v": JOB_PAYLOAD_VERSION, **fields}
+
+def read_job_payload(payload: dict, *required: str) -> dict:
+    version = payload.get("v")
+    if version != JOB_PAYLOAD_VERSION:
+        raise ValueError(f"Unsupported job payload version: {version}")
+
+    missing = [key for key in required if key not in payload]
+    if missing:
+        raise ValueError(f"Job payload is missing: {', '.join(missing)}")
+
+    return payload
@@ -0,0 +1,139 @@
+import os, hmac, time, functools, ipaddress, contextlib, django_rq
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess
+)
+from prometheus_client.core import GaugeMetricFamily
+from redis.exceptions import RedisError
+from rq.registry import StartedJobRegistry
+
+
+REQUEST_LATENCY = Histogram(
+    'videoflix_request_duration_seconds', 'Request latency per view.', ['view', 'method', 'status'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+REQUEST_QUERIES = Histogram(
+    'videoflix_request_db_queries', 'Database queries per request.', ['view'],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89),
+)
+SEGMENT_BYTES = Counter(
+    'videoflix_segment_bytes_served_total', 'HLS segment bytes served per rendition.', ['rendition'],
+)
+SEGMENT_READAHEAD = Counter(
+    'videoflix_segment_readahead_total', 'Upcoming HLS segments advised into the page cache.', ['rendition'],
+)
+JOB_DURATION = Histogram(
+    'videoflix_job_duration_seconds', 'RQ job duration per task.', ['task', 'status'],
+    buckets=(0.1, 0.5, 1, 5, 15, 30, 60, 120, 300, 600, 1200, 3600),
+)
+ENCODE_SPEED = Histogram(
+    'videoflix_ffmpeg_encode_speed_ratio', 'Seconds of media encoded per wall-clock second.', ['rendition'],
+    buckets=(0.1, 0.25, 0.5, 1, 2, 4, 8, 16, 32),
+)
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+@contextlib.contextmanager
+def execute_wrapper_all(wrapper):
+    # Every alias, so reads routed to replicas are counted too.
+    with contextlib.ExitStack() as stack:
+        for conn in connections.all():
+            stack.enter_context(conn.execute_wrapper(wrapper))
+        yield
+
+
+class MetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        counter = QueryCounter()
+        start = time.perf_counter()
+
+        with execute_wrapper_all(counter):
+            response = self.get_response(request)
+
+        view = getattr(request, '_metrics_view', 'unmatched')
+        REQUEST_LATENCY.labels(view, request.method, response.status_code).observe(time.perf_counter() - start)
+        REQUEST_QUERIES.labels(view).observe(counter.count)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._metrics_view = getattr(view_func, 'view_class', view_func).__name__
+
+
+class RQQueueCollector:
+    def collect(self):
+        depth = GaugeMetricFamily('videoflix_rq_queue_depth', 'Jobs waiting per RQ queue.', labels=['queue'])
+        started = GaugeMetricFamily('videoflix_rq_jobs_started', 'Jobs running per RQ queue.', labels=['queue'])
+
+        for name in getattr(settings, 'RQ_QUEUES', {}):
+            queue = django_rq.get_queue(name)
+            depth.add_metric([name], queue.count)
+            started.add_metric([name], StartedJobRegistry(queue=queue).count)
+
+        yield depth
+        yield started
+
+
+queue_registry = CollectorRegistry(auto_describe=False)
+queue_registry.register(RQQueueCollector())
+
+
+def track_job(func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        status = 'failed'
+        try:
+            result = func(*args, **kwargs)
+            status = 'finished'
+            return result
+        finally:
+            JOB_DURATION.labels(func.__name__, status).observe(time.perf_counter() - start)
+    return wrapper
+
+
+def is_metrics_request_allowed(request) -> bool:
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if token:
+        return hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}')
+
+    # Without a token only direct scrapes from internal networks; anything relayed by a proxy may be public.
+    if 'X-Forwarded-For' in request.headers:
+        return False
+    try:
+        address = ipaddress.ip_address(request.META.get('REMOTE_ADDR', ''))
+    except ValueError:
+        return False
+    return any(address in ipaddress.ip_network(network) for network in getattr(settings, 'METRICS_ALLOWED_NETWORKS', []))
+
+
+def metrics_view(request):
+    if not is_metrics_request_allowed(request):
+        return HttpResponseForbidden()
+
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+
+    output = generate_latest(registry)
+    try:
+        output += generate_latest(queue_registry)
+    except RedisError:
+        pass
+
+    return HttpResponse(output, content_type=CONTENT_TYPE_LATEST)
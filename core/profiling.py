@@ -0,0 +1,133 @@
+import re, sys, time, random, threading, functools
+
+from django.conf import settings
+from django.core import signing
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError
+
+from .metrics import execute_wrapper_all
+
+
+PROFILE_KEY_PREFIX = "videoflix:profile"
+PROFILE_SIGNING_SALT = "videoflix.profiling"
+PROFILE_HEADER = "X-Profile-Token"
+PLACEHOLDER_LIST_PATTERN = re.compile(r"\((?:%s, )*%s\)")
+
+
+class StackSampler:
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+
+            names = []
+            while frame is not None:
+                names.append(f"{frame.f_globals.get('__name__', '?')}:{frame.f_code.co_name}")
+                frame = frame.f_back
+
+            stack = ";".join(reversed(names))
+            self.stacks[stack] = self.stacks.get(stack, 0) + 1
+
+
+class QueryRecorder:
+    def __init__(self):
+        self.queries = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            # IN (%s, %s, ...) lists of any length count as one statement.
+            sql = PLACEHOLDER_LIST_PATTERN.sub("(...)", sql)
+            self.queries[sql] = self.queries.get(sql, 0.0) + (time.perf_counter() - start) * 1000
+
+
+def make_profile_token() -> str:
+    return signing.TimestampSigner(salt=PROFILE_SIGNING_SALT).sign("profile")
+
+def has_valid_profile_token(value: str) -> bool:
+    if not value:
+        return False
+    try:
+        signing.TimestampSigner(salt=PROFILE_SIGNING_SALT).unsign(
+            value, max_age=int(getattr(settings, 'PROFILING_TOKEN_MAX_AGE', 3600)))
+    except signing.BadSignature:
+        return False
+    return True
+
+def store_profile(target: str, stacks: dict, queries: dict):
+    ttl = int(getattr(settings, 'PROFILING_RETENTION', 7 * 24 * 3600))
+    stacks_key = f"{PROFILE_KEY_PREFIX}:stacks:{target}"
+    sql_key = f"{PROFILE_KEY_PREFIX}:sql:{target}"
+
+    pipe = get_redis_connection("default").pipeline(transaction=False)
+    for stack, count in stacks.items():
+        pipe.zincrby(stacks_key, count, stack)
+    for sql, millis in queries.items():
+        pipe.zincrby(sql_key, millis, sql)
+    pipe.hincrby(f"{PROFILE_KEY_PREFIX}:samples", target, 1)
+    pipe.expire(stacks_key, ttl)
+    pipe.expire(sql_key, ttl)
+    pipe.expire(f"{PROFILE_KEY_PREFIX}:samples", ttl)
+    pipe.zremrangebyrank(stacks_key, 0, -int(getattr(settings, 'PROFILING_MAX_STACKS', 2000)) - 1)
+    pipe.zremrangebyrank(sql_key, 0, -int(getattr(settings, 'PROFILING_MAX_STATEMENTS', 500)) - 1)
+    pipe.execute()
+
+def run_profiled(target, func, *args, **kwargs):
+    recorder = QueryRecorder()
+    interval = float(getattr(settings, 'PROFILING_INTERVAL', 0.005))
+
+    with StackSampler(threading.get_ident(), interval) as sampler, execute_wrapper_all(recorder):
+        result = func(*args, **kwargs)
+
+    name = target() if callable(target) else target
+    try:
+        store_profile(name, sampler.stacks, recorder.queries)
+    except RedisError as e:
+        print(f"Could not store profile for {name}: {e}")
+    return result
+
+
+class ProfilingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        sample_rate = float(getattr(settings, 'PROFILING_SAMPLE_RATE', 0.0))
+        if not (sample_rate and random.random() < sample_rate) and \
+                not has_valid_profile_token(request.headers.get(PROFILE_HEADER)):
+            return self.get_response(request)
+
+        request._profiling_target = 'unmatched'
+        return run_profiled(lambda: request._profiling_target, self.get_response, request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if hasattr(request, '_profiling_target'):
+            request._profiling_target = getattr(view_func, 'view_class', view_func).__name__
+
+
+def profiled_job(func):
+    @functools.wraps(func)
+    def wrapper(payload: dict, *args, **kwargs):
+        sample_rate = float(getattr(settings, 'PROFILING_JOB_SAMPLE_RATE', 0.0))
+        if payload.get("profile") or (sample_rate and random.random() < sample_rate):
+            return run_profiled(f"job:{func.__name__}", func, payload, *args, **kwargs)
+        return func(payload, *args, **kwargs)
+    return wrapper
@@ -14,6 +14,9 @@ from pathlib import Path
 import os
 from dotenv import load_dotenv
 from datetime import timedelta
+from corsheaders.defaults import default_headers
+
+from core.sizing import plan_processes
 
 load_dotenv()
 
@@ -36,6 +39,8 @@ CSRF_TRUSTED_ORIGINS = os.environ.get("CSRF_TRUSTED_ORIGINS", default="http://lo
 
 CORS_ALLOW_CREDENTIALS = True
 CORS_ALLOWED_ORIGINS = os.environ.get("CSRF_TRUSTED_ORIGINS", default="http://localhost:4200").split(",")
+# Players that cannot rely on the playback_session cookie send the id in this header instead.
+CORS_ALLOW_HEADERS = (*default_headers, "x-playback-session")
 
 # Application definition
 
@@ -56,6 +61,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [    
+    'core.metrics.MetricsMiddleware',
+    'core.profiling.ProfilingMiddleware',
+    'core.db_router.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -102,6 +110,61 @@ DATABASES = {
     }
 }
 
+# Web/RQ worker counts and ffmpeg threads sized from the container's CPU and memory limits.
+PROCESS_PLAN = plan_processes()
+IMPORT_TIME_BUDGET_MS = {
+    "web": int(os.environ.get("WEB_IMPORT_BUDGET_MS", default=1500)),
+    "worker": int(os.environ.get("WORKER_IMPORT_BUDGET_MS", default=2000)),
+}
+
+# persistent: one long-lived connection per thread, pool: psycopg pool per process,
+# pgbouncer: persistent connections to a transaction-pooling pgbouncer.
+DB_CONN_MODE = os.environ.get("DB_CONN_MODE", default="persistent")
+DB_MAX_CONNECTIONS = int(os.environ.get("DB_MAX_CONNECTIONS", default=100))
+DB_PROCESS_COUNT = (
+    PROCESS_PLAN["web_workers"]
+    + PROCESS_PLAN["rq_default_workers"]
+    + PROCESS_PLAN["rq_high_workers"]
+    + 3
+)
+DB_POOL_MAX_SIZE = max(1, min(
+    PROCESS_PLAN["web_threads"] + 1,
+    DB_MAX_CONNECTIONS // DB_PROCESS_COUNT,
+))
+
+if DB_CONN_MODE == "pool":
+    from psycopg_pool import ConnectionPool
+
+    DATABASES["default"]["OPTIONS"] = {
+        "pool": {
+            "min_size": 1,
+            "max_size": DB_POOL_MAX_SIZE,
+            "timeout": 10,
+            "max_idle": 300,
+            "check": ConnectionPool.check_connection,
+        }
+    }
+else:
+    DATABASES["default"]["CONN_MAX_AGE"] = int(os.environ.get("DB_CONN_MAX_AGE", default=300))
+    DATABASES["default"]["CONN_HEALTH_CHECKS"] = True
+    if DB_CONN_MODE == "pgbouncer":
+        DATABASES["default"]["DISABLE_SERVER_SIDE_CURSORS"] = True
+
+DATABASE_REPLICAS = []
+for i, replica_host in enumerate(filter(None, os.environ.get("DB_REPLICA_HOSTS", default="").split(","))):
+    host, _, port = replica_host.strip().partition(":")
+    DATABASES[f"replica{i}"] = {
+        **DATABASES["default"],
+        "HOST": host,
+        "PORT": port or DATABASES["default"]["PORT"],
+        "TEST": {"MIRROR": "default"},
+    }
+    DATABASE_REPLICAS.append(f"replica{i}")
+
+DATABASE_ROUTERS = ['core.db_router.ReplicaRouter']
+REPLICA_READ_MODELS = ['video_app.video', 'video_app.watchprogress', 'video_app.videoviewbucket', 'auth.user']
+REPLICA_STICKY_SECONDS = int(os.environ.get("REPLICA_STICKY_SECONDS", default=10))
+
 CACHES = {
     "default": {
         "BACKEND": "django_redis.cache.RedisCache",
@@ -120,6 +183,7 @@ RQ_QUEUES = {
         'DB': os.environ.get("REDIS_DB", default=0),
         'DEFAULT_TIMEOUT': 900,
         'REDIS_CLIENT_KWARGS': {},
+        'SERIALIZER': 'rq.serializers.JSONSerializer',
     },
     'high': {
         'HOST': os.environ.get("REDIS_HOST", default="redis"),
@@ -127,10 +191,97 @@ RQ_QUEUES = {
         'DB': os.environ.get("REDIS_DB", default=0),
         'DeFAULT_TIMEOUT': 900,
         'REDIS_CLIENT_KWARGS': {},
+        'SERIALIZER': 'rq.serializers.JSONSerializer',
 
     }
 }
 
+# Jobs that always run in a forked work horse, even on the in-process high-queue workers (core.worker).
+RQ_FORKED_JOBS = [
+    'video_app.api.tasks.process_video_to_hls',
+    'video_app.api.tasks.process_single_variant',
+    'video_app.api.tasks.process_audio_rendition',
+]
+
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", default="")
+# Without METRICS_TOKEN, /metrics only answers direct (unproxied) requests from these networks.
+METRICS_ALLOWED_NETWORKS = list(filter(None, os.environ.get(
+    "METRICS_ALLOWED_NETWORKS", default="127.0.0.0/8,::1/128,10.0.0.0/8,172.16.0.0/12,192.168.0.0/16").split(",")))
+
+PROFILING_SAMPLE_RATE = float(os.environ.get("PROFILING_SAMPLE_RATE", default=0.0))
+PROFILING_JOB_SAMPLE_RATE = float(os.environ.get("PROFILING_JOB_SAMPLE_RATE", default=0.0))
+PROFILING_INTERVAL = 0.005
+PROFILING_MAX_STACKS = 2000
+PROFILING_MAX_STATEMENTS = 500
+
+PERIODIC_JOBS = [
+    {'func': 'video_app.api.tasks.flush_watch_progress', 'interval': 30},
+    {'func': 'video_app.api.tasks.rollup_view_counts', 'interval': 300},
+    {'func': 'video_app.api.tasks.evict_cold_renditions', 'interval': 6 * 3600},
+    {'func': 'auth_app.api.tasks.purge_expired_auth_tokens', 'interval': 3600},
+    {'func': 'video_app.api.tasks.sweep_transcode_orphans', 'interval': 3600},
+    {'func': 'video_app.api.tasks.evict_thumbnail_cache', 'interval': 900},
+    {'func': 'video_app.api.tasks.reconcile_media_storage', 'interval': 24 * 3600,
+     'kwargs': {'reclaim': os.environ.get("STORAGE_RECONCILE_RECLAIM", 'False').lower() == 'true'}},
+]
+
+TRANSCODE_POLICY = os.environ.get("TRANSCODE_POLICY", default="eager")
+HLS_SEPARATE_AUDIO = os.environ.get("HLS_SEPARATE_AUDIO", 'False').lower() == 'true'
+HLS_AUDIO_ONLY_VARIANT = True
+FFMPEG_THREADS = PROCESS_PLAN["ffmpeg_threads"]
+
+# Live/event HLS: sliding-window playlists written by `manage.py live_ingest`.
+LIVE_SEGMENT_SECONDS = int(os.environ.get("LIVE_SEGMENT_SECONDS", default=2))
+LIVE_WINDOW_SEGMENTS = int(os.environ.get("LIVE_WINDOW_SEGMENTS", default=6))
+LIVE_PLAYLIST_MAX_AGE = 1
+LIVE_BLOCKING_POLL_INTERVAL = 0.1
+# Blocking playlist reloads allowed per web process; beyond this viewers get the current playlist and poll.
+LIVE_BLOCKING_MAX_WAITERS = int(os.environ.get("LIVE_BLOCKING_MAX_WAITERS", default=max(1, PROCESS_PLAN["web_threads"] // 2)))
+
+# posix_fadvise(WILLNEED) the next N segments of a rendition when one is served; 0 disables.
+HLS_READAHEAD_SEGMENTS = int(os.environ.get("HLS_READAHEAD_SEGMENTS", default=3))
+HLS_READAHEAD_TTL = 30
+
+# Player QoE beacons: one Redis stream entry per batch, rolled up by `manage.py consume_qoe_events`.
+QOE_MAX_BODY_BYTES = 256 * 1024
+QOE_MAX_EVENTS_PER_BATCH = 500
+QOE_MAX_EVENT_VALUE = 24 * 3600 * 1000
+QOE_STREAM_MAXLEN = int(os.environ.get("QOE_STREAM_MAXLEN", default=1_000_000))
+QOE_CLAIM_IDLE_MS = 60_000
+QOE_DEAD_LETTER_MAXLEN = 10_000
+
+# AES-128 segment encryption with a new per-video key every HLS_KEY_ROTATION_SEGMENTS segments.
+HLS_ENCRYPTION = os.environ.get("HLS_ENCRYPTION", 'False').lower() == 'true'
+HLS_KEY_ROTATION_SEGMENTS = int(os.environ.get("HLS_KEY_ROTATION_SEGMENTS", default=30))
+HLS_KEY_CACHE_TTL = 3600
+
+PER_TITLE_ENCODING = os.environ.get("PER_TITLE_ENCODING", 'True').lower() == 'true'
+RENDITION_LOCK_TTL = 1800
+RENDITION_RETRY_AFTER = 15
+# After an on-demand encode exhausts its retries the rendition 404s for this long before a new attempt may start.
+RENDITION_FAILURE_COOLDOWN = 600
+RENDITION_COLD_AFTER = int(os.environ.get("RENDITION_COLD_AFTER", default=30 * 24 * 3600))
+RENDITION_EVICT_BATCH = 200
+TRANSCODE_ORPHAN_MAX_AGE = int(os.environ.get("TRANSCODE_ORPHAN_MAX_AGE", default=6 * 3600))
+ACTIVATION_TOKEN_TTL = int(os.environ.get("ACTIVATION_TOKEN_TTL", default=7 * 24 * 3600))
+PASSWORD_RESET_TOKEN_TTL = int(os.environ.get("PASSWORD_RESET_TOKEN_TTL", default=24 * 3600))
+AUTH_CLEANUP_BATCH_SIZE = 1000
+STORAGE_DELETE_BATCH_SIZE = 500
+STORAGE_DELETE_BATCH_PAUSE = 0.05
+STORAGE_RECONCILE_GRACE = 3600
+WATCH_PROGRESS_TTL = 30 * 24 * 3600
+WATCH_PROGRESS_FLUSH_BATCH = 500
+CONTINUE_WATCHING_LIMIT = 20
+VIEW_COUNT_RETENTION = 48 * 3600
+# Segment hits are buffered per web process and written to Redis at most this often (or once this many keys pile up).
+VIEW_HIT_FLUSH_INTERVAL = 5
+VIEW_HIT_FLUSH_MAX_KEYS = 1000
+VIEW_ROLLUP_LOOKBACK = 3
+# Trending ranks distinct viewers from the hourly Redis sets, so the window cannot exceed VIEW_COUNT_RETENTION.
+TRENDING_WINDOW = 48 * 3600
+TRENDING_LIMIT = 20
+TRENDING_CACHE_TTL = 300
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -172,6 +323,10 @@ STATIC_ROOT = BASE_DIR / "static"
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
 
+THUMBNAIL_CACHE_MAX_BYTES = int(os.environ.get("THUMBNAIL_CACHE_MAX_BYTES", default=512 * 1024 * 1024))
+THUMBNAIL_RENDER_WAIT = 10
+THUMBNAIL_FAILED_FORMAT_TTL = 600
+
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
 
@@ -215,5 +370,18 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'auth_app.authentication.CookieJWTAuthentication',
         'rest_framework_simplejwt.authentication.JWTAuthentication',
-    )
-}
\ No newline at end of file
+    ),
+    'DEFAULT_THROTTLE_RATES': {
+        'register': os.environ.get("THROTTLE_REGISTER", default="5/hour"),
+        'login': os.environ.get("THROTTLE_LOGIN", default="10/min"),
+        'password_reset': os.environ.get("THROTTLE_PASSWORD_RESET", default="5/hour"),
+        'token_refresh': os.environ.get("THROTTLE_TOKEN_REFRESH", default="60/min"),
+        'playlist': os.environ.get("THROTTLE_PLAYLIST", default="120/min"),
+        'qoe': os.environ.get("THROTTLE_QOE", default="60/min"),
+        'hls_key': os.environ.get("THROTTLE_HLS_KEY", default="120/min"),
+    },
+    'NUM_PROXIES': int(os.environ.get("NUM_PROXIES", default=0)) or None,
+}
+
+MAX_CONCURRENT_STREAMS = int(os.environ.get("MAX_CONCURRENT_STREAMS", default=3))
+STREAM_IDLE_TIMEOUT = 60
\ No newline at end of file
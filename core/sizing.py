@@ -0,0 +1,106 @@
+import os, sys
+
+from pathlib import Path
+
+
+CGROUP_ROOT = Path("/sys/fs/cgroup")
+
+
+def read_cgroup(*names: str) -> str:
+    for name in names:
+        try:
+            return (CGROUP_ROOT / name).read_text().strip()
+        except OSError:
+            continue
+    return ""
+
+
+def detect_cpus() -> float:
+    try:
+        available = len(os.sched_getaffinity(0))
+    except AttributeError:
+        available = os.cpu_count() or 1
+
+    quota, _, period = read_cgroup("cpu.max").partition(" ")
+    if not quota:
+        quota, period = read_cgroup("cpu/cpu.cfs_quota_us", "cpu.cfs_quota_us"), read_cgroup("cpu/cpu.cfs_period_us", "cpu.cfs_period_us")
+
+    try:
+        limit = int(quota) / int(period)
+    except (TypeError, ValueError, ZeroDivisionError):
+        return float(available)
+    return min(float(available), limit) if limit > 0 else float(available)
+
+
+def detect_memory_mb() -> int:
+    try:
+        total = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (AttributeError, ValueError, OSError):
+        total = 0
+
+    limit = read_cgroup("memory.max", "memory/memory.limit_in_bytes", "memory.limit_in_bytes")
+    if limit.isdigit() and (not total or int(limit) < total):
+        total = int(limit)
+    return total // (1024 * 1024) if total else 0
+
+
+def env_int(name: str, default: int) -> int:
+    value = os.environ.get(name, "")
+    return int(value) if value.strip() else default
+
+
+def plan_processes(cpus: float = None, memory_mb: int = None) -> dict:
+    cpus = max(1, int(cpus if cpus is not None else detect_cpus()))
+    memory_mb = memory_mb if memory_mb is not None else detect_memory_mb()
+
+    encode_cpus = min(cpus - 1, round(cpus * float(os.environ.get("ENCODE_CPU_SHARE", 0.5)))) if cpus > 1 else 1
+    encode_cpus = max(1, encode_cpus)
+    web_cpus = max(1, cpus - encode_cpus)
+
+    ffmpeg_threads = env_int("FFMPEG_THREADS", 2 if encode_cpus > 1 else 1)
+    rq_default = env_int("RQ_DEFAULT_WORKERS", max(1, encode_cpus // ffmpeg_threads))
+    rq_high = env_int("RQ_HIGH_WORKERS", 1)
+
+    web_threads = env_int("GUNICORN_THREADS", 4)
+    web_workers = 2 * web_cpus + 1
+    if memory_mb:
+        rq_memory = (rq_default + rq_high) * env_int("RQ_WORKER_MEMORY_MB", 768)
+        web_memory = (memory_mb - rq_memory) * 0.8
+        web_workers = min(web_workers, int(web_memory // env_int("WEB_WORKER_MEMORY_MB", 256)))
+    web_workers = env_int("WEB_CONCURRENCY", max(1, web_workers))
+
+    return {
+        "cpus": cpus,
+        "memory_mb": memory_mb,
+        "web_cpus": web_cpus,
+        "encode_cpus": encode_cpus,
+        "web_workers": web_workers,
+        "web_threads": web_threads,
+        "rq_default_workers": rq_default,
+        "rq_high_workers": rq_high,
+        "ffmpeg_threads": ffmpeg_threads,
+    }
+
+
+def shell_exports(plan: dict) -> str:
+    names = {
+        "WEB_CONCURRENCY": "web_workers",
+        "GUNICORN_THREADS": "web_threads",
+        "RQ_DEFAULT_WORKERS": "rq_default_workers",
+        "RQ_HIGH_WORKERS": "rq_high_workers",
+        "RQ_WORKER_COUNT": None,
+        "FFMPEG_THREADS": "ffmpeg_threads",
+    }
+    lines = []
+    for env, key in names.items():
+        value = plan["rq_default_workers"] + plan["rq_high_workers"] if key is None else plan[key]
+        lines.append(f"export {env}={value}")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    plan = plan_processes()
+    if "--shell" in sys.argv:
+        print(shell_exports(plan))
+    else:
+        print(" ".join(f"{key}={value}" for key, value in plan.items()))
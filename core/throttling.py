@@ -0,0 +1,124 @@
+import re, time, uuid
+
+from django.conf import settings
+from django_redis import get_redis_connection
+from redis.commands.core import Script
+from redis.exceptions import RedisError
+from rest_framework.exceptions import PermissionDenied
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle, SimpleRateThrottle
+
+
+THROTTLE_KEY_PREFIX = "videoflix:throttle"
+PLAYBACK_SESSION_COOKIE = "playback_session"
+PLAYBACK_SESSION_HEADER = "X-Playback-Session"
+PLAYBACK_SESSION_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+SLIDING_WINDOW_SCRIPT = """
+local now = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now - window)
+if redis.call('ZCARD', KEYS[1]) < tonumber(ARGV[3]) then
+    redis.call('ZADD', KEYS[1], now, ARGV[4])
+    redis.call('PEXPIRE', KEYS[1], window)
+    return 0
+end
+local oldest = redis.call('ZRANGE', KEYS[1], 0, 0, 'WITHSCORES')
+return tonumber(oldest[2]) + window - now
+"""
+
+CONCURRENT_STREAMS_SCRIPT = """
+local now = tonumber(ARGV[1])
+local idle = tonumber(ARGV[2])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now - idle)
+if redis.call('ZSCORE', KEYS[1], ARGV[4]) or redis.call('ZCARD', KEYS[1]) < tonumber(ARGV[3]) then
+    redis.call('ZADD', KEYS[1], now, ARGV[4])
+    redis.call('PEXPIRE', KEYS[1], idle)
+    return 0
+end
+local oldest = redis.call('ZRANGE', KEYS[1], 0, 0, 'WITHSCORES')
+return tonumber(oldest[2]) + idle - now
+"""
+
+SLIDING_WINDOW = Script(None, SLIDING_WINDOW_SCRIPT.encode())
+CONCURRENT_STREAMS = Script(None, CONCURRENT_STREAMS_SCRIPT.encode())
+
+
+def run_script(script: Script, key: str, *args) -> int:
+    return int(script(keys=[key], args=args, client=get_redis_connection("default")))
+
+def get_playback_session(request) -> str | None:
+    session = request.headers.get(PLAYBACK_SESSION_HEADER) or request.COOKIES.get(PLAYBACK_SESSION_COOKIE) or ""
+    return session if PLAYBACK_SESSION_PATTERN.match(session) else None
+
+def set_playback_session_cookie(request, response):
+    # Issued with the playlists so each device counts as its own stream, whatever address it comes from.
+    if get_playback_session(request) is None:
+        response.set_cookie(
+            PLAYBACK_SESSION_COOKIE,
+            uuid.uuid4().hex,
+            secure=bool(getattr(settings, 'AUTH_COOKIE_SECURE', False)),
+            httponly=True,
+            samesite=getattr(settings, 'AUTH_COOKIE_SAMESITE', 'Lax'),
+            path='/api/video/'
+        )
+    return response
+
+
+class RedisRateThrottle(SimpleRateThrottle):
+    scope_attr = 'throttle_scope'
+
+    def __init__(self):
+        self.retry_after_ms = 0
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            ident = f"user:{request.user.pk}"
+        else:
+            ident = f"ip:{self.get_ident(request)}"
+        return f"{THROTTLE_KEY_PREFIX}:{self.scope}:{ident}"
+
+    def allow_request(self, request, view):
+        self.scope = getattr(view, self.scope_attr, None)
+        rate = api_settings.DEFAULT_THROTTLE_RATES.get(self.scope) if self.scope else None
+        if not rate:
+            return True
+
+        num_requests, duration = self.parse_rate(rate)
+        try:
+            self.retry_after_ms = run_script(
+                SLIDING_WINDOW, self.get_cache_key(request, view),
+                int(time.time() * 1000), duration * 1000, num_requests, uuid.uuid4().hex)
+        except RedisError:
+            return True
+        return self.retry_after_ms <= 0
+
+    def wait(self):
+        return max(self.retry_after_ms / 1000, 1)
+
+
+class ConcurrentStreamThrottle(BaseThrottle):
+    def __init__(self):
+        self.retry_after_ms = 0
+
+    def allow_request(self, request, view):
+        max_streams = int(getattr(settings, 'MAX_CONCURRENT_STREAMS', 0))
+        if not max_streams or not (request.user and request.user.is_authenticated):
+            return True
+
+        session = get_playback_session(request)
+        if session is None:
+            raise PermissionDenied("Playback session missing; request the playlist first.")
+
+        idle_seconds = int(getattr(settings, 'STREAM_IDLE_TIMEOUT', 60))
+        stream = f"{session}:{view.kwargs.get('movie_id')}"
+        try:
+            self.retry_after_ms = run_script(
+                CONCURRENT_STREAMS, f"{THROTTLE_KEY_PREFIX}:streams:{request.user.pk}",
+                int(time.time() * 1000), idle_seconds * 1000, max_streams, stream)
+        except RedisError:
+            return True
+        return self.retry_after_ms <= 0
+
+    def wait(self):
+        return max(self.retry_after_ms / 1000, 1)
@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.db import close_old_connections, connections
+from rq.worker import SimpleWorker, Worker
+
+
+class DjangoWorker(Worker):
+    """Forks a work horse per job, so crashes and leaks stay in the horse and job_timeout can kill it."""
+
+    def execute_job(self, job, queue):
+        # The horse would inherit the worker's sockets; close them so it opens its own connections.
+        connections.close_all()
+        return super().execute_job(job, queue)
+
+
+class DjangoSimpleWorker(DjangoWorker):
+    """Runs the high queue's short jobs in-process, keeping the DB connection; transcodes still fork."""
+
+    def execute_job(self, job, queue):
+        if job.func_name in getattr(settings, 'RQ_FORKED_JOBS', []):
+            return super().execute_job(job, queue)
+        return SimpleWorker.execute_job(self, job, queue)
+
+    def perform_job(self, job, queue):
+        close_old_connections()
+        try:
+            return super().perform_job(job, queue)
+        finally:
+            close_old_connections()
@@ -1,13 +1,13 @@
 from django.contrib import admin
-from .models import Video
+from .models import Video, JobOutbox, RenditionJob, WatchProgress, VideoViewBucket, QoERollup
 
 
 @admin.register(Video)
 class VideoAdmin(admin.ModelAdmin):
-    list_display = ('title', 'category', 'created_at', 'has_thumbnail')
-    list_filter = ('category', 'created_at')
+    list_display = ('title', 'category', 'created_at', 'view_count', 'is_live', 'has_thumbnail')
+    list_filter = ('category', 'is_live', 'created_at')
     search_fields = ('title', 'description', 'category')
-    readonly_fields = ('created_at',)
+    readonly_fields = ('created_at', 'view_count')
     ordering = ('-created_at',)
     date_hierarchy = 'created_at'
     
@@ -18,8 +18,11 @@ class VideoAdmin(admin.ModelAdmin):
         ('Dateien', {
             'fields': ('video_file', 'thumbnail')
         }),
+        ('Live', {
+            'fields': ('is_live', 'live_source')
+        }),
         ('Zeitstempel', {
-            'fields': ('created_at',),
+            'fields': ('created_at', 'view_count'),
             'classes': ('collapse',)
         }),
     )
@@ -28,3 +31,41 @@ class VideoAdmin(admin.ModelAdmin):
         return bool(obj.thumbnail)
     has_thumbnail.boolean = True
     has_thumbnail.short_description = 'Thumbnail'
+
+
+@admin.register(JobOutbox)
+class JobOutboxAdmin(admin.ModelAdmin):
+    list_display = ('func', 'queue', 'created_at', 'dispatched_at', 'attempts')
+    list_filter = ('queue', 'func')
+    readonly_fields = ('func', 'payload', 'queue', 'created_at', 'dispatched_at', 'attempts', 'last_error')
+    ordering = ('-created_at',)
+
+
+@admin.register(RenditionJob)
+class RenditionJobAdmin(admin.ModelAdmin):
+    list_display = ('video', 'name', 'status', 'attempts', 'started_at', 'finished_at')
+    list_filter = ('status', 'name')
+    readonly_fields = ('video', 'name', 'status', 'attempts', 'started_at', 'finished_at', 'last_error')
+
+
+@admin.register(WatchProgress)
+class WatchProgressAdmin(admin.ModelAdmin):
+    list_display = ('user', 'video', 'position', 'duration', 'updated_at')
+    search_fields = ('user__email', 'video__title')
+    raw_id_fields = ('user', 'video')
+    ordering = ('-updated_at',)
+
+
+@admin.register(VideoViewBucket)
+class VideoViewBucketAdmin(admin.ModelAdmin):
+    list_display = ('video', 'bucket_start', 'segment_hits', 'unique_viewers')
+    raw_id_fields = ('video',)
+    ordering = ('-bucket_start',)
+
+
+@admin.register(QoERollup)
+class QoERollupAdmin(admin.ModelAdmin):
+    list_display = ('video', 'rendition', 'bucket_start', 'startups', 'rebuffers', 'rebuffer_ms', 'switches', 'play_ms')
+    list_filter = ('rendition',)
+    raw_id_fields = ('video',)
+    ordering = ('-bucket_start',)
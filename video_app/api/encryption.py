@@ -0,0 +1,63 @@
+import os
+
+from pathlib import Path
+from cryptography.hazmat.primitives import padding
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+from django.conf import settings
+from ..models import VideoKey
+
+
+KEY_URI_TEMPLATE = "../keys/{index}/"
+
+
+def get_video_keys(video_id: int, count: int) -> dict:
+    VideoKey.objects.bulk_create(
+        [VideoKey(video_id=video_id, key_index=i, key=os.urandom(16)) for i in range(count)],
+        ignore_conflicts=True,
+    )
+    rows = VideoKey.objects.filter(video_id=video_id, key_index__lt=count).values_list('key_index', 'key')
+    return {index: bytes(key) for index, key in rows}
+
+def encrypt_segment(path: Path, key: bytes, media_sequence: int) -> int:
+    padder = padding.PKCS7(algorithms.AES.block_size).padder()
+    encryptor = Cipher(algorithms.AES(key), modes.CBC(media_sequence.to_bytes(16, "big"))).encryptor()
+    data = path.read_bytes()
+    encrypted = encryptor.update(padder.update(data) + padder.finalize()) + encryptor.finalize()
+    path.write_bytes(encrypted)
+    return len(encrypted) - len(data)
+
+def encrypt_hls_variant(variant_dir: Path, video_id: int) -> int:
+    playlist_path = variant_dir / "index.m3u8"
+    lines = playlist_path.read_text(encoding="utf-8").splitlines()
+    rotation = max(1, int(getattr(settings, 'HLS_KEY_ROTATION_SEGMENTS', 30)))
+
+    segments = []
+    media_sequence, extinf_index = 0, None
+    for i, line in enumerate(lines):
+        if line.startswith("#EXT-X-MEDIA-SEQUENCE:"):
+            media_sequence = int(line.split(":", 1)[1])
+        elif line.startswith("#EXTINF:"):
+            extinf_index = i
+        elif line and not line.startswith("#"):
+            segments.append((extinf_index if extinf_index is not None else i, line, media_sequence))
+            media_sequence += 1
+            extinf_index = None
+
+    if not segments:
+        return 0
+
+    keys = get_video_keys(video_id, segments[-1][2] // rotation + 1)
+    key_tags = {}
+    for tag_index, name, msn in segments:
+        # No IV attribute: players derive it from the media sequence number, as encrypt_segment does.
+        encrypt_segment(variant_dir / name, keys[msn // rotation], msn)
+        if msn == segments[0][2] or msn % rotation == 0:
+            key_tags[tag_index] = f'#EXT-X-KEY:METHOD=AES-128,URI="{KEY_URI_TEMPLATE.format(index=msn // rotation)}"'
+
+    output = []
+    for i, line in enumerate(lines):
+        if i in key_tags:
+            output.append(key_tags[i])
+        output.append(line)
+    playlist_path.write_text("\n".join(output) + "\n", encoding="utf-8")
+    return len(segments)
@@ -0,0 +1,65 @@
+import re, threading, time
+
+from pathlib import Path
+from django.conf import settings
+
+
+MEDIA_SEQUENCE_PATTERN = re.compile(r"^#EXT-X-MEDIA-SEQUENCE:(\d+)", re.M)
+TARGET_DURATION_PATTERN = re.compile(r"^#EXT-X-TARGETDURATION:(\d+)", re.M)
+SERVER_CONTROL_TAG = "#EXT-X-SERVER-CONTROL:CAN-BLOCK-RELOAD=YES"
+
+_waiters_lock = threading.Lock()
+_waiters = 0
+
+
+def read_live_playlist(playlist_path: Path) -> dict:
+    text = playlist_path.read_text(encoding="utf-8")
+    sequence = MEDIA_SEQUENCE_PATTERN.search(text)
+    target = TARGET_DURATION_PATTERN.search(text)
+    segments = sum(1 for line in text.splitlines() if line.startswith("#EXTINF:"))
+    return {
+        "text": text,
+        "last_msn": (int(sequence.group(1)) if sequence else 0) + segments - 1,
+        "target_duration": int(target.group(1)) if target else int(getattr(settings, 'LIVE_SEGMENT_SECONDS', 2)),
+        "ended": "#EXT-X-ENDLIST" in text,
+    }
+
+def acquire_blocking_slot() -> bool:
+    global _waiters
+    with _waiters_lock:
+        if _waiters >= int(getattr(settings, 'LIVE_BLOCKING_MAX_WAITERS', 2)):
+            return False
+        _waiters += 1
+        return True
+
+def release_blocking_slot():
+    global _waiters
+    with _waiters_lock:
+        _waiters -= 1
+
+def wait_for_media_sequence(playlist_path: Path, msn: int, timeout: float) -> dict | None:
+    poll_interval = float(getattr(settings, 'LIVE_BLOCKING_POLL_INTERVAL', 0.1))
+    deadline = time.monotonic() + timeout
+    last_mtime = None
+
+    while True:
+        try:
+            mtime = playlist_path.stat().st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+
+        if mtime is not None and mtime != last_mtime:
+            last_mtime = mtime
+            playlist = read_live_playlist(playlist_path)
+            if playlist["last_msn"] >= msn or playlist["ended"]:
+                return playlist
+
+        if time.monotonic() >= deadline:
+            return None
+        time.sleep(poll_interval)
+
+def add_server_control(text: str) -> str:
+    lines = text.splitlines()
+    if SERVER_CONTROL_TAG not in lines:
+        lines.insert(1, SERVER_CONTROL_TAG)
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,89 @@
+import django_rq
+
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from redis.exceptions import RedisError
+from rq import Queue, Retry
+from ..models import JobOutbox
+
+
+OUTBOX_RETRY_INTERVALS = [30, 120, 600]
+
+
+def get_func_path(func) -> str:
+    if isinstance(func, str):
+        return func
+    return f"{func.__module__}.{func.__name__}"
+
+def enqueue_on_commit(func, payload: dict, queue_name: str = 'default', max_retries: int = 0):
+    entry = JobOutbox.objects.create(
+        func=get_func_path(func), payload=payload, queue=queue_name, max_retries=max_retries)
+    # Push only this job; draining a backlog is the relay's work, not the request that happened to commit.
+    transaction.on_commit(lambda: dispatch_pending_jobs(ids=[entry.id]))
+    return entry
+
+def enqueue_many_on_commit(func, payloads: list, queue_name: str = 'default', batch_size: int = 1000):
+    entries = JobOutbox.objects.bulk_create(
+        [JobOutbox(func=get_func_path(func), payload=payload, queue=queue_name) for payload in payloads],
+        batch_size=batch_size
+    )
+    ids = [entry.id for entry in entries]
+    transaction.on_commit(lambda: dispatch_pending_jobs(batch_size=batch_size, ids=ids))
+    return entries
+
+def push_entries_to_redis(entries: list):
+    by_queue = {}
+    for entry in entries:
+        by_queue.setdefault(entry.queue, []).append(entry)
+
+    for queue_name, queue_entries in by_queue.items():
+        queue = django_rq.get_queue(queue_name)
+        with queue.connection.pipeline() as pipe:
+            queue.enqueue_many(
+                [
+                    Queue.prepare_data(
+                        entry.func,
+                        args=(entry.payload,),
+                        job_id=f"outbox-{entry.id}",
+                        retry=Retry(max=entry.max_retries, interval=OUTBOX_RETRY_INTERVALS) if entry.max_retries else None
+                    )
+                    for entry in queue_entries
+                ],
+                pipeline=pipe
+            )
+            pipe.execute()
+
+def dispatch_pending_jobs(batch_size: int = 1000, ids: list = None) -> int:
+    pending = JobOutbox.objects.filter(dispatched_at__isnull=True)
+    if ids is not None:
+        pending = pending.filter(id__in=ids)
+    dispatched = 0
+
+    while True:
+        with transaction.atomic():
+            entries = list(pending.select_for_update(skip_locked=True).order_by('id')[:batch_size])
+            if not entries:
+                break
+
+            ids = [entry.id for entry in entries]
+            try:
+                push_entries_to_redis(entries)
+            except RedisError as e:
+                JobOutbox.objects.filter(id__in=ids).update(attempts=F('attempts') + 1, last_error=str(e))
+                print(f"Outbox dispatch failed, {len(ids)} jobs left for the relay: {e}")
+                break
+
+            JobOutbox.objects.filter(id__in=ids).update(attempts=F('attempts') + 1, dispatched_at=timezone.now())
+
+        dispatched += len(entries)
+        if len(entries) < batch_size:
+            break
+
+    return dispatched
+
+def purge_dispatched_jobs(retention: timedelta) -> int:
+    deleted, _ = JobOutbox.objects.filter(dispatched_at__lt=timezone.now() - retention).delete()
+    return deleted
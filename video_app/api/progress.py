@@ -0,0 +1,71 @@
+import json, time
+
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django_redis import get_redis_connection
+
+
+PROGRESS_KEY_PREFIX = "videoflix:progress"
+PROGRESS_DIRTY_KEY = f"{PROGRESS_KEY_PREFIX}:dirty"
+PROGRESS_LOADED_FIELD = "loaded"
+
+
+def get_progress_key(user_id: int) -> str:
+    return f"{PROGRESS_KEY_PREFIX}:{user_id}"
+
+def record_progress(user_id: int, video_id: int, position: float, duration: float):
+    ttl = int(getattr(settings, 'WATCH_PROGRESS_TTL', 30 * 24 * 3600))
+    key = get_progress_key(user_id)
+
+    pipe = get_redis_connection("default").pipeline(transaction=False)
+    pipe.hset(key, video_id, json.dumps([round(position, 1), round(duration, 1), int(time.time())]))
+    pipe.expire(key, ttl)
+    pipe.sadd(PROGRESS_DIRTY_KEY, user_id)
+    pipe.execute()
+
+def decode_progress(raw: dict) -> dict:
+    entries = {}
+    for video_id, value in raw.items():
+        if video_id in (PROGRESS_LOADED_FIELD, PROGRESS_LOADED_FIELD.encode()):
+            continue
+        position, duration, updated = json.loads(value)
+        entries[int(video_id)] = {
+            "position": position,
+            "duration": duration,
+            "updated_at": datetime.fromtimestamp(updated, tz=dt_timezone.utc),
+        }
+    return entries
+
+def get_progress(user_id: int, load_from_db) -> dict:
+    conn = get_redis_connection("default")
+    key = get_progress_key(user_id)
+    raw = conn.hgetall(key)
+    if PROGRESS_LOADED_FIELD in raw or PROGRESS_LOADED_FIELD.encode() in raw:
+        return decode_progress(raw)
+
+    pipe = conn.pipeline(transaction=False)
+    for video_id, e in load_from_db().items():
+        pipe.hsetnx(key, video_id, json.dumps([e["position"], e["duration"], int(e["updated_at"].timestamp())]))
+    pipe.hset(key, PROGRESS_LOADED_FIELD, 1)
+    pipe.expire(key, int(getattr(settings, 'WATCH_PROGRESS_TTL', 30 * 24 * 3600)))
+    pipe.hgetall(key)
+    return decode_progress(pipe.execute()[-1])
+
+def pop_dirty_progress(batch_size: int) -> dict:
+    conn = get_redis_connection("default")
+    user_ids = [int(u) for u in conn.spop(PROGRESS_DIRTY_KEY, batch_size) or []]
+    if not user_ids:
+        return {}
+
+    pipe = conn.pipeline(transaction=False)
+    for user_id in user_ids:
+        pipe.hgetall(get_progress_key(user_id))
+    return {user_id: decode_progress(raw) for user_id, raw in zip(user_ids, pipe.execute())}
+
+def is_unfinished(entry: dict) -> bool:
+    min_position = float(getattr(settings, 'CONTINUE_WATCHING_MIN_POSITION', 5))
+    max_ratio = float(getattr(settings, 'CONTINUE_WATCHING_MAX_RATIO', 0.95))
+    if entry["position"] < min_position:
+        return False
+    return not entry["duration"] or entry["position"] < entry["duration"] * max_ratio
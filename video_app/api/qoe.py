@@ -0,0 +1,113 @@
+import json, math, zlib
+
+from django.conf import settings
+from django_redis import get_redis_connection
+from redis.exceptions import ResponseError
+
+from .view_counts import get_bucket, get_bucket_start
+
+
+QOE_STREAM_KEY = "videoflix:qoe:events"
+QOE_DEAD_LETTER_KEY = "videoflix:qoe:dead"
+QOE_CONSUMER_GROUP = "qoe-rollup"
+QOE_EVENT_TYPES = ("startup", "rebuffer", "switch", "play")
+QOE_COUNTER_FIELDS = ["startups", "startup_ms", "rebuffers", "rebuffer_ms", "switches", "play_ms"]
+MAX_VIDEO_ID = 2 ** 63 - 1
+
+
+def decode_beacon_body(body: bytes, content_encoding: str) -> list:
+    max_bytes = int(getattr(settings, 'QOE_MAX_BODY_BYTES', 256 * 1024))
+    if content_encoding.lower() == "gzip":
+        decompressor = zlib.decompressobj(wbits=31)
+        try:
+            body = decompressor.decompress(body, max_bytes)
+        except zlib.error as exc:
+            raise ValueError("Beacon body is not valid gzip.") from exc
+        if decompressor.unconsumed_tail:
+            raise ValueError("Beacon body is too large.")
+    elif len(body) > max_bytes:
+        raise ValueError("Beacon body is too large.")
+    try:
+        return json.loads(body)
+    except RecursionError as exc:
+        raise ValueError("Beacon body is nested too deeply.") from exc
+
+def normalize_events(raw) -> list:
+    max_events = int(getattr(settings, 'QOE_MAX_EVENTS_PER_BATCH', 500))
+    if not isinstance(raw, list) or not raw or len(raw) > max_events:
+        raise ValueError(f"Expected a list of 1 to {max_events} events.")
+
+    max_value = int(getattr(settings, 'QOE_MAX_EVENT_VALUE', 24 * 3600 * 1000))
+    events = []
+    for event in raw:
+        if not isinstance(event, dict) or event.get("type") not in QOE_EVENT_TYPES:
+            raise ValueError("Unknown event.")
+        video_id, value = int(event["video_id"]), float(event.get("value", 0))
+        if not 0 < video_id <= MAX_VIDEO_ID:
+            raise ValueError("Video id out of range.")
+        if not math.isfinite(value) or not 0 <= value <= max_value:
+            raise ValueError("Event value out of range.")
+        events.append([event["type"], video_id, str(event.get("rendition", ""))[:20], round(value)])
+    return events
+
+def append_events(user_id: int, events: list) -> bytes:
+    return get_redis_connection("default").xadd(
+        QOE_STREAM_KEY,
+        {"user": user_id, "events": json.dumps(events, separators=(",", ":"))},
+        maxlen=int(getattr(settings, 'QOE_STREAM_MAXLEN', 1_000_000)),
+        approximate=True,
+    )
+
+def ensure_consumer_group(conn):
+    try:
+        conn.xgroup_create(QOE_STREAM_KEY, QOE_CONSUMER_GROUP, id="0", mkstream=True)
+    except ResponseError as exc:
+        if "BUSYGROUP" not in str(exc):
+            raise
+
+def claim_event_batches(consumer: str, count: int, block_ms: int) -> list:
+    conn = get_redis_connection("default")
+    ensure_consumer_group(conn)
+
+    idle_ms = int(getattr(settings, 'QOE_CLAIM_IDLE_MS', 60_000))
+    claimed = conn.xautoclaim(QOE_STREAM_KEY, QOE_CONSUMER_GROUP, consumer, idle_ms, count=count)[1]
+    entries = [(entry_id, fields) for entry_id, fields in claimed if fields]
+    if entries:
+        return entries
+
+    response = conn.xreadgroup(QOE_CONSUMER_GROUP, consumer, {QOE_STREAM_KEY: ">"}, count=count, block=block_ms)
+    return response[0][1] if response else []
+
+def ack_event_batches(entry_ids: list):
+    if entry_ids:
+        get_redis_connection("default").xack(QOE_STREAM_KEY, QOE_CONSUMER_GROUP, *entry_ids)
+
+def dead_letter_event_batches(entries: list, error: str):
+    if not entries:
+        return
+    pipe = get_redis_connection("default").pipeline()
+    for entry_id, fields in entries:
+        pipe.xadd(QOE_DEAD_LETTER_KEY, {**fields, b"id": entry_id, b"error": error[:500]},
+                  maxlen=int(getattr(settings, 'QOE_DEAD_LETTER_MAXLEN', 10_000)), approximate=True)
+    pipe.xack(QOE_STREAM_KEY, QOE_CONSUMER_GROUP, *[entry_id for entry_id, _ in entries])
+    pipe.execute()
+
+def aggregate_event_batches(entries: list) -> dict:
+    rollups = {}
+    for entry_id, fields in entries:
+        received_ms = int(entry_id.split(b"-")[0])
+        bucket_start = get_bucket_start(get_bucket(received_ms / 1000))
+
+        for kind, video_id, rendition, value in json.loads(fields[b"events"]):
+            counters = rollups.setdefault((video_id, rendition, bucket_start), dict.fromkeys(QOE_COUNTER_FIELDS, 0))
+            if kind == "startup":
+                counters["startups"] += 1
+                counters["startup_ms"] += value
+            elif kind == "rebuffer":
+                counters["rebuffers"] += 1
+                counters["rebuffer_ms"] += value
+            elif kind == "switch":
+                counters["switches"] += 1
+            else:
+                counters["play_ms"] += value
+    return rollups
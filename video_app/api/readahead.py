@@ -0,0 +1,64 @@
+import os, re, threading, time
+
+from collections import OrderedDict
+from pathlib import Path
+from django.conf import settings
+
+
+SEGMENT_NUMBER_PATTERN = re.compile(r"^(.*?)(\d+)(\.\w+)$")
+RECENT_ADVICE_LIMIT = 4096
+
+_recent_advice = OrderedDict()
+_recent_lock = threading.Lock()
+
+
+def get_next_segment_paths(segment_path: Path, count: int) -> list:
+    match = SEGMENT_NUMBER_PATTERN.match(segment_path.name)
+    if not match:
+        return []
+    prefix, number, suffix = match.groups()
+    start = int(number)
+    return [segment_path.with_name(f"{prefix}{n:0{len(number)}d}{suffix}") for n in range(start + 1, start + 1 + count)]
+
+def was_recently_advised(path: Path, ttl: float) -> bool:
+    with _recent_lock:
+        advised_at = _recent_advice.get(str(path))
+    return advised_at is not None and time.monotonic() - advised_at < ttl
+
+def mark_advised(path: Path):
+    key = str(path)
+    with _recent_lock:
+        _recent_advice[key] = time.monotonic()
+        _recent_advice.move_to_end(key)
+        while len(_recent_advice) > RECENT_ADVICE_LIMIT:
+            _recent_advice.popitem(last=False)
+
+def advise_willneed(path: Path) -> bool:
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return False
+    try:
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+    except OSError:
+        return False
+    finally:
+        os.close(fd)
+    return True
+
+def prefetch_next_segments(segment_path: Path) -> int:
+    count = int(getattr(settings, 'HLS_READAHEAD_SEGMENTS', 3))
+    if count <= 0 or not hasattr(os, 'posix_fadvise'):
+        return 0
+
+    ttl = float(getattr(settings, 'HLS_READAHEAD_TTL', 30))
+    advised = 0
+    for path in get_next_segment_paths(segment_path, count):
+        if was_recently_advised(path, ttl):
+            continue
+        # Only remembered once advised, so a live segment that doesn't exist yet is retried when it appears.
+        if not advise_willneed(path):
+            break
+        mark_advised(path)
+        advised += 1
+    return advised
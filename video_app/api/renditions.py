@@ -0,0 +1,42 @@
+import time
+
+from django.conf import settings
+from django_redis import get_redis_connection
+
+
+RENDITION_KEY_PREFIX = "videoflix:rendition"
+RENDITION_ACCESS_KEY = f"{RENDITION_KEY_PREFIX}:access"
+
+
+def is_lazy_transcode() -> bool:
+    return getattr(settings, 'TRANSCODE_POLICY', 'eager') == 'lazy'
+
+def get_rendition_member(video_id: int, name: str) -> str:
+    return f"{video_id}:{name}"
+
+def get_rendition_lock_key(video_id: int, name: str) -> str:
+    return f"{RENDITION_KEY_PREFIX}:lock:{video_id}:{name}"
+
+def acquire_rendition_lock(video_id: int, name: str) -> bool:
+    ttl = int(getattr(settings, 'RENDITION_LOCK_TTL', 1800))
+    return bool(get_redis_connection("default").set(get_rendition_lock_key(video_id, name), 1, nx=True, ex=ttl))
+
+def release_rendition_lock(video_id: int, name: str):
+    get_redis_connection("default").delete(get_rendition_lock_key(video_id, name))
+
+def touch_rendition(video_id: int, name: str):
+    get_redis_connection("default").zadd(RENDITION_ACCESS_KEY, {get_rendition_member(video_id, name): time.time()})
+
+def find_cold_renditions(max_idle: int, limit: int) -> list:
+    members = get_redis_connection("default").zrangebyscore(
+        RENDITION_ACCESS_KEY, '-inf', time.time() - max_idle, start=0, num=limit)
+    renditions = []
+    for member in members:
+        video_id, name = (member.decode() if isinstance(member, bytes) else member).split(":", 1)
+        renditions.append((int(video_id), name))
+    return renditions
+
+def forget_renditions(renditions: list):
+    if renditions:
+        get_redis_connection("default").zrem(
+            RENDITION_ACCESS_KEY, *[get_rendition_member(video_id, name) for video_id, name in renditions])
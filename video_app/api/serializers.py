@@ -1,12 +1,15 @@
+from django.urls import reverse
 from rest_framework import serializers
 from ..models import Video
+from .thumbnails import THUMBNAIL_WIDTHS
 
 class VideoListSerializer(serializers.ModelSerializer):
     thumbnail_url = serializers.SerializerMethodField()
+    thumbnail_srcset = serializers.SerializerMethodField()
 
     class Meta:
         model = Video
-        fields = ['id', 'created_at','title', 'description', 'thumbnail_url', 'category']
+        fields = ['id', 'created_at','title', 'description', 'thumbnail_url', 'thumbnail_srcset', 'category', 'view_count', 'is_live']
     
     def get_thumbnail_url(self, obj):
         request = self.context.get('request')
@@ -16,5 +19,38 @@ class VideoListSerializer(serializers.ModelSerializer):
         if request:
             return request.build_absolute_uri(url)
         return url
-    
-    
\ No newline at end of file
+
+    def get_thumbnail_srcset(self, obj):
+        request = self.context.get('request')
+        if not obj.thumbnail:
+            return None
+        base_url = reverse('video-thumbnail', args=[obj.id])
+        if request:
+            base_url = request.build_absolute_uri(base_url)
+        return ", ".join(f"{base_url}?w={w} {w}w" for w in THUMBNAIL_WIDTHS)
+
+
+class WatchProgressSerializer(serializers.Serializer):
+    position = serializers.FloatField(min_value=0)
+    duration = serializers.FloatField(min_value=0, required=False, default=0)
+
+
+class ContinueWatchingSerializer(VideoListSerializer):
+    position = serializers.SerializerMethodField()
+    duration = serializers.SerializerMethodField()
+    progress_updated_at = serializers.SerializerMethodField()
+
+    class Meta(VideoListSerializer.Meta):
+        fields = VideoListSerializer.Meta.fields + ['position', 'duration', 'progress_updated_at']
+
+    def get_progress(self, obj):
+        return self.context["progress"][obj.id]
+
+    def get_position(self, obj):
+        return self.get_progress(obj)["position"]
+
+    def get_duration(self, obj):
+        return self.get_progress(obj)["duration"]
+
+    def get_progress_updated_at(self, obj):
+        return self.get_progress(obj)["updated_at"]
@@ -1,7 +1,112 @@
-from ..models import Video
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, router, transaction
+from django.db.models import Case, IntegerField, Value, When
+from ..models import Video, WatchProgress, VideoViewBucket, QoERollup, VideoKey
+from .view_counts import get_window_buckets, rank_viewed_videos
+
+TRENDING_CACHE_KEY = "video:trending"
+VIDEO_KEY_CACHE_PREFIX = "video:key"
 
 def list_videos_queryset():
     return Video.objects.all().order_by('-created_at')
 
 def get_video_by_id(video_id: int) -> Video:
-    return Video.objects.get(id=video_id)
\ No newline at end of file
+    return Video.objects.get(id=video_id)
+
+def get_cached_video_key(video_id: int, key_index: int) -> bytes | None:
+    cache_key = f"{VIDEO_KEY_CACHE_PREFIX}:{video_id}:{key_index}"
+    key = cache.get(cache_key)
+    if key is None:
+        key = VideoKey.objects.filter(video_id=video_id, key_index=key_index).values_list('key', flat=True).first()
+        if key is None:
+            return None
+        key = bytes(key)
+        cache.set(cache_key, key, int(getattr(settings, 'HLS_KEY_CACHE_TTL', 3600)))
+    return key
+
+def list_watch_progress(user_id: int, limit: int) -> dict:
+    rows = WatchProgress.objects.filter(user_id=user_id).order_by('-updated_at')[:limit]
+    return {
+        row.video_id: {"position": row.position, "duration": row.duration, "updated_at": row.updated_at}
+        for row in rows
+    }
+
+def upsert_watch_progress(progress_by_user: dict) -> int:
+    video_ids = {video_id for entries in progress_by_user.values() for video_id in entries}
+    existing = set(Video.objects.filter(id__in=video_ids).values_list('id', flat=True))
+
+    rows = [
+        WatchProgress(user_id=user_id, video_id=video_id, **entry)
+        for user_id, entries in progress_by_user.items()
+        for video_id, entry in entries.items()
+        if video_id in existing
+    ]
+    WatchProgress.objects.bulk_create(
+        rows,
+        batch_size=1000,
+        update_conflicts=True,
+        unique_fields=['user', 'video'],
+        update_fields=['position', 'duration', 'updated_at'],
+    )
+    return len(rows)
+
+def upsert_view_buckets(buckets: list, view_counts: dict) -> set:
+    existing = set(Video.objects.filter(id__in={b["video_id"] for b in buckets}).values_list('id', flat=True))
+    VideoViewBucket.objects.bulk_create(
+        [VideoViewBucket(**b) for b in buckets if b["video_id"] in existing],
+        batch_size=1000,
+        update_conflicts=True,
+        unique_fields=['video', 'bucket_start'],
+        update_fields=['segment_hits', 'unique_viewers'],
+    )
+    # Distinct viewers over all time, not a sum of hourly buckets that would count a long watch once per hour.
+    Video.objects.bulk_update(
+        [Video(id=video_id, view_count=view_counts[video_id]) for video_id in existing if video_id in view_counts],
+        ['view_count'],
+        batch_size=1000,
+    )
+    return existing
+
+def add_qoe_rollups(rollups: dict, counter_fields: list) -> int:
+    existing = set(Video.objects.filter(id__in={key[0] for key in rollups}).values_list('id', flat=True))
+    rollups = {key: counters for key, counters in rollups.items() if key[0] in existing}
+    if not rollups:
+        return 0
+
+    # Increment in the upsert itself so concurrent consumers creating the same row add up instead of colliding.
+    connection = connections[router.db_for_write(QoERollup)]
+    quote = connection.ops.quote_name
+    table = quote(QoERollup._meta.db_table)
+    columns = ["video_id", "rendition", "bucket_start", *counter_fields]
+    sql = (
+        f"INSERT INTO {table} ({', '.join(quote(c) for c in columns)}) VALUES ({', '.join(['%s'] * len(columns))}) "
+        f"ON CONFLICT ({quote('video_id')}, {quote('rendition')}, {quote('bucket_start')}) DO UPDATE SET "
+        + ", ".join(f"{quote(f)} = {table}.{quote(f)} + EXCLUDED.{quote(f)}" for f in counter_fields)
+    )
+    params = [
+        [video_id, rendition, connection.ops.adapt_datetimefield_value(bucket_start),
+         *[rollups[(video_id, rendition, bucket_start)][f] for f in counter_fields]]
+        for video_id, rendition, bucket_start in sorted(rollups)
+    ]
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        cursor.executemany(sql, params)
+    return len(rollups)
+
+def get_trending_video_ids() -> list:
+    video_ids = cache.get(TRENDING_CACHE_KEY)
+    if video_ids is None:
+        ranked = rank_viewed_videos(get_window_buckets(int(getattr(settings, 'TRENDING_WINDOW', 48 * 3600))))
+        existing = set(Video.objects.filter(id__in=[video_id for video_id, _ in ranked]).values_list('id', flat=True))
+        video_ids = [video_id for video_id, _ in ranked if video_id in existing][:int(getattr(settings, 'TRENDING_LIMIT', 20))]
+        cache.set(TRENDING_CACHE_KEY, video_ids, int(getattr(settings, 'TRENDING_CACHE_TTL', 300)))
+    return video_ids
+
+def list_trending_queryset():
+    video_ids = get_trending_video_ids()
+    rank = Case(*[When(id=video_id, then=Value(i)) for i, video_id in enumerate(video_ids)],
+                output_field=IntegerField())
+    return Video.objects.filter(id__in=video_ids).order_by(rank)
+
+def invalidate_trending():
+    cache.delete(TRENDING_CACHE_KEY)
@@ -1,41 +1,22 @@
 from video_app.models import Video
 from django.dispatch import receiver
 from django.db.models.signals import post_save, post_delete
-from .tasks import process_video_to_hls, generate_thumbnail_for_video
-import django_rq, os, shutil
-from django.conf import settings
+from .outbox import enqueue_on_commit
+from core.jobs import build_job_payload
 
 @receiver(post_save, sender=Video)
 def video_post_save(sender, instance, created, **kwargs):
-    if created:
+    if created and not instance.is_live:
         print("Video created, enqueueing processing task.")
         print(f"Video ID: {instance.id}, Video Path: {instance.video_file.path}")
 
-        queue = django_rq.get_queue('default', autocommit=True)
-        queue.enqueue(process_video_to_hls, video_id= instance.id)
-        queue.enqueue(generate_thumbnail_for_video, instance, instance.video_file.path)
+        enqueue_on_commit("video_app.api.tasks.process_video_to_hls", build_job_payload(video_id=instance.id))
 
 @receiver(post_delete, sender=Video)
 def video_post_delete(sender, instance, **kwargs):
-    video_id = instance.id
-
-    if getattr(instance, "video_file", None) and instance.video_file:
-        try: 
-            if os.path.exists(instance.video_file.path):
-                os.remove(instance.video_file.path)
-        except Exception:
-            pass
-
-    if getattr(instance, "thumbnail", None) and instance.thumbnail:
-        try: 
-            if os.path.exists(instance.thumbnail.path):
-                os.remove(instance.thumbnail.path)
-        except Exception:
-            pass
-
-    hls_dir = os.path.join(getattr(settings, "MEDIA_ROOT", ""), 'hls', str(video_id))
-    try:
-        if os.path.exists(hls_dir):
-            shutil.rmtree(hls_dir)
-    except Exception:
-        pass
\ No newline at end of file
+    files = [f.name for f in (instance.video_file, instance.thumbnail) if f]
+    enqueue_on_commit(
+        "video_app.api.tasks.delete_video_storage",
+        build_job_payload(video_id=instance.id, files=files),
+        max_retries=3
+    )
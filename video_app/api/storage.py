@@ -0,0 +1,113 @@
+import os, time, uuid
+
+from pathlib import Path
+
+from django.conf import settings
+from .utils import STAGING_PREFIX
+
+
+def get_media_root() -> Path:
+    return Path(getattr(settings, "MEDIA_ROOT"))
+
+def unlink_batched(paths, batch_size: int = 500, pause: float = 0.0) -> tuple:
+    removed = reclaimed = 0
+    errors = []
+
+    for i, path in enumerate(paths, start=1):
+        try:
+            size = path.stat().st_size
+            path.unlink()
+            removed += 1
+            reclaimed += size
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            errors.append(f"{path}: {e}")
+
+        if pause and i % batch_size == 0:
+            time.sleep(pause)
+
+    return removed, reclaimed, errors
+
+def get_trash_dirs(root: Path) -> list:
+    return sorted(root.parent.glob(f"{STAGING_PREFIX}trash-{root.name}-*"))
+
+def purge_tree(root: Path, batch_size: int = 500, pause: float = 0.0) -> tuple:
+    files = [Path(dirpath) / name for dirpath, _, names in os.walk(root) for name in names]
+    removed, reclaimed, errors = unlink_batched(files, batch_size, pause)
+
+    for dirpath, _, _ in sorted(os.walk(root), key=lambda entry: len(entry[0]), reverse=True):
+        try:
+            os.rmdir(dirpath)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            errors.append(f"{dirpath}: {e}")
+
+    return removed, reclaimed, errors
+
+def remove_tree_batched(root: Path, batch_size: int = 500, pause: float = 0.0) -> tuple:
+    if root.exists():
+        try:
+            os.rename(root, root.with_name(f"{STAGING_PREFIX}trash-{root.name}-{uuid.uuid4().hex[:12]}"))
+        except FileNotFoundError:
+            pass
+
+    # Also picks up trash left behind by an earlier attempt that failed partway.
+    removed = reclaimed = 0
+    errors = []
+    for trash_dir in get_trash_dirs(root):
+        tree_removed, tree_reclaimed, tree_errors = purge_tree(trash_dir, batch_size, pause)
+        removed += tree_removed
+        reclaimed += tree_reclaimed
+        errors += tree_errors
+
+    return removed, reclaimed, errors
+
+def find_stale_trash_dirs(parents: list, cutoff: float) -> list:
+    stale = []
+    for parent in parents:
+        for entry in parent.glob(f"{STAGING_PREFIX}trash-*"):
+            try:
+                if entry.is_dir() and entry.stat().st_mtime < cutoff:
+                    stale.append(entry)
+            except FileNotFoundError:
+                pass
+    return stale
+
+def get_tree_size(root: Path) -> int:
+    total = 0
+    for dirpath, _, names in os.walk(root):
+        for name in names:
+            try:
+                total += (Path(dirpath) / name).stat().st_size
+            except FileNotFoundError:
+                pass
+    return total
+
+def find_orphaned_media(video_ids: set, referenced_files: set, grace_seconds: int) -> list:
+    media_root = get_media_root()
+    cutoff = time.time() - grace_seconds
+    orphans = []
+
+    for kind, parent in (("hls", media_root / "hls"), ("thumbnail_cache", media_root / "cache" / "thumbnails")):
+        if not parent.exists():
+            continue
+        for entry in parent.iterdir():
+            if entry.is_dir() and entry.name.isdigit() and int(entry.name) not in video_ids \
+                    and entry.stat().st_mtime < cutoff:
+                orphans.append({"kind": kind, "path": entry, "bytes": get_tree_size(entry)})
+
+    for entry in find_stale_trash_dirs([media_root / "hls", media_root / "cache" / "thumbnails"], cutoff):
+        orphans.append({"kind": "trash", "path": entry, "bytes": get_tree_size(entry)})
+
+    for kind, parent in (("video", media_root / "videos"), ("thumbnail", media_root / "thumbnails")):
+        if not parent.exists():
+            continue
+        for entry in parent.iterdir():
+            if not entry.is_file() or entry.stat().st_mtime >= cutoff:
+                continue
+            if f"{parent.name}/{entry.name}" not in referenced_files:
+                orphans.append({"kind": kind, "path": entry, "bytes": entry.stat().st_size})
+
+    return orphans
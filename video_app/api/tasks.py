@@ -1,118 +1,544 @@
-import os, subprocess, django_rq
+import os, re, json, math, time, shutil, tempfile, subprocess, django_rq
 
+from datetime import timedelta
 from pathlib import Path
 
 from django.conf import settings
-from django.core.files import File
-from ..models import Video
+from django.db.models import F, Q
+from django.utils import timezone
+from redis.exceptions import RedisError
+from rq import Retry, get_current_job
+from rq.job import Dependency
+from core.jobs import build_job_payload, read_job_payload
+from core.metrics import track_job, ENCODE_SPEED
+from core.profiling import profiled_job
+from ..models import Video, RenditionJob
+from .utils import get_hls_root_dir, get_hls_playlist_path, get_hls_variant_dir, make_staging_dir, publish_directory, run_ffmpeg, STAGING_PREFIX
+from .storage import get_media_root, unlink_batched, remove_tree_batched, purge_tree, find_orphaned_media, find_stale_trash_dirs
+from .progress import pop_dirty_progress
+from .outbox import enqueue_on_commit
+from .renditions import is_lazy_transcode, acquire_rendition_lock, release_rendition_lock, touch_rendition, find_cold_renditions, forget_renditions
+from .services import upsert_watch_progress, upsert_view_buckets, invalidate_trending
+from .view_counts import VIEW_BUCKET_SECONDS, get_window_buckets, read_view_buckets, count_total_viewers, delete_total_viewers
+from .encryption import encrypt_hls_variant
+from .thumbnails import enforce_thumbnail_cache_limit
 
 
 HLS_VARIANTS = [
-    {"name": "480p", "height": 480, "v_bitrate": "1400k", "maxrate": "1498k", "bufsize": "2100k", "bandwidth": 1600000},
-    {"name": "720p", "height": 720, "v_bitrate": "2800k", "maxrate": "2996k", "bufsize": "4200k", "bandwidth": 3200000},
-    {"name": "1080p", "height": 1080, "v_bitrate": "5000k", "maxrate": "5350k", "bufsize": "7500k", "bandwidth": 5800000},
+    {"name": "480p", "height": 480, "maxrate": 1498, "bufsize": 2100},
+    {"name": "720p", "height": 720, "maxrate": 2996, "bufsize": 4200},
+    {"name": "1080p", "height": 1080, "maxrate": 5350, "bufsize": 7500},
 ]
 
-def process_video_to_hls(video_id: int):
-    video = Video.objects.get(id=video_id)
+AUDIO_RENDITION = "audio"
+AUDIO_GROUP_ID = "aud"
+VIDEO_CODEC = "avc1.640028"
+AUDIO_CODEC = "mp4a.40.2"
+
+TARGET_CRF = 23
+AUDIO_BITRATE_KBPS = 128
+COMPLEXITY_SAMPLES = 3
+COMPLEXITY_SAMPLE_SECONDS = 4
+COMPLEXITY_PROBE_HEIGHT = 360
+LADDER_SCALE_EXPONENT = 1.5
+LADDER_PEAK_FACTOR = 1.6
+LADDER_MIN_RATIO = 0.35
+LADDER_MAX_RATIO = 1.3
+
+PREVIEW_SPRITE_INTERVAL = 10
+PREVIEW_SPRITE_COLUMNS = 10
+PREVIEW_SPRITE_ROWS = 10
+PREVIEW_TILE_WIDTH = 160
+POSTER_CANDIDATES = 8
+POSTER_WIDTH = 640
+
+TRANSCODE_MAX_RETRIES = 3
+TRANSCODE_RETRY_INTERVALS = [60, 300, 900]
+
+def get_variant_config(name: str) -> dict:
+    return next(v for v in HLS_VARIANTS if v["name"] == name)
+
+def get_ingest_variants() -> list:
+    return HLS_VARIANTS[:1] if is_lazy_transcode() else HLS_VARIANTS
+
+def uses_separate_audio(probe: dict | None) -> bool:
+    return getattr(settings, 'HLS_SEPARATE_AUDIO', False) and bool(probe and probe.get("has_audio"))
+
+def can_transcode_on_demand(video_id: int, name: str) -> bool:
+    return (
+        is_lazy_transcode()
+        and any(v["name"] == name for v in HLS_VARIANTS[1:])
+        and get_hls_playlist_path(video_id, HLS_VARIANTS[0]["name"]).exists()
+        and not has_recent_rendition_failure(video_id, name)
+    )
+
+def has_recent_rendition_failure(video_id: int, name: str) -> bool:
+    cooldown = int(getattr(settings, 'RENDITION_FAILURE_COOLDOWN', 600))
+    return RenditionJob.objects.filter(
+        video_id=video_id, name=name, status='failed', finished_at__gte=timezone.now() - timedelta(seconds=cooldown)
+    ).exists()
+
+def release_on_demand_lock(video_id: int, name: str):
+    if not is_lazy_transcode():
+        return
+    try:
+        release_rendition_lock(video_id, name)
+    except RedisError as e:
+        print(f"Could not release rendition lock for video {video_id}: {e}")
+
+def is_final_attempt() -> bool:
+    job = get_current_job()
+    return job is None or not job.retries_left
+
+def request_on_demand_rendition(video_id: int, name: str) -> bool:
+    if not acquire_rendition_lock(video_id, name):
+        return False
+
+    RenditionJob.objects.get_or_create(video_id=video_id, name=name)
+    RenditionJob.objects.filter(video_id=video_id, name=name).update(status='pending')
+    separate_audio = get_hls_playlist_path(video_id, AUDIO_RENDITION).exists()
+    enqueue_on_commit(
+        process_single_variant,
+        build_job_payload(video_id=video_id, variant=name, separate_audio=separate_audio),
+        queue_name='high',
+        max_retries=TRANSCODE_MAX_RETRIES
+    )
+    print(f"Requested on-demand {name} for video {video_id}")
+    return True
+
+def get_encryption_video_id(video_id: int) -> int | None:
+    return video_id if getattr(settings, 'HLS_ENCRYPTION', False) else None
+
+def load_video_for_job(video_id: int, *fields: str):
+    video = Video.objects.only("id", *fields).filter(id=video_id).first()
+    if video is None:
+        print(f"Video {video_id} no longer exists, skipping job.")
+    return video
+
+@track_job
+@profiled_job
+def process_video_to_hls(payload: dict):
+    video_id = read_job_payload(payload, "video_id")["video_id"]
+    video = load_video_for_job(video_id, "video_file", "thumbnail", "encoding_ladder")
+    if video is None:
+        return {"video_id": video_id, "skipped": True}
+
     input_path = Path(video.video_file.path)
 
-    output_root = Path(getattr(settings, 'MEDIA_ROOT')) / 'hls' / str(video.id)
+    output_root = get_hls_root_dir(video.id)
     output_root.mkdir(parents=True, exist_ok=True)
 
+    try:
+        probe = probe_video(input_path)
+    except (RuntimeError, OSError, ValueError) as e:
+        # Transcode with the default parameters; previews, the per-title ladder and separate audio need the probe.
+        print(f"Probe failed for video {video.id}, continuing with defaults: {e}")
+        probe = None
+
+    if probe and getattr(settings, 'PER_TITLE_ENCODING', True) and not video.encoding_ladder:
+        try:
+            ladder = build_encoding_ladder(analyze_complexity(input_path, probe), probe)
+            Video.objects.filter(id=video.id).update(encoding_ladder=ladder)
+            print(f"Per-title ladder for video {video.id}: {ladder}")
+        except (RuntimeError, OSError) as e:
+            print(f"Complexity analysis failed for video {video.id}, using the static ladder: {e}")
+
     queue = django_rq.get_queue('default', autocommit=True)
 
     jobs = []
+    needs_previews = not video.thumbnail or not (output_root / "preview" / "sprites.vtt").exists()
+    separate_audio = uses_separate_audio(probe)
 
+    if separate_audio:
+        RenditionJob.objects.get_or_create(video_id=video.id, name=AUDIO_RENDITION)
+        job = queue.enqueue(
+            process_audio_rendition,
+            build_job_payload(video_id=video.id),
+            retry=Retry(max=TRANSCODE_MAX_RETRIES, interval=TRANSCODE_RETRY_INTERVALS)
+        )
+        jobs.append(job)
+        print(f"Enqueued audio for video ID {video.id}: {job.id}")
 
-    for v in HLS_VARIANTS:
+    for v in get_ingest_variants():
+        RenditionJob.objects.get_or_create(video_id=video.id, name=v["name"])
         job = queue.enqueue(
             process_single_variant,
-            video_id=video.id,
-            input_path=str(input_path),
-            output_root=str(output_root),
-            variant_config=v
+            build_job_payload(
+                video_id=video.id,
+                variant=v["name"],
+                probe=probe,
+                with_previews=needs_previews and v is HLS_VARIANTS[0],
+                separate_audio=separate_audio
+            ),
+            retry=Retry(max=TRANSCODE_MAX_RETRIES, interval=TRANSCODE_RETRY_INTERVALS)
         )
         jobs.append(job)
         print(f"Enqueued {v['name']} for video ID {video.id}: {job.id}")
 
     queue.enqueue(
         create_master_playlist,
-        video_id=video.id,
-        output_root=str(output_root),
-        depends_on=jobs
+        build_job_payload(video_id=video.id, separate_audio=separate_audio),
+        depends_on=Dependency(jobs=jobs, allow_failure=True)
     )
 
     return {"video_id": video.id, "variants_enqueued": len(jobs)}
 
-def process_single_variant(
-    video_id: int,
-    input_path: str,
-    output_root: str,
-    variant_config: dict
-):
+@track_job
+@profiled_job
+def process_single_variant(payload: dict):
+    read_job_payload(payload, "video_id", "variant")
+    video_id = payload["video_id"]
+    variant_config = get_variant_config(payload["variant"])
+    probe = payload.get("probe")
 
-    print(f"Processing {variant_config['name']} for video {video_id}...")
-    
-    variant_dir = Path(output_root) / variant_config["name"]
-    variant_dir.mkdir(parents=True, exist_ok=True)
-
-    playlist_path = transcode_variant_to_hls(
-        input_path=Path(input_path),
-        output_dir=variant_dir,
-        height=variant_config["height"],
-        v_bitrate=variant_config["v_bitrate"],
-        maxrate=variant_config["maxrate"],
-        bufsize=variant_config["bufsize"]
-    )
+    video = load_video_for_job(video_id, "video_file", "encoding_ladder")
+    if video is None:
+        release_on_demand_lock(video_id, variant_config["name"])
+        return {"name": variant_config["name"], "skipped": True}
 
-    print(f"Completed {variant_config['name']} for video {video_id}")
-    
-    return {
+    output_root = get_hls_root_dir(video_id)
+    variant_dir = output_root / variant_config["name"]
+    rates = get_variant_rates(variant_config, video.encoding_ladder)
+    result = {
         "name": variant_config["name"],
         "height": variant_config["height"],
-        "bandwidth": variant_config["bandwidth"],
-        "playlist_rel": f"{variant_config['name']}/{Path(playlist_path).name}"
+        "maxrate": rates["maxrate"],
+        "playlist_rel": f"{variant_config['name']}/index.m3u8"
     }
 
+    if (variant_dir / "index.m3u8").exists():
+        RenditionJob.objects.filter(video_id=video_id, name=variant_config["name"]).update(status='complete')
+        release_on_demand_lock(video_id, variant_config["name"])
+        print(f"{variant_config['name']} for video {video_id} already published, skipping.")
+        return {**result, "skipped": True}
+
+    print(f"Processing {variant_config['name']} for video {video_id}...")
+    mark_rendition_job(video_id, variant_config["name"], 'running')
+
+    staging_dir = make_staging_dir(output_root, variant_config["name"])
+    preview_staging_dir = None
+    extra_outputs = []
+    if payload.get("with_previews") and probe and probe.get("duration"):
+        preview_staging_dir = make_staging_dir(output_root, "preview")
+        extra_outputs = build_preview_outputs(preview_staging_dir, probe)
+
+    try:
+        encode_started = time.perf_counter()
+        transcode_variant_to_hls(
+            input_path=Path(video.video_file.path),
+            output_dir=staging_dir,
+            height=variant_config["height"],
+            maxrate=f"{rates['maxrate']}k",
+            bufsize=f"{rates['bufsize']}k",
+            with_audio=not payload.get("separate_audio"),
+            extra_outputs=extra_outputs,
+            encryption_video_id=get_encryption_video_id(video_id)
+        )
+        if probe and probe.get("duration"):
+            ENCODE_SPEED.labels(variant_config["name"]).observe(
+                probe["duration"] / max(time.perf_counter() - encode_started, 1e-6))
+
+        if preview_staging_dir:
+            finalize_preview_assets(video_id, preview_staging_dir, probe)
+            publish_directory(preview_staging_dir, output_root / "preview")
+
+        publish_directory(staging_dir, variant_dir)
+    except Exception as e:
+        # Keep the on-demand lock while RQ still has retries queued; after the last one, free it so viewers get a 404.
+        final = is_final_attempt()
+        mark_rendition_job(video_id, variant_config["name"], 'failed' if final else 'pending', error=str(e))
+        if final:
+            release_on_demand_lock(video_id, variant_config["name"])
+        raise
+    finally:
+        for leftover in (staging_dir, preview_staging_dir):
+            if leftover and leftover.exists():
+                shutil.rmtree(leftover, ignore_errors=True)
+
+    mark_rendition_job(video_id, variant_config["name"], 'complete')
+    print(f"Completed {variant_config['name']} for video {video_id}")
+
+    if is_lazy_transcode():
+        try:
+            touch_rendition(video_id, variant_config["name"])
+            release_rendition_lock(video_id, variant_config["name"])
+        except RedisError as e:
+            print(f"Could not update rendition tracking for video {video_id}: {e}")
+    
+    return result
 
-def create_master_playlist(video_id: int, output_root: str):
+@track_job
+def process_audio_rendition(payload: dict):
+    video_id = read_job_payload(payload, "video_id")["video_id"]
+
+    video = load_video_for_job(video_id, "video_file")
+    if video is None:
+        return {"name": AUDIO_RENDITION, "skipped": True}
+
+    output_root = get_hls_root_dir(video_id)
+    audio_dir = output_root / AUDIO_RENDITION
+    if (audio_dir / "index.m3u8").exists():
+        RenditionJob.objects.filter(video_id=video_id, name=AUDIO_RENDITION).update(status='complete')
+        return {"name": AUDIO_RENDITION, "skipped": True}
+
+    mark_rendition_job(video_id, AUDIO_RENDITION, 'running')
+    staging_dir = make_staging_dir(output_root, AUDIO_RENDITION)
+    try:
+        transcode_audio_to_hls(Path(video.video_file.path), staging_dir, encryption_video_id=get_encryption_video_id(video_id))
+        publish_directory(staging_dir, audio_dir)
+    except Exception as e:
+        mark_rendition_job(video_id, AUDIO_RENDITION, 'failed', error=str(e))
+        raise
+    finally:
+        if staging_dir.exists():
+            shutil.rmtree(staging_dir, ignore_errors=True)
+
+    mark_rendition_job(video_id, AUDIO_RENDITION, 'complete')
+    print(f"Completed audio for video {video_id}")
+    return {"name": AUDIO_RENDITION, "playlist_rel": f"{AUDIO_RENDITION}/index.m3u8"}
+
+def mark_rendition_job(video_id: int, name: str, status: str, error: str = ""):
+    now = timezone.now()
+    fields = {"status": status}
+
+    if status == 'running':
+        fields.update(attempts=F('attempts') + 1, started_at=now, finished_at=None, last_error="")
+    else:
+        fields.update(finished_at=now, last_error=error[-4000:])
+
+    if not RenditionJob.objects.filter(video_id=video_id, name=name).update(**fields):
+        RenditionJob.objects.get_or_create(video_id=video_id, name=name)
+        RenditionJob.objects.filter(video_id=video_id, name=name).update(**fields)
+
+@track_job
+def sweep_transcode_orphans(payload: dict):
+    read_job_payload(payload)
+    max_age = int(getattr(settings, 'TRANSCODE_ORPHAN_MAX_AGE', 6 * 3600))
+    cutoff = time.time() - max_age
+    hls_root = Path(getattr(settings, 'MEDIA_ROOT')) / 'hls'
+
+    removed = 0
+    for staging_dir in hls_root.glob(f"*/{STAGING_PREFIX}*"):
+        try:
+            if staging_dir.stat().st_mtime > cutoff:
+                continue
+        except FileNotFoundError:
+            continue
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        removed += 1
+
+    for trash_dir in find_stale_trash_dirs([hls_root, get_media_root() / "cache" / "thumbnails"], cutoff):
+        purge_tree(trash_dir)
+        removed += 1
+
+    abandoned = RenditionJob.objects.filter(
+        status='running', started_at__lt=timezone.now() - timedelta(seconds=max_age)
+    ).update(status='failed', last_error='Abandoned by worker')
+
+    print(f"Removed {removed} orphaned staging directories, marked {abandoned} rendition jobs abandoned.")
+    return {"removed_dirs": removed, "abandoned_jobs": abandoned}
+
+
+@track_job
+def evict_thumbnail_cache(payload: dict):
+    read_job_payload(payload)
+    reclaimed = enforce_thumbnail_cache_limit()
+    print(f"Thumbnail cache eviction reclaimed {reclaimed} bytes.")
+    return {"reclaimed_bytes": reclaimed}
+
+@track_job
+def flush_watch_progress(payload: dict):
+    read_job_payload(payload)
+    batch_size = int(getattr(settings, 'WATCH_PROGRESS_FLUSH_BATCH', 500))
+
+    users = rows = 0
+    while True:
+        progress_by_user = pop_dirty_progress(batch_size)
+        if not progress_by_user:
+            break
+        users += len(progress_by_user)
+        rows += upsert_watch_progress(progress_by_user)
+
+    print(f"Flushed {rows} watch progress rows for {users} users.")
+    return {"users": users, "rows": rows}
+
+
+@track_job
+def rollup_view_counts(payload: dict):
+    read_job_payload(payload)
+    lookback = int(getattr(settings, 'VIEW_ROLLUP_LOOKBACK', 3))
+    window = get_window_buckets(lookback * VIEW_BUCKET_SECONDS)
+
+    buckets = read_view_buckets(window)
+    view_counts = count_total_viewers(window, sorted({b["video_id"] for b in buckets}))
+    videos = upsert_view_buckets(buckets, view_counts)
+    invalidate_trending()
+
+    print(f"Rolled up {len(buckets)} view buckets for {len(videos)} videos.")
+    return {"buckets": len(buckets), "videos": len(videos)}
+
+
+@track_job
+def evict_cold_renditions(payload: dict):
+    read_job_payload(payload)
+    if not is_lazy_transcode():
+        return {"evicted": 0, "reclaimed_bytes": 0, "skipped": True}
+
+    max_idle = int(getattr(settings, 'RENDITION_COLD_AFTER', 30 * 24 * 3600))
+    batch_size = int(getattr(settings, 'STORAGE_DELETE_BATCH_SIZE', 500))
+    pause = float(getattr(settings, 'STORAGE_DELETE_BATCH_PAUSE', 0.0))
+
+    cold = find_cold_renditions(max_idle, limit=int(getattr(settings, 'RENDITION_EVICT_BATCH', 200)))
+    evicted = reclaimed = 0
+    for video_id, name in cold:
+        if name not in [v["name"] for v in HLS_VARIANTS[1:]]:
+            continue
+        _, tree_reclaimed, errors = remove_tree_batched(get_hls_variant_dir(video_id, name), batch_size, pause)
+        if errors:
+            print(f"Could not evict {name} for video {video_id}: {errors[:5]}")
+            continue
+        RenditionJob.objects.filter(video_id=video_id, name=name).update(status='evicted')
+        evicted += 1
+        reclaimed += tree_reclaimed
+
+    forget_renditions(cold)
+    print(f"Evicted {evicted} cold renditions, reclaimed {reclaimed} bytes.")
+    return {"evicted": evicted, "reclaimed_bytes": reclaimed}
+
+
+@track_job
+@profiled_job
+def create_master_playlist(payload: dict):
+    video_id = read_job_payload(payload, "video_id")["video_id"]
 
     print(f"Creating master playlist for video {video_id}...")
     
-    output_root_path = Path(output_root)
+    output_root_path = get_hls_root_dir(video_id)
+    ladder = Video.objects.filter(id=video_id).values_list("encoding_ladder", flat=True).first() or {}
     created_variants = []
+
+    audio = None
+    audio_measured = measure_variant_bandwidth(output_root_path / AUDIO_RENDITION)
+    if audio_measured:
+        audio = {"bandwidth": audio_measured[0], "average_bandwidth": audio_measured[1],
+                 "playlist_rel": f"{AUDIO_RENDITION}/index.m3u8"}
+    elif payload.get("separate_audio"):
+        # The video renditions were encoded without audio; a master without the audio group would play silently.
+        raise RuntimeError(f"Audio rendition for video {video_id} is missing, not publishing the master playlist.")
     
     for v in HLS_VARIANTS:
         variant_dir = output_root_path / v["name"]
-        playlist_path = variant_dir / "index.m3u8"
-        
-        if playlist_path.exists():
+        rates = get_variant_rates(v, ladder)
+        measured = measure_variant_bandwidth(variant_dir)
+
+        if measured or (is_lazy_transcode() and created_variants):
+            peak, average = measured or ((rates["maxrate"] + (0 if audio else AUDIO_BITRATE_KBPS)) * 1000, None)
             created_variants.append({
                 "name": v["name"],
                 "height": v["height"],
-                "bandwidth": v["bandwidth"],
+                "width": rates["width"],
+                "bandwidth": peak,
+                "average_bandwidth": average,
                 "playlist_rel": f"{v['name']}/index.m3u8"
             })
     
-    master_path = write_master_playlist(output_root_path, created_variants)
+    master_path = write_master_playlist(output_root_path, created_variants, audio)
     
     print(f"Master playlist created for video {video_id}: {master_path}")
     
     return {
         "video_id": video_id,
         "master_playlist": str(master_path),
-        "variants": created_variants
+        "variants": created_variants,
+        "audio": audio
     }
 
+def get_scaled_width(probe: dict, height: int) -> int:
+    if probe and probe.get("width") and probe.get("height"):
+        return int(round(probe["width"] * height / probe["height"] / 2)) * 2
+    return int(round(height * 16 / 9 / 2)) * 2
+
+def analyze_complexity(input_path: Path, probe: dict) -> float:
+    duration = probe.get("duration") or 0
+    count = COMPLEXITY_SAMPLES if duration >= COMPLEXITY_SAMPLES * COMPLEXITY_SAMPLE_SECONDS * 2 else 1
+    offsets = [duration * (i + 1) / (count + 1) for i in range(count)] if count > 1 else [0]
+
+    total_bits = total_seconds = 0
+    with tempfile.TemporaryDirectory(prefix="complexity-") as tmp_dir:
+        for i, offset in enumerate(offsets):
+            sample_path = Path(tmp_dir) / f"sample_{i}.mkv"
+            run_ffmpeg([
+                "ffmpeg", "-y",
+                "-ss", f"{offset:.3f}",
+                "-t", str(COMPLEXITY_SAMPLE_SECONDS),
+                "-i", str(input_path),
+                "-vf", f"scale=-2:{COMPLEXITY_PROBE_HEIGHT}",
+                "-an",
+                "-c:v", "libx264", "-preset", "veryfast", "-crf", str(TARGET_CRF),
+                "-threads", str(getattr(settings, 'FFMPEG_THREADS', 0)),
+                str(sample_path)
+            ])
+            total_bits += sample_path.stat().st_size * 8
+            total_seconds += min(COMPLEXITY_SAMPLE_SECONDS, duration - offset) if duration else COMPLEXITY_SAMPLE_SECONDS
+
+    return total_bits / max(total_seconds, 1e-6) / 1000
+
+def build_encoding_ladder(complexity_kbps: float, probe: dict) -> dict:
+    ladder = {"complexity_kbps": round(complexity_kbps)}
+    for v in HLS_VARIANTS:
+        estimate = complexity_kbps * (v["height"] / COMPLEXITY_PROBE_HEIGHT) ** LADDER_SCALE_EXPONENT
+        maxrate = int(min(max(estimate * LADDER_PEAK_FACTOR, v["maxrate"] * LADDER_MIN_RATIO), v["maxrate"] * LADDER_MAX_RATIO))
+        ladder[v["name"]] = {
+            "maxrate": maxrate,
+            "bufsize": int(maxrate * v["bufsize"] / v["maxrate"]),
+            "width": get_scaled_width(probe, v["height"]),
+        }
+    return ladder
+
+def get_variant_rates(variant_config: dict, ladder: dict | None) -> dict:
+    rates = (ladder or {}).get(variant_config["name"])
+    if rates:
+        return rates
+    return {
+        "maxrate": variant_config["maxrate"],
+        "bufsize": variant_config["bufsize"],
+        "width": get_scaled_width(None, variant_config["height"]),
+    }
+
+def measure_variant_bandwidth(variant_dir: Path):
+    playlist_path = variant_dir / "index.m3u8"
+    if not playlist_path.exists():
+        return None
+
+    peak = total_bits = total_seconds = 0
+    duration = None
+    for line in playlist_path.read_text(encoding="utf-8").splitlines():
+        if line.startswith("#EXTINF:"):
+            duration = float(line[len("#EXTINF:"):].split(",")[0])
+        elif line and not line.startswith("#") and duration:
+            try:
+                bits = (variant_dir / line).stat().st_size * 8
+            except FileNotFoundError:
+                continue
+            peak = max(peak, bits / duration)
+            total_bits += bits
+            total_seconds += duration
+            duration = None
+
+    if not total_seconds:
+        return None
+    return int(peak), int(total_bits / total_seconds)
+
 def transcode_variant_to_hls(
     input_path: Path,
     output_dir: Path,
     height: int,
-    v_bitrate: str,
     maxrate: str,
     bufsize: str,
-    hls_time: int = 4
+    hls_time: int = 4,
+    with_audio: bool = True,
+    extra_outputs: list | None = None,
+    encryption_video_id: int | None = None
 ):
 
     variant_playlist = output_dir / "index.m3u8"
@@ -123,6 +549,28 @@ def transcode_variant_to_hls(
         "-y",
         "-i",
         str(input_path),
+        *get_variant_encode_args(height, maxrate, bufsize, hls_time, with_audio),
+        "-hls_time",
+        str(hls_time),
+        "-hls_playlist_type",
+        "vod",
+        "-hls_segment_filename",
+        str(segment_pattern),
+        "-movflags",
+        "+faststart",
+        str(variant_playlist),
+    ]
+
+    if extra_outputs:
+        cmd.extend(extra_outputs)
+
+    run_ffmpeg(cmd)
+    if encryption_video_id:
+        encrypt_hls_variant(output_dir, encryption_video_id)
+    return str(variant_playlist)
+
+def get_variant_encode_args(height: int, maxrate: str, bufsize: str, hls_time: int, with_audio: bool) -> list:
+    return [
         "-vf",
         f"scale=-2:{height}",
         "-c:v",
@@ -134,82 +582,273 @@ def transcode_variant_to_hls(
         "-level",
         "4.0",
         "-crf",
-        "23", 
+        str(TARGET_CRF),
         "-g",
         str(hls_time * 25),  
         "-keyint_min",
         str(hls_time * 25),
         "-sc_threshold",
         "0",
-        "-b:v",
-        v_bitrate,
         "-maxrate",
         maxrate,
         "-bufsize",
         bufsize,
-        "-c:a",
-        "aac",
-        "-b:a",
-        "128k",
-        "-ac",
-        "2",
-        "-ar",
-        "48000",
+        *(get_audio_codec_args() if with_audio else ["-an"]),
+        "-threads",
+        str(getattr(settings, 'FFMPEG_THREADS', 0)),
+    ]
+
+def get_audio_codec_args() -> list:
+    return ["-c:a", "aac", "-b:a", f"{AUDIO_BITRATE_KBPS}k", "-ac", "2", "-ar", "48000"]
+
+def transcode_audio_to_hls(input_path: Path, output_dir: Path, hls_time: int = 4, encryption_video_id: int | None = None):
+    cmd = [
+        "ffmpeg",
+        "-y",
+        "-i",
+        str(input_path),
+        "-vn",
+        *get_audio_codec_args(),
         "-hls_time",
         str(hls_time),
         "-hls_playlist_type",
         "vod",
         "-hls_segment_filename",
-        str(segment_pattern),
-        "-movflags",
-        "+faststart",
-        "-threads",
-        "0",
-        str(variant_playlist),
+        str(output_dir / "seg_%05d.ts"),
+        str(output_dir / "index.m3u8"),
     ]
-
     run_ffmpeg(cmd)
-    return str(variant_playlist)
+    if encryption_video_id:
+        encrypt_hls_variant(output_dir, encryption_video_id)
+    return str(output_dir / "index.m3u8")
 
-def write_master_playlist(output_root: Path, variants: list):
+def write_master_playlist(output_root: Path, variants: list, audio: dict | None = None):
     master_path = output_root / "master.m3u8"
 
     lines = ["#EXTM3U", "#EXT-X-VERSION:3"]
 
+    if audio:
+        lines.append(
+            f'#EXT-X-MEDIA:TYPE=AUDIO,GROUP-ID="{AUDIO_GROUP_ID}",NAME="Default",'
+            f'DEFAULT=YES,AUTOSELECT=YES,URI="{audio["playlist_rel"]}"'
+        )
+
     for v in sorted(variants, key=lambda x: x["height"]):
-        lines.append(f'#EXT-X-STREAM-INF:BANDWIDTH={v["bandwidth"]},RESOLUTION=1920x{v["height"]}')
+        bandwidth, average = v["bandwidth"], v.get("average_bandwidth")
+        if audio:
+            bandwidth += audio["bandwidth"]
+            average = average and average + audio["average_bandwidth"]
+
+        attributes = f'BANDWIDTH={bandwidth}'
+        if average:
+            attributes += f',AVERAGE-BANDWIDTH={average}'
+        attributes += f',RESOLUTION={v["width"]}x{v["height"]}'
+        if audio:
+            attributes += f',CODECS="{VIDEO_CODEC},{AUDIO_CODEC}",AUDIO="{AUDIO_GROUP_ID}"'
+        lines.append(f'#EXT-X-STREAM-INF:{attributes}')
         lines.append(v["playlist_rel"])
+
+    if audio and getattr(settings, 'HLS_AUDIO_ONLY_VARIANT', True):
+        lines.append(
+            f'#EXT-X-STREAM-INF:BANDWIDTH={audio["bandwidth"]},'
+            f'AVERAGE-BANDWIDTH={audio["average_bandwidth"]},CODECS="{AUDIO_CODEC}"'
+        )
+        lines.append(audio["playlist_rel"])
     
-    master_path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    tmp_path = master_path.with_name(f"{STAGING_PREFIX}master.m3u8")
+    tmp_path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    os.replace(tmp_path, master_path)
     return str(master_path)
 
-def run_ffmpeg(cmd: list):
+@track_job
+def delete_video_storage(payload: dict):
+    read_job_payload(payload, "video_id")
+    video_id = payload["video_id"]
+    media_root = get_media_root()
+    batch_size = int(getattr(settings, 'STORAGE_DELETE_BATCH_SIZE', 500))
+    pause = float(getattr(settings, 'STORAGE_DELETE_BATCH_PAUSE', 0.05))
+
+    files = [media_root / name for name in payload.get("files", []) if name]
+    removed, reclaimed, errors = unlink_batched(files, batch_size, pause)
+
+    for tree in (get_hls_root_dir(video_id), media_root / "cache" / "thumbnails" / str(video_id)):
+        tree_removed, tree_reclaimed, tree_errors = remove_tree_batched(tree, batch_size, pause)
+        removed += tree_removed
+        reclaimed += tree_reclaimed
+        errors += tree_errors
+    delete_total_viewers(video_id)
+
+    print(f"Deleted storage for video {video_id}: {removed} files, {reclaimed} bytes.")
+    if errors:
+        raise RuntimeError(f"Could not delete {len(errors)} paths for video {video_id}: {errors[:5]}")
+
+    return {"video_id": video_id, "removed_files": removed, "reclaimed_bytes": reclaimed}
+
+@track_job
+def reconcile_media_storage(payload: dict):
+    read_job_payload(payload)
+    reclaim = bool(payload.get("reclaim", False))
+    grace_seconds = int(getattr(settings, 'STORAGE_RECONCILE_GRACE', 3600))
+
+    video_ids = set()
+    referenced_files = set()
+    for video_id, video_file, thumbnail in Video.objects.values_list("id", "video_file", "thumbnail").iterator():
+        video_ids.add(video_id)
+        referenced_files.update(name for name in (video_file, thumbnail) if name)
+
+    orphans = find_orphaned_media(video_ids, referenced_files, grace_seconds)
+
+    report = {"reclaimed": reclaim, "orphans": {}, "orphaned_bytes": 0, "errors": []}
+    for orphan in orphans:
+        summary = report["orphans"].setdefault(orphan["kind"], {"count": 0, "bytes": 0})
+        summary["count"] += 1
+        summary["bytes"] += orphan["bytes"]
+        report["orphaned_bytes"] += orphan["bytes"]
+
+        if reclaim:
+            if orphan["kind"] == "trash":
+                _, _, errors = purge_tree(orphan["path"])
+            elif orphan["path"].is_dir():
+                _, _, errors = remove_tree_batched(orphan["path"])
+            else:
+                _, _, errors = unlink_batched([orphan["path"]])
+            report["errors"] += errors
+
+    print(f"Media reconcile: {report['orphaned_bytes']} orphaned bytes, reclaimed={reclaim}.")
+    return report
+
+def probe_video(input_path: Path) -> dict:
+    cmd = [
+        "ffprobe",
+        "-v", "error",
+        "-print_format", "json",
+        "-show_format",
+        "-show_streams",
+        str(input_path)
+    ]
     p = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, env=os.environ.copy())
     if p.returncode != 0:
-        raise RuntimeError(f"ffmpeg failed: (code {p.returncode}) {p.stderr}")
-    
+        raise RuntimeError(f"ffprobe failed: (code {p.returncode}) {p.stderr}")
 
-def generate_thumbnail_for_video(video: Video, input_path:Path):
-    if video.thumbnail:
-        return
-    
-    thumbnails_dir = Path(getattr(settings, 'MEDIA_ROOT')) / 'thumbnails'
-    thumbnails_dir.mkdir(parents=True, exist_ok=True)
-    thumb_filename = f"video_{video.id}.jpg"
-    thumbnail_path = thumbnails_dir / thumb_filename
+    data = json.loads(p.stdout or "{}")
+    streams = data.get("streams", [])
+    video_stream = next((s for s in streams if s.get("codec_type") == "video"), {})
 
-    cmd = [
-        "ffmpeg",
-        "-y",
-        "-ss", "00:00:01",
-        "-i", str(input_path),
-        "-vframes", "1",
-        "-vf", "scale=640:-2",
+    return {
+        "duration": float(data.get("format", {}).get("duration") or video_stream.get("duration") or 0),
+        "width": int(video_stream.get("width") or 0),
+        "height": int(video_stream.get("height") or 0),
+        "has_audio": any(s.get("codec_type") == "audio" for s in streams),
+    }
+
+def get_preview_tile_size(probe: dict) -> tuple:
+    width, height = probe.get("width"), probe.get("height")
+    if not width or not height:
+        return PREVIEW_TILE_WIDTH, PREVIEW_TILE_WIDTH * 9 // 16
+    tile_height = int(round(PREVIEW_TILE_WIDTH * height / width / 2)) * 2
+    return PREVIEW_TILE_WIDTH, max(tile_height, 2)
+
+def build_preview_outputs(preview_dir: Path, probe: dict) -> list:
+    tile_width, tile_height = get_preview_tile_size(probe)
+    candidate_rate = f"{POSTER_CANDIDATES}/{max(math.ceil(probe['duration']), 1)}"
+
+    return [
+        "-map", "0:v:0",
+        "-vf", f"fps=1/{PREVIEW_SPRITE_INTERVAL},scale={tile_width}:{tile_height},tile={PREVIEW_SPRITE_COLUMNS}x{PREVIEW_SPRITE_ROWS}",
+        "-q:v", "5",
+        "-start_number", "0",
+        str(preview_dir / "sprite_%03d.jpg"),
+        "-map", "0:v:0",
+        "-vf", f"fps={candidate_rate},scale={POSTER_WIDTH}:-2",
         "-q:v", "2",
-        str(thumbnail_path)
+        "-start_number", "0",
+        str(preview_dir / "poster_%02d.jpg"),
+        "-map", "0:v:0",
+        "-vf", f"fps={candidate_rate},scale=64:-2,format=gray",
+        "-start_number", "0",
+        str(preview_dir / "score_%02d.pgm"),
     ]
 
-    run_ffmpeg(cmd)
+def score_preview_frame(path: Path) -> float:
+    data = path.read_bytes()
+    match = re.match(rb"P5\s+(\d+)\s+(\d+)\s+(\d+)\s", data)
+    if not match:
+        return 0.0
+
+    pixels = data[match.end():]
+    if not pixels:
+        return 0.0
+
+    mean = sum(pixels) / len(pixels)
+    contrast = math.sqrt(sum((p - mean) ** 2 for p in pixels) / len(pixels))
+
+    if mean < 24 or mean > 232:
+        return contrast * 0.1
+    return contrast
+
+def format_vtt_timestamp(seconds: float) -> str:
+    millis = int(round(seconds * 1000))
+    hours, millis = divmod(millis, 3600000)
+    minutes, millis = divmod(millis, 60000)
+    secs, millis = divmod(millis, 1000)
+    return f"{hours:02d}:{minutes:02d}:{secs:02d}.{millis:03d}"
+
+def write_sprite_vtt(preview_dir: Path, probe: dict):
+    tile_width, tile_height = get_preview_tile_size(probe)
+    per_sheet = PREVIEW_SPRITE_COLUMNS * PREVIEW_SPRITE_ROWS
+    duration = probe["duration"]
+
+    lines = ["WEBVTT", ""]
+
+    for i in range(math.ceil(duration / PREVIEW_SPRITE_INTERVAL)):
+        sheet, position = divmod(i, per_sheet)
+        sheet_name = f"sprite_{sheet:03d}.jpg"
+        if not (preview_dir / sheet_name).exists():
+            break
+
+        x = (position % PREVIEW_SPRITE_COLUMNS) * tile_width
+        y = (position // PREVIEW_SPRITE_COLUMNS) * tile_height
+        start = i * PREVIEW_SPRITE_INTERVAL
+        end = min(start + PREVIEW_SPRITE_INTERVAL, duration)
+
+        lines.append(f"{format_vtt_timestamp(start)} --> {format_vtt_timestamp(end)}")
+        lines.append(f"{sheet_name}#xywh={x},{y},{tile_width},{tile_height}")
+        lines.append("")
+
+    vtt_path = preview_dir / "sprites.vtt"
+    vtt_path.write_text("\n".join(lines), encoding="utf-8")
+    return str(vtt_path)
+
+def finalize_preview_assets(video_id: int, preview_dir: Path, probe: dict):
+    candidates = sorted(preview_dir.glob("score_*.pgm"))
+    best = max(candidates, key=score_preview_frame, default=None)
+
+    if best is not None:
+        poster_path = preview_dir / best.name.replace("score_", "poster_").replace(".pgm", ".jpg")
+        if poster_path.exists():
+            save_video_thumbnail(video_id, poster_path)
+
+    for leftover in [*preview_dir.glob("score_*.pgm"), *preview_dir.glob("poster_*.jpg")]:
+        leftover.unlink(missing_ok=True)
+
+    write_sprite_vtt(preview_dir, probe)
+
+def save_video_thumbnail(video_id: int, poster_path: Path):
+    thumbnails_dir = Path(getattr(settings, 'MEDIA_ROOT')) / 'thumbnails'
+    thumbnails_dir.mkdir(parents=True, exist_ok=True)
+    thumb_filename = f"video_{video_id}.jpg"
+    thumb_name = f'thumbnails/{thumb_filename}'
+
+    if not Video.objects.filter(id=video_id).filter(Q(thumbnail='') | Q(thumbnail__isnull=True)).exists():
+        return False
+
+    os.replace(poster_path, thumbnails_dir / thumb_filename)
+
+    updated = Video.objects.filter(id=video_id).filter(
+        Q(thumbnail='') | Q(thumbnail__isnull=True)
+    ).update(thumbnail=thumb_name)
+
+    if not updated and not Video.objects.filter(id=video_id, thumbnail=thumb_name).exists():
+        (thumbnails_dir / thumb_filename).unlink(missing_ok=True)
 
-    video.thumbnail.name = f'thumbnails/{thumb_filename}'
-    video.save(update_fields=['thumbnail'])
\ No newline at end of file
+    return bool(updated)
@@ -0,0 +1,131 @@
+import os, time, uuid
+
+from pathlib import Path
+
+from django.conf import settings
+from django_redis import get_redis_connection
+from redis.exceptions import LockError
+from .utils import run_ffmpeg
+
+
+THUMBNAIL_WIDTHS = [160, 320, 480, 640]
+
+THUMBNAIL_FORMATS = [
+    {"mime": "image/avif", "ext": "avif", "codec": ["-c:v", "libaom-av1", "-still-picture", "1", "-crf", "32", "-cpu-used", "6"]},
+    {"mime": "image/webp", "ext": "webp", "codec": ["-c:v", "libwebp", "-quality", "75"]},
+    {"mime": "image/jpeg", "ext": "jpg", "codec": ["-q:v", "4"]},
+]
+
+TOUCH_INTERVAL = 3600
+THUMBNAIL_LOCK_PREFIX = "videoflix:thumbnail:lock"
+THUMBNAIL_FAILED_PREFIX = "videoflix:thumbnail:failed"
+ENCODER_MISSING_ERRORS = ("Unknown encoder", "Encoder not found")
+
+def get_thumbnail_cache_dir() -> Path:
+    return Path(getattr(settings, "MEDIA_ROOT")) / "cache" / "thumbnails"
+
+def pick_thumbnail_width(requested) -> int:
+    try:
+        width = int(requested)
+    except (TypeError, ValueError):
+        return THUMBNAIL_WIDTHS[-1]
+    return next((w for w in THUMBNAIL_WIDTHS if w >= width), THUMBNAIL_WIDTHS[-1])
+
+def pick_thumbnail_formats(accept: str) -> list:
+    accept = accept or ""
+    return [f for f in THUMBNAIL_FORMATS if f["mime"] in accept or f["ext"] == "jpg"]
+
+def get_thumbnail_variant(video_id: int, source_path: Path, width: int, accept: str):
+    source_mtime = int(source_path.stat().st_mtime)
+    variant_dir = get_thumbnail_cache_dir() / str(video_id)
+    conn = get_redis_connection("default")
+
+    for fmt in pick_thumbnail_formats(accept):
+        target = variant_dir / f"{width}-{source_mtime}.{fmt['ext']}"
+
+        if target.exists():
+            touch_cache_entry(target)
+            return target, fmt["mime"]
+
+        # A missing encoder disables the format everywhere; a bad source only disables its own variant.
+        format_failed_key = f"{THUMBNAIL_FAILED_PREFIX}:{fmt['ext']}"
+        variant_failed_key = f"{THUMBNAIL_FAILED_PREFIX}:{video_id}:{target.name}"
+        if conn.exists(format_failed_key, variant_failed_key):
+            continue
+
+        # Concurrent misses for the same variant wait for a single render.
+        lock = conn.lock(f"{THUMBNAIL_LOCK_PREFIX}:{video_id}:{target.name}", timeout=60,
+                         blocking_timeout=float(getattr(settings, 'THUMBNAIL_RENDER_WAIT', 10)))
+        try:
+            with lock:
+                if not target.exists():
+                    render_thumbnail_variant(source_path, target, width, fmt)
+        except LockError:
+            continue
+        except (RuntimeError, OSError) as e:
+            encoder_missing = is_encoder_missing(e)
+            conn.set(format_failed_key if encoder_missing else variant_failed_key, 1,
+                     ex=int(getattr(settings, 'THUMBNAIL_FAILED_FORMAT_TTL', 600)))
+            skipped = "the format" if encoder_missing else "this variant"
+            print(f"Could not render {fmt['ext']} thumbnail for video {video_id}, skipping {skipped} for now: {e}")
+            continue
+
+        return target, fmt["mime"]
+
+    raise RuntimeError(f"Could not render thumbnail variant for video {video_id}")
+
+def is_encoder_missing(error: Exception) -> bool:
+    return isinstance(error, FileNotFoundError) or any(marker in str(error) for marker in ENCODER_MISSING_ERRORS)
+
+def render_thumbnail_variant(source_path: Path, target: Path, width: int, fmt: dict):
+    target.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = target.with_name(f".{uuid.uuid4().hex}.{fmt['ext']}")
+
+    cmd = [
+        "ffmpeg",
+        "-y",
+        "-i", str(source_path),
+        "-vf", f"scale='min({width},iw)':-2",
+        "-frames:v", "1",
+        *fmt["codec"],
+        str(tmp_path)
+    ]
+
+    try:
+        run_ffmpeg(cmd)
+        os.replace(tmp_path, target)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+
+def touch_cache_entry(path: Path):
+    try:
+        if path.stat().st_mtime < time.time() - TOUCH_INTERVAL:
+            os.utime(path)
+    except FileNotFoundError:
+        pass
+
+def enforce_thumbnail_cache_limit():
+    max_bytes = int(getattr(settings, "THUMBNAIL_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+    cache_dir = get_thumbnail_cache_dir()
+
+    entries = []
+    total = 0
+    for path in cache_dir.glob("*/*"):
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+        total += stat.st_size
+
+    if total <= max_bytes:
+        return 0
+
+    reclaimed = 0
+    for _, size, path in sorted(entries):
+        if total - reclaimed <= max_bytes * 0.9:
+            break
+        path.unlink(missing_ok=True)
+        reclaimed += size
+
+    return reclaimed
@@ -1,12 +1,20 @@
 from django.urls import path , include
 from video_app.api.views import (
-    VideoListView,VideoPlayListView,VideoHlsSegmentView
+    VideoListView,VideoMasterPlaylistView,VideoPlayListView,VideoHlsSegmentView,VideoPreviewView,VideoThumbnailView,
+    WatchProgressView,ContinueWatchingView,QoEBeaconView,VideoKeyView
      
 )
 
 urlpatterns = [
     path('video/', VideoListView.as_view(), name='video-list'),
+    path('video/continue-watching/', ContinueWatchingView.as_view(), name='video-continue-watching'),
+    path('video/qoe/', QoEBeaconView.as_view(), name='video-qoe-beacon'),
+    path('video/<int:movie_id>/progress/', WatchProgressView.as_view(), name='video-progress'),
+    path('video/<int:movie_id>/master.m3u8', VideoMasterPlaylistView.as_view(), name='video-master-playlist'),
     path('video/<int:movie_id>/<str:resolution>/index.m3u8', VideoPlayListView.as_view(), name='video-playlist'),
+    path('video/<int:movie_id>/thumbnail/', VideoThumbnailView.as_view(), name='video-thumbnail'),
+    path('video/<int:movie_id>/preview/<str:filename>', VideoPreviewView.as_view(), name='video-preview'),
+    path('video/<int:movie_id>/keys/<int:key_index>/', VideoKeyView.as_view(), name='video-key'),
     path('video/<int:movie_id>/<str:resolution>/<str:segment>/', VideoHlsSegmentView.as_view(), name='video-segment'),
 ]
 
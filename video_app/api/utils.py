@@ -1,5 +1,18 @@
+import os, shutil, subprocess, uuid
+
 from pathlib import Path
 from django.conf import settings
+from django.http import FileResponse, HttpResponseNotModified
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+from rest_framework.negotiation import BaseContentNegotiation
+
+STAGING_PREFIX = ".staging-"
+
+def run_ffmpeg(cmd: list):
+    p = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, env=os.environ.copy())
+    if p.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed: (code {p.returncode}) {p.stderr}")
 
 def get_hls_root_dir(video_id: int) -> Path:
     return Path(getattr(settings, "MEDIA_ROOT")) / "hls" / str(video_id)
@@ -11,4 +24,48 @@ def get_hls_playlist_path(video_id: int, resolution: str) -> Path:
     return get_hls_variant_dir(video_id, resolution) / "index.m3u8"
 
 def get_hls_segment_path(video_id: int, resolution: str, segment: str) -> Path:
-    return get_hls_variant_dir(video_id, resolution) / segment
\ No newline at end of file
+    return get_hls_variant_dir(video_id, resolution) / segment
+
+def get_hls_preview_dir(video_id: int) -> Path:
+    return get_hls_root_dir(video_id) / "preview"
+
+def make_staging_dir(parent: Path, name: str) -> Path:
+    staging_dir = parent / f"{STAGING_PREFIX}{name}-{uuid.uuid4().hex[:12]}"
+    staging_dir.mkdir(parents=True)
+    return staging_dir
+
+def publish_directory(staging_dir: Path, target_dir: Path):
+    retired_dir = None
+    if target_dir.exists():
+        retired_dir = target_dir.with_name(f"{STAGING_PREFIX}{target_dir.name}-retired-{uuid.uuid4().hex[:12]}")
+        os.rename(target_dir, retired_dir)
+
+    os.rename(staging_dir, target_dir)
+
+    if retired_dir:
+        shutil.rmtree(retired_dir, ignore_errors=True)
+
+def build_cached_file_response(request, path: Path, content_type: str, max_age: int):
+    stat = path.stat()
+    etag = f'"{int(stat.st_mtime)}-{stat.st_size}"'
+
+    if request.headers.get("If-None-Match") == etag or (
+        "If-None-Match" not in request.headers
+        and not was_modified_since(request.headers.get("If-Modified-Since"), int(stat.st_mtime))
+    ):
+        response = HttpResponseNotModified()
+    else:
+        response = FileResponse(open(path, 'rb'), content_type=content_type)
+        response['Content-Disposition'] = f'inline; filename="{path.name}"'
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    response['Cache-Control'] = f'private, max-age={max_age}'
+    return response
+
+class IgnoreClientContentNegotiation(BaseContentNegotiation):
+    def select_parser(self, request, parsers):
+        return parsers[0]
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return (renderers[0], renderers[0].media_type)
\ No newline at end of file
@@ -0,0 +1,147 @@
+import atexit, math, threading, time
+
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError
+
+
+VIEWS_KEY_PREFIX = "videoflix:views"
+VIEW_BUCKET_SECONDS = 3600
+
+_pending_hits = {}
+_pending_lock = threading.Lock()
+_last_flush = time.monotonic()
+
+
+def get_bucket(timestamp: float = None) -> int:
+    return int((timestamp or time.time()) // VIEW_BUCKET_SECONDS)
+
+def get_bucket_start(bucket: int) -> datetime:
+    return datetime.fromtimestamp(bucket * VIEW_BUCKET_SECONDS, tz=dt_timezone.utc)
+
+def get_hits_key(bucket: int) -> str:
+    return f"{VIEWS_KEY_PREFIX}:hits:{bucket}"
+
+def get_viewers_key(bucket: int, video_id: int) -> str:
+    return f"{VIEWS_KEY_PREFIX}:viewers:{bucket}:{video_id}"
+
+def get_total_viewers_key(video_id: int) -> str:
+    return f"{VIEWS_KEY_PREFIX}:viewers:total:{video_id}"
+
+def get_window_buckets(seconds: int) -> list:
+    current = get_bucket()
+    return list(range(current - math.ceil(seconds / VIEW_BUCKET_SECONDS) + 1, current + 1))
+
+def get_flush_interval() -> float:
+    return float(getattr(settings, 'VIEW_HIT_FLUSH_INTERVAL', 5))
+
+def record_segment_hit(video_id: int, user_id: int):
+    # Buffered per process so serving a segment costs no Redis round trip of its own.
+    global _pending_hits, _last_flush
+    with _pending_lock:
+        if not _pending_hits:
+            schedule_flush()
+        hits = _pending_hits.setdefault((get_bucket(), video_id), [0, set()])
+        hits[0] += 1
+        hits[1].add(user_id)
+        if time.monotonic() - _last_flush < get_flush_interval() \
+                and len(_pending_hits) < int(getattr(settings, 'VIEW_HIT_FLUSH_MAX_KEYS', 1000)):
+            return
+        pending, _pending_hits, _last_flush = _pending_hits, {}, time.monotonic()
+    write_segment_hits(pending)
+
+def schedule_flush():
+    # A worker that goes quiet would otherwise hold its hits until the next request, past the rollup lookback.
+    timer = threading.Timer(get_flush_interval(), flush_due_segment_hits)
+    timer.daemon = True
+    timer.start()
+
+def flush_due_segment_hits():
+    if time.monotonic() - _last_flush < get_flush_interval():
+        return  # Flushed since this timer was armed; the next hit arms a new one.
+    try:
+        flush_segment_hits()
+    except RedisError as e:
+        print(f"Could not flush segment hits: {e}")
+
+def flush_segment_hits():
+    global _pending_hits, _last_flush
+    with _pending_lock:
+        pending, _pending_hits, _last_flush = _pending_hits, {}, time.monotonic()
+    write_segment_hits(pending)
+
+def write_segment_hits(pending: dict):
+    if not pending:
+        return
+    ttl = int(getattr(settings, 'VIEW_COUNT_RETENTION', 48 * 3600))
+
+    pipe = get_redis_connection("default").pipeline(transaction=False)
+    for (bucket, video_id), (count, user_ids) in pending.items():
+        hits_key, viewers_key = get_hits_key(bucket), get_viewers_key(bucket, video_id)
+        pipe.hincrby(hits_key, video_id, count)
+        pipe.pfadd(viewers_key, *user_ids)
+        pipe.expire(hits_key, ttl, nx=True)
+        pipe.expire(viewers_key, ttl, nx=True)
+    pipe.execute()
+
+def read_view_buckets(buckets: list) -> list:
+    conn = get_redis_connection("default")
+
+    pipe = conn.pipeline(transaction=False)
+    for bucket in buckets:
+        pipe.hgetall(get_hits_key(bucket))
+    hits = [
+        (bucket, int(video_id), int(count))
+        for bucket, raw in zip(buckets, pipe.execute())
+        for video_id, count in raw.items()
+    ]
+
+    pipe = conn.pipeline(transaction=False)
+    for bucket, video_id, _ in hits:
+        pipe.pfcount(get_viewers_key(bucket, video_id))
+    return [
+        {"video_id": video_id, "bucket_start": get_bucket_start(bucket), "segment_hits": count, "unique_viewers": viewers}
+        for (bucket, video_id, count), viewers in zip(hits, pipe.execute())
+    ]
+
+def count_total_viewers(buckets: list, video_ids: list) -> dict:
+    """Folds each video's hourly viewer sets into its all-time set, so a viewer is counted once per video."""
+    if not video_ids:
+        return {}
+    pipe = get_redis_connection("default").pipeline(transaction=False)
+    for video_id in video_ids:
+        pipe.pfmerge(get_total_viewers_key(video_id), *[get_viewers_key(bucket, video_id) for bucket in buckets])
+    for video_id in video_ids:
+        pipe.pfcount(get_total_viewers_key(video_id))
+    return dict(zip(video_ids, pipe.execute()[len(video_ids):]))
+
+def rank_viewed_videos(buckets: list) -> list:
+    """Returns (video_id, distinct viewers across the buckets) pairs, most watched first."""
+    conn = get_redis_connection("default")
+
+    pipe = conn.pipeline(transaction=False)
+    for bucket in buckets:
+        pipe.hkeys(get_hits_key(bucket))
+    buckets_by_video = {}
+    for bucket, video_ids in zip(buckets, pipe.execute()):
+        for video_id in video_ids:
+            buckets_by_video.setdefault(int(video_id), []).append(bucket)
+
+    pipe = conn.pipeline(transaction=False)
+    for video_id, video_buckets in buckets_by_video.items():
+        pipe.pfcount(*[get_viewers_key(bucket, video_id) for bucket in video_buckets])
+    scores = zip(buckets_by_video, pipe.execute())
+    return sorted(scores, key=lambda score: (-score[1], score[0]))
+
+def delete_total_viewers(video_id: int):
+    get_redis_connection("default").delete(get_total_viewers_key(video_id))
+
+
+@atexit.register
+def flush_segment_hits_at_exit():
+    try:
+        flush_segment_hits()
+    except RedisError:
+        pass
@@ -1,10 +1,27 @@
 from rest_framework.views import APIView
-from django.http import FileResponse, Http404
+from rest_framework.response import Response
+from rest_framework import status
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse
 from rest_framework.generics import ListAPIView
 from rest_framework.permissions import IsAuthenticated
-from .serializers import VideoListSerializer
-from .services import list_videos_queryset, get_video_by_id
-from .utils import get_hls_playlist_path, get_hls_segment_path
+from .serializers import VideoListSerializer, WatchProgressSerializer, ContinueWatchingSerializer
+from .services import list_videos_queryset, list_trending_queryset, get_video_by_id, list_watch_progress, get_cached_video_key
+from .progress import record_progress, get_progress, is_unfinished
+from .view_counts import record_segment_hit
+from .renditions import touch_rendition, is_lazy_transcode
+from .live import read_live_playlist, wait_for_media_sequence, add_server_control, acquire_blocking_slot, release_blocking_slot
+from .readahead import prefetch_next_segments
+from .qoe import decode_beacon_body, normalize_events, append_events
+from redis.exceptions import RedisError
+from .thumbnails import get_thumbnail_variant, pick_thumbnail_width
+from .utils import get_hls_root_dir, get_hls_playlist_path, get_hls_segment_path, get_hls_preview_dir, build_cached_file_response, IgnoreClientContentNegotiation
+from django.utils.cache import patch_vary_headers
+from core.metrics import SEGMENT_BYTES, SEGMENT_READAHEAD
+from core.throttling import RedisRateThrottle, ConcurrentStreamThrottle, set_playback_session_cookie
+from auth_app.authentication import CookieJWTStatelessAuthentication
+import os, re
+from pathlib import Path
 
 
 class VideoListView(ListAPIView):
@@ -12,6 +29,8 @@ class VideoListView(ListAPIView):
     serializer_class = VideoListSerializer
 
     def get_queryset(self):
+        if self.request.query_params.get('ordering') == 'trending':
+            return list_trending_queryset()
         return list_videos_queryset()
     
     def get_serializer_context(self):
@@ -19,24 +38,96 @@ class VideoListView(ListAPIView):
         ctx["request"] = self.request
         return ctx
 
+class VideoMasterPlaylistView(APIView):
+    permission_classes = [IsAuthenticated]
+    throttle_classes = [RedisRateThrottle]
+    throttle_scope = 'playlist'
+
+    def get(self, request, movie_id: int):
+        try:
+            get_video_by_id(movie_id)
+        except Exception:
+            raise Http404("Video not found")
+        master_path = get_hls_root_dir(movie_id) / "master.m3u8"
+        if not master_path.exists():
+            raise Http404("Playlist not found")
+
+        response = FileResponse(open(master_path, 'rb'), content_type='application/vnd.apple.mpegurl')
+        response['Content-Disposition'] = 'inline; filename="master.m3u8"'
+        return set_playback_session_cookie(request, response)
+
 class VideoPlayListView(APIView):
     permission_classes = [IsAuthenticated]
+    throttle_classes = [RedisRateThrottle]
+    throttle_scope = 'playlist'
 
     def get(self, request, movie_id: int, resolution: str):
         try:
-            get_video_by_id(movie_id)
+            video = get_video_by_id(movie_id)
         except Exception:
             raise Http404("Video not found")
         playlist_path = get_hls_playlist_path(movie_id, resolution)
+        if video.is_live:
+            return self.get_live_playlist(request, playlist_path)
+
         if not playlist_path.exists():
-            raise Http404("Playlist not found")
-        
+            from .tasks import can_transcode_on_demand, request_on_demand_rendition
+
+            if not can_transcode_on_demand(movie_id, resolution):
+                raise Http404("Playlist not found")
+            try:
+                request_on_demand_rendition(movie_id, resolution)
+            except RedisError:
+                pass
+            retry_after = str(getattr(settings, 'RENDITION_RETRY_AFTER', 15))
+            return Response({"detail": "Rendition is being prepared."},
+                            status=status.HTTP_503_SERVICE_UNAVAILABLE, headers={"Retry-After": retry_after})
+
+        if is_lazy_transcode():
+            try:
+                touch_rendition(movie_id, resolution)
+            except RedisError:
+                pass
+
         response = FileResponse(open(playlist_path,'rb'), content_type='application/vnd.apple.mpegurl')
         response['Content-Disposition'] = f'inline; filename="index.m3u8"'
-        return response
-    
+        return set_playback_session_cookie(request, response)
+
+    def get_live_playlist(self, request, playlist_path: Path):
+        if not playlist_path.exists():
+            raise Http404("Stream has not started")
+
+        playlist = read_live_playlist(playlist_path)
+        max_age = int(getattr(settings, 'LIVE_PLAYLIST_MAX_AGE', 1))
+
+        msn = request.query_params.get('_HLS_msn')
+        if msn is not None:
+            if not msn.isdigit() or int(msn) > playlist["last_msn"] + 2:
+                return Response({"detail": "Invalid _HLS_msn."}, status=status.HTTP_400_BAD_REQUEST)
+            if playlist["last_msn"] >= int(msn):
+                max_age = playlist["target_duration"] * 6
+            elif acquire_blocking_slot():
+                # Each waiter holds a request thread, so only a few per process may block; the rest poll.
+                try:
+                    playlist = wait_for_media_sequence(playlist_path, int(msn), timeout=playlist["target_duration"] * 3)
+                finally:
+                    release_blocking_slot()
+                if playlist is None:
+                    return Response({"detail": "Segment not available yet."},
+                                    status=status.HTTP_503_SERVICE_UNAVAILABLE, headers={"Retry-After": "1"})
+                max_age = playlist["target_duration"] * 6
+
+        if playlist["ended"]:
+            max_age = 86400
+
+        response = HttpResponse(add_server_control(playlist["text"]), content_type='application/vnd.apple.mpegurl')
+        response['Content-Disposition'] = 'inline; filename="index.m3u8"'
+        response['Cache-Control'] = f'private, max-age={max_age}'
+        return set_playback_session_cookie(request, response)
+
 class VideoHlsSegmentView(APIView):
     permission_classes = [IsAuthenticated]
+    throttle_classes = [ConcurrentStreamThrottle]
 
     def get(self, request, movie_id: int, resolution: str, segment: str):
         try:
@@ -51,6 +142,134 @@ class VideoHlsSegmentView(APIView):
         if not segment_path.exists():
             raise Http404("Segment not found")
         
-        response = FileResponse(open(segment_path,'rb'), content_type='video/MP2T')
+        try:
+            SEGMENT_READAHEAD.labels(resolution).inc(prefetch_next_segments(segment_path))
+        except OSError as e:
+            print(f"Read-ahead after {segment_path} failed: {e}")
+
+        # Opened last, straight into the response, so nothing can fail while this view still owns the descriptor.
+        try:
+            response = FileResponse(open(segment_path,'rb'), content_type='video/MP2T')
+        except FileNotFoundError:
+            raise Http404("Segment not found")
         response['Content-Disposition'] = f'inline; filename="{segment}"'
-        return response
\ No newline at end of file
+        SEGMENT_BYTES.labels(resolution).inc(int(response['Content-Length']))
+
+        try:
+            record_segment_hit(movie_id, request.user.id)
+        except RedisError:
+            pass
+        return response
+    
+
+class VideoKeyView(APIView):
+    authentication_classes = [CookieJWTStatelessAuthentication]
+    permission_classes = [IsAuthenticated]
+    throttle_classes = [RedisRateThrottle]
+    throttle_scope = 'hls_key'
+    content_negotiation_class = IgnoreClientContentNegotiation
+
+    def get(self, request, movie_id: int, key_index: int):
+        key = get_cached_video_key(movie_id, key_index)
+        if key is None:
+            raise Http404("Key not found")
+
+        response = HttpResponse(key, content_type='application/octet-stream')
+        response['Cache-Control'] = f"private, max-age={int(getattr(settings, 'HLS_KEY_CACHE_TTL', 3600))}"
+        return response
+
+
+class VideoPreviewView(APIView):
+    permission_classes = [IsAuthenticated]
+    content_negotiation_class = IgnoreClientContentNegotiation
+    filename_pattern = re.compile(r"^(sprites\.vtt|sprite_\d{3}\.jpg)$")
+
+    def get(self, request, movie_id: int, filename: str):
+        try:
+            get_video_by_id(movie_id)
+        except Exception:
+            raise Http404("Video not found")
+
+        if not self.filename_pattern.match(filename):
+            raise Http404("Invalid preview file")
+
+        preview_path = get_hls_preview_dir(movie_id) / filename
+        if not preview_path.exists():
+            raise Http404("Preview not found")
+
+        content_type = 'text/vtt' if filename.endswith('.vtt') else 'image/jpeg'
+        return build_cached_file_response(request, preview_path, content_type, max_age=86400)
+
+
+class VideoThumbnailView(APIView):
+    permission_classes = [IsAuthenticated]
+    content_negotiation_class = IgnoreClientContentNegotiation
+
+    def get(self, request, movie_id: int):
+        try:
+            video = get_video_by_id(movie_id)
+        except Exception:
+            raise Http404("Video not found")
+
+        if not video.thumbnail or not os.path.exists(video.thumbnail.path):
+            raise Http404("Thumbnail not found")
+
+        width = pick_thumbnail_width(request.query_params.get('w'))
+        try:
+            variant_path, content_type = get_thumbnail_variant(
+                movie_id, Path(video.thumbnail.path), width, request.headers.get('Accept', ''))
+        except RuntimeError:
+            raise Http404("Thumbnail not available")
+
+        response = build_cached_file_response(request, variant_path, content_type, max_age=86400)
+        patch_vary_headers(response, ['Accept'])
+        return response
+
+
+class WatchProgressView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, movie_id: int):
+        serializer = WatchProgressSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        record_progress(request.user.id, movie_id, **serializer.validated_data)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class ContinueWatchingView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        limit = int(getattr(settings, 'CONTINUE_WATCHING_LIMIT', 20))
+
+        progress = get_progress(request.user.id, lambda: list_watch_progress(request.user.id, limit))
+        progress = {video_id: entry for video_id, entry in progress.items() if is_unfinished(entry)}
+        recent = sorted(progress, key=lambda video_id: progress[video_id]["updated_at"], reverse=True)[:limit]
+        videos = {video.id: video for video in list_videos_queryset().filter(id__in=recent)}
+
+        serializer = ContinueWatchingSerializer(
+            [videos[video_id] for video_id in recent if video_id in videos],
+            many=True,
+            context={"request": request, "progress": progress},
+        )
+        return Response(serializer.data)
+
+
+class QoEBeaconView(APIView):
+    authentication_classes = [CookieJWTStatelessAuthentication]
+    permission_classes = [IsAuthenticated]
+    throttle_classes = [RedisRateThrottle]
+    throttle_scope = 'qoe'
+
+    def post(self, request):
+        try:
+            events = normalize_events(decode_beacon_body(request.body, request.headers.get('Content-Encoding', '')))
+        except (ValueError, TypeError, KeyError, OverflowError):
+            return Response({"detail": "Invalid beacon payload."}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            append_events(request.user.id, events)
+        except RedisError:
+            return Response(status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        return Response({"accepted": len(events)}, status=status.HTTP_202_ACCEPTED)
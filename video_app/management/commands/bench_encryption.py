@@ -0,0 +1,59 @@
+import json, os, shutil, tempfile, time
+
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+
+from video_app.api.encryption import encrypt_segment
+from video_app.management.commands.bench_streaming import percentile
+
+
+class Command(BaseCommand):
+    help = "Measure AES-128 segment encryption throughput against a plain read/write of the same segments; prints a JSON report."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--segments', type=int, default=50)
+        parser.add_argument('--segment-kb', type=int, default=2048, help='Segment size; 4s at ~4 Mbit/s is about 2 MB.')
+        parser.add_argument('--dir', help='Directory on the media volume to benchmark (defaults to a temp dir).')
+
+    def handle(self, *args, **options):
+        work_dir = Path(tempfile.mkdtemp(prefix="bench-encryption-", dir=options['dir']))
+        try:
+            paths = []
+            for i in range(options['segments']):
+                path = work_dir / f"seg_{i:05d}.ts"
+                path.write_bytes(os.urandom(options['segment_kb'] * 1024))
+                paths.append(path)
+
+            copy_times = self.time_each(paths, lambda path, i: path.write_bytes(path.read_bytes()))
+            key = os.urandom(16)
+            encrypt_times = self.time_each(paths, lambda path, i: encrypt_segment(path, key, i))
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+        megabytes = options['segments'] * options['segment_kb'] / 1024
+        report = {
+            "config": {k: options[k] for k in ("segments", "segment_kb")},
+            "copy": self.summarize(copy_times, megabytes),
+            "encrypt": self.summarize(encrypt_times, megabytes),
+            "overhead_ms_per_segment": round((sum(encrypt_times) - sum(copy_times)) / len(paths) * 1000, 3),
+            "overhead_bytes_per_segment": 16 - (options['segment_kb'] * 1024) % 16,
+        }
+        self.stdout.write(json.dumps(report, indent=2))
+
+    def time_each(self, paths: list, func) -> list:
+        times = []
+        for i, path in enumerate(paths):
+            start = time.perf_counter()
+            func(path, i)
+            times.append(time.perf_counter() - start)
+        return times
+
+    def summarize(self, times: list, megabytes: float) -> dict:
+        total = sum(times)
+        return {
+            "total_s": round(total, 4),
+            "mb_per_s": round(megabytes / total, 1) if total else 0.0,
+            "p50_ms": round(percentile(times, 0.5) * 1000, 3),
+            "p99_ms": round(percentile(times, 0.99) * 1000, 3),
+        }
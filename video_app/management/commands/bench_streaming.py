@@ -0,0 +1,292 @@
+import json, os, random, threading, time
+
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections, close_old_connections
+from django.test import Client
+
+from core.metrics import execute_wrapper_all
+
+from video_app.models import Video
+from video_app.api.tasks import HLS_VARIANTS
+from video_app.api.utils import get_hls_variant_dir
+
+
+BENCH_TITLE_PREFIX = "bench-video-"
+BENCH_USER_PREFIX = "bench-user-"
+BENCH_PASSWORD = "bench-password-123"
+
+
+def percentile(values: list, q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def get_default_host() -> str:
+    host = next((h for h in settings.ALLOWED_HOSTS if h != "*"), "localhost")
+    return host.lstrip(".")
+
+
+def get_viewer_address(index: int) -> str:
+    index += 1
+    return f"10.{(index >> 16) & 255}.{(index >> 8) & 255}.{index & 255}"
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class ConnectionTracker:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.opened = 0
+        self.seconds = 0.0
+
+    def __enter__(self):
+        wrapper_class = self.wrapper_class = type(connections[DEFAULT_DB_ALIAS])
+        self.patched = 'connect' in wrapper_class.__dict__
+        original = wrapper_class.connect
+        tracker = self
+
+        def connect(wrapper):
+            start = time.perf_counter()
+            try:
+                return original(wrapper)
+            finally:
+                with tracker.lock:
+                    tracker.opened += 1
+                    tracker.seconds += time.perf_counter() - start
+
+        self.original = original
+        wrapper_class.connect = connect
+        return self
+
+    def __exit__(self, *exc):
+        if self.patched:
+            self.wrapper_class.connect = self.original
+        else:
+            del self.wrapper_class.connect
+
+    def report(self, requests: int) -> dict:
+        return {
+            "mode": getattr(settings, 'DB_CONN_MODE', 'none'),
+            "opened": self.opened,
+            "per_request": round(self.opened / requests, 3) if requests else 0.0,
+            "setup_ms_total": round(self.seconds * 1000, 2),
+            "setup_ms_mean": round(self.seconds / self.opened * 1000, 2) if self.opened else 0.0,
+        }
+
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = {}
+        self.bytes = 0
+
+    def record(self, endpoint: str, seconds: float, queries: int, status: int, size: int = 0):
+        with self.lock:
+            sample = self.samples.setdefault(endpoint, {"latency": [], "queries": [], "errors": 0})
+            sample["latency"].append(seconds)
+            sample["queries"].append(queries)
+            if status >= 400:
+                sample["errors"] += 1
+            self.bytes += size
+
+    def report(self, elapsed: float, options: dict) -> dict:
+        endpoints = {}
+        total = 0
+        for endpoint, sample in sorted(self.samples.items()):
+            latency, queries = sample["latency"], sample["queries"]
+            total += len(latency)
+            endpoints[endpoint] = {
+                "requests": len(latency),
+                "errors": sample["errors"],
+                "p50_ms": round(percentile(latency, 0.5) * 1000, 2),
+                "p99_ms": round(percentile(latency, 0.99) * 1000, 2),
+                "mean_ms": round(sum(latency) / len(latency) * 1000, 2),
+                "queries_mean": round(sum(queries) / len(queries), 2),
+                "queries_max": max(queries),
+            }
+
+        return {
+            "config": {k: options[k] for k in ("videos", "viewers", "segments", "speed", "rendition")},
+            "elapsed_s": round(elapsed, 3),
+            "requests": total,
+            "throughput_rps": round(total / elapsed, 2) if elapsed else 0.0,
+            "throughput_mbps": round(self.bytes * 8 / 1e6 / elapsed, 2) if elapsed else 0.0,
+            "endpoints": endpoints,
+        }
+
+
+class Command(BaseCommand):
+    help = "Seed synthetic HLS titles and simulate concurrent viewers against the streaming API; prints a JSON report."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--videos', type=int, default=20)
+        parser.add_argument('--viewers', type=int, default=10)
+        parser.add_argument('--segments', type=int, default=10, help='Segments each viewer plays.')
+        parser.add_argument('--segment-seconds', type=float, default=4.0)
+        parser.add_argument('--segment-kb', type=int, default=256)
+        parser.add_argument('--speed', type=float, default=1.0,
+                            help='Playback speed multiplier; 0 fetches segments back to back.')
+        parser.add_argument('--rendition', default=HLS_VARIANTS[0]["name"])
+        parser.add_argument('--host', help='Host header to send; defaults to the first ALLOWED_HOSTS entry.')
+        parser.add_argument('--output', help='Write the JSON report to this file.')
+        parser.add_argument('--baseline', help='Fail if p99 latency or queries regress against this report.')
+        parser.add_argument('--max-regression', type=float, default=0.25, help='Allowed relative p99 regression.')
+        parser.add_argument('--cleanup', action='store_true', help='Delete seeded bench data and exit.')
+
+    def handle(self, *args, **options):
+        if options['cleanup']:
+            self.cleanup()
+            return
+
+        videos = self.seed_videos(options)
+        users = self.seed_users(options['viewers'])
+
+        recorder = Recorder()
+        host = options['host'] or get_default_host()
+        threads = [
+            threading.Thread(target=self.run_viewer, args=(user, videos, recorder, options, host, get_viewer_address(i)))
+            for i, user in enumerate(users)
+        ]
+
+        with ConnectionTracker() as tracker:
+            started = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - started
+
+        report = recorder.report(elapsed, options)
+        report["db_connections"] = tracker.report(report["requests"])
+        output = json.dumps(report, indent=2)
+        self.stdout.write(output)
+        if options['output']:
+            Path(options['output']).write_text(output + "\n", encoding="utf-8")
+
+        failed = {endpoint: e["errors"] for endpoint, e in report["endpoints"].items() if e["errors"]}
+        if failed:
+            raise CommandError("Requests failed: " + ", ".join(f"{endpoint} {count}" for endpoint, count in failed.items()))
+
+        if options['baseline']:
+            self.check_regressions(report, json.loads(Path(options['baseline']).read_text()), options['max_regression'])
+
+    def seed_videos(self, options: dict) -> list:
+        existing = list(Video.objects.filter(title__startswith=BENCH_TITLE_PREFIX).values_list('id', flat=True))
+        missing = options['videos'] - len(existing)
+        if missing > 0:
+            created = Video.objects.bulk_create([
+                Video(
+                    title=f"{BENCH_TITLE_PREFIX}{len(existing) + i}",
+                    description="Synthetic benchmark title",
+                    category="Benchmark",
+                    video_file=f"videos/{BENCH_TITLE_PREFIX}{len(existing) + i}.mp4",
+                )
+                for i in range(missing)
+            ])
+            existing += [video.id for video in created]
+
+        video_ids = existing[:options['videos']]
+        for video_id in video_ids:
+            self.write_hls_tree(video_id, options)
+        return video_ids
+
+    def write_hls_tree(self, video_id: int, options: dict):
+        segment_count = max(options['segments'], 1)
+        for variant in HLS_VARIANTS:
+            variant_dir = get_hls_variant_dir(video_id, variant["name"])
+            playlist = variant_dir / "index.m3u8"
+            if playlist.exists():
+                continue
+
+            variant_dir.mkdir(parents=True, exist_ok=True)
+            lines = [
+                "#EXTM3U", "#EXT-X-VERSION:3",
+                f"#EXT-X-TARGETDURATION:{int(options['segment_seconds'] + 0.999)}",
+                "#EXT-X-MEDIA-SEQUENCE:0", "#EXT-X-PLAYLIST-TYPE:VOD",
+            ]
+            for i in range(segment_count):
+                name = f"seg_{i:05d}.ts"
+                (variant_dir / name).write_bytes(os.urandom(options['segment_kb'] * 1024))
+                lines += [f"#EXTINF:{options['segment_seconds']:.6f},", name]
+            lines.append("#EXT-X-ENDLIST")
+            playlist.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+    def seed_users(self, count: int) -> list:
+        password = make_password(BENCH_PASSWORD)
+        emails = [f"{BENCH_USER_PREFIX}{i}@example.com" for i in range(count)]
+        existing = set(User.objects.filter(username__in=emails).values_list('username', flat=True))
+        User.objects.bulk_create([
+            User(username=email, email=email, password=password, is_active=True)
+            for email in emails if email not in existing
+        ])
+        return emails
+
+    def run_viewer(self, email: str, videos: list, recorder: Recorder, options: dict, host: str, address: str):
+        # Per-viewer address so the per-IP login throttle sees separate clients, as in production.
+        client = Client(SERVER_NAME=host, HTTP_HOST=host, REMOTE_ADDR=address, HTTP_X_FORWARDED_FOR=address)
+        counter = QueryCounter()
+        rendition = options['rendition']
+
+        def timed(endpoint, method, *args, **kwargs):
+            counter.count = 0
+            start = time.perf_counter()
+            response = getattr(client, method)(*args, **kwargs)
+            if getattr(response, 'streaming', False):
+                body = b"".join(response.streaming_content)
+            else:
+                body = response.content
+            recorder.record(endpoint, time.perf_counter() - start, counter.count, response.status_code, len(body))
+            close_old_connections()
+            return response.status_code, body
+
+        try:
+            with execute_wrapper_all(counter):
+                timed("login", "post", "/api/login/", {"email": email, "password": BENCH_PASSWORD},
+                      content_type="application/json")
+                timed("catalogue", "get", "/api/video/")
+
+                video_id = random.choice(videos)
+                status, body = timed("playlist", "get", f"/api/video/{video_id}/{rendition}/index.m3u8")
+                lines = body.decode().splitlines() if status == 200 else []
+                segments = [line for line in lines if line and not line.startswith("#")]
+
+                for segment in segments[:options['segments']]:
+                    timed("segment", "get", f"/api/video/{video_id}/{rendition}/{segment}/")
+                    if options['speed']:
+                        time.sleep(options['segment_seconds'] / options['speed'])
+        finally:
+            close_old_connections()
+            connections.close_all()
+
+    def check_regressions(self, report: dict, baseline: dict, max_regression: float):
+        failures = []
+        for endpoint, current in report["endpoints"].items():
+            previous = baseline.get("endpoints", {}).get(endpoint)
+            if not previous:
+                continue
+            if previous["p99_ms"] and current["p99_ms"] > previous["p99_ms"] * (1 + max_regression):
+                failures.append(f"{endpoint}: p99 {previous['p99_ms']}ms -> {current['p99_ms']}ms")
+            if current["queries_max"] > previous["queries_max"]:
+                failures.append(f"{endpoint}: queries {previous['queries_max']} -> {current['queries_max']}")
+
+        if failures:
+            raise CommandError("Performance regression: " + "; ".join(failures))
+
+    def cleanup(self):
+        videos, _ = Video.objects.filter(title__startswith=BENCH_TITLE_PREFIX).delete()
+        users, _ = User.objects.filter(username__startswith=BENCH_USER_PREFIX).delete()
+        self.stdout.write(f"Removed {videos} bench video rows and {users} bench user rows; storage is reaped in the background.")
@@ -0,0 +1,60 @@
+import os, socket, time
+
+from django.core.management.base import BaseCommand
+from django.db import DataError, DatabaseError, IntegrityError, close_old_connections
+from redis.exceptions import RedisError
+from video_app.api.qoe import (
+    QOE_COUNTER_FIELDS, claim_event_batches, ack_event_batches, aggregate_event_batches, dead_letter_event_batches,
+)
+from video_app.api.services import add_qoe_rollups
+
+# Errors caused by the beacon contents rather than the database being unavailable.
+POISON_ERRORS = (ValueError, TypeError, KeyError, OverflowError, DataError, IntegrityError)
+
+
+class Command(BaseCommand):
+    help = "Roll up player QoE beacons from the Redis stream into QoERollup rows. Runs continuously unless --once is given."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Process one batch and exit.')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Stream entries (beacons) per read.')
+        parser.add_argument('--block-ms', type=int, default=5000, help='How long to wait for new beacons.')
+        parser.add_argument('--consumer', default=f"{socket.gethostname()}-{os.getpid()}")
+
+    def handle(self, *args, **options):
+        while True:
+            close_old_connections()
+            try:
+                entries = claim_event_batches(options['consumer'], options['batch_size'], options['block_ms'])
+                if entries:
+                    self.roll_up(entries)
+            except RedisError as exc:
+                self.stderr.write(f"Could not read QoE stream: {exc}")
+                if not options['once']:
+                    time.sleep(1)
+            except DatabaseError as exc:
+                # Left pending; another read reclaims the entries once they have been idle for QOE_CLAIM_IDLE_MS.
+                self.stderr.write(f"Could not write QoE rollups: {exc}")
+                if not options['once']:
+                    time.sleep(1)
+
+            if options['once']:
+                break
+
+    def roll_up(self, entries: list):
+        try:
+            written = add_qoe_rollups(aggregate_event_batches(entries), QOE_COUNTER_FIELDS)
+        except POISON_ERRORS:
+            # Retry one beacon at a time so only the bad ones are set aside.
+            written = 0
+            for entry in entries:
+                try:
+                    written += add_qoe_rollups(aggregate_event_batches([entry]), QOE_COUNTER_FIELDS)
+                except POISON_ERRORS as exc:
+                    self.stderr.write(f"Moving QoE beacon {entry[0]} to the dead-letter stream: {exc!r}")
+                    dead_letter_event_batches([entry], repr(exc))
+                    continue
+                ack_event_batches([entry[0]])
+        else:
+            ack_event_batches([entry_id for entry_id, _ in entries])
+        self.stdout.write(f"Rolled up {len(entries)} beacons into {written} QoE rows.")
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+from django_redis import get_redis_connection
+
+from core.profiling import PROFILE_KEY_PREFIX, make_profile_token
+
+
+class Command(BaseCommand):
+    help = "Print sampled stacks in collapsed format (for flamegraph.pl / speedscope) or the slowest SQL."
+
+    def add_arguments(self, parser):
+        parser.add_argument('target', nargs='?', help='View class or job:<task> name. Lists targets when omitted.')
+        parser.add_argument('--sql', action='store_true', help='Print total SQL time per statement instead of stacks.')
+        parser.add_argument('--limit', type=int, default=0, help='Only print the N heaviest entries.')
+        parser.add_argument('--reset', action='store_true', help='Delete the stored profile for the target.')
+        parser.add_argument('--token', action='store_true', help='Print a signed X-Profile-Token header value.')
+
+    def handle(self, *args, **options):
+        if options['token']:
+            self.stdout.write(make_profile_token())
+            return
+
+        conn = get_redis_connection("default")
+        target = options['target']
+
+        if not target:
+            for name, count in sorted(conn.hgetall(f"{PROFILE_KEY_PREFIX}:samples").items()):
+                self.stdout.write(f"{name.decode()}\t{int(count)} samples")
+            return
+
+        kind = 'sql' if options['sql'] else 'stacks'
+        key = f"{PROFILE_KEY_PREFIX}:{kind}:{target}"
+
+        if options['reset']:
+            conn.delete(f"{PROFILE_KEY_PREFIX}:stacks:{target}", f"{PROFILE_KEY_PREFIX}:sql:{target}")
+            conn.hdel(f"{PROFILE_KEY_PREFIX}:samples", target)
+            return
+
+        end = options['limit'] - 1 if options['limit'] else -1
+        for member, score in conn.zrevrange(key, 0, end, withscores=True):
+            if kind == 'sql':
+                self.stdout.write(f"{score:10.1f} ms  {member.decode()}")
+            else:
+                self.stdout.write(f"{member.decode()} {int(score)}")
@@ -0,0 +1,175 @@
+import csv, json, os, time, django_rq
+
+from pathlib import Path
+
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rq.registry import StartedJobRegistry
+
+from core.jobs import build_job_payload
+from video_app.models import Video
+from video_app.api.outbox import enqueue_many_on_commit
+from video_app.api.tasks import process_video_to_hls
+
+
+VIDEO_EXTENSIONS = {'.mp4', '.mov', '.mkv', '.webm', '.m4v', '.avi'}
+
+
+class Command(BaseCommand):
+    help = "Bulk import videos from a directory or a CSV/JSONL manifest and queue them for processing."
+
+    def add_arguments(self, parser):
+        parser.add_argument('source', help='Directory to walk, or a .csv/.jsonl manifest with path,title,description,category.')
+        parser.add_argument('--category', default='Uncategorized', help='Category for directory imports without one.')
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--max-pending', type=int, default=50,
+                            help='Wait while more than this many processing jobs are queued or running.')
+        parser.add_argument('--checkpoint', help='Checkpoint file (defaults to <source>.ingest-checkpoint).')
+
+    def handle(self, *args, **options):
+        source = Path(options['source']).resolve()
+        if not source.exists():
+            raise CommandError(f"Source not found: {source}")
+
+        checkpoint_path = Path(options['checkpoint'] or f"{source}.ingest-checkpoint")
+        done = self.load_checkpoint(checkpoint_path)
+
+        self.invalid_rows = 0
+        entries = [e for e in self.iter_entries(source, options['category']) if str(e['path']) not in done]
+        self.stdout.write(f"{len(entries)} videos to ingest ({len(done)} already done, {self.invalid_rows} invalid rows).")
+
+        started = time.monotonic()
+        total_files = total_bytes = 0
+        failed = self.invalid_rows
+
+        for i in range(0, len(entries), options['batch_size']):
+            batch = entries[i:i + options['batch_size']]
+            self.wait_for_capacity(options['max_pending'])
+
+            batch_started = time.monotonic()
+            videos, ingested, batch_bytes = [], [], 0
+
+            for entry in batch:
+                try:
+                    stored_name = self.store_file(entry['path'])
+                except OSError as e:
+                    failed += 1
+                    self.stderr.write(f"Failed to store {entry['path']}: {e}")
+                    continue
+
+                videos.append(Video(
+                    title=entry['title'][:200],
+                    description=entry['description'],
+                    category=entry['category'][:100],
+                    video_file=stored_name,
+                ))
+                ingested.append(str(entry['path']))
+                batch_bytes += entry['path'].stat().st_size
+
+            with transaction.atomic():
+                created = Video.objects.bulk_create(videos)
+                enqueue_many_on_commit(
+                    process_video_to_hls,
+                    [build_job_payload(video_id=video.id) for video in created]
+                )
+
+            self.save_checkpoint(checkpoint_path, ingested)
+
+            total_files += len(created)
+            total_bytes += batch_bytes
+            elapsed = max(time.monotonic() - batch_started, 1e-6)
+            self.stdout.write(
+                f"Batch {i // options['batch_size'] + 1}: {len(created)} videos, "
+                f"{batch_bytes / 1e6:.1f} MB in {elapsed:.1f}s "
+                f"({len(created) / elapsed:.1f} videos/s, {batch_bytes / 1e6 / elapsed:.1f} MB/s)"
+            )
+
+        elapsed = max(time.monotonic() - started, 1e-6)
+        self.stdout.write(self.style.SUCCESS(
+            f"Ingested {total_files} videos ({total_bytes / 1e9:.2f} GB) in {elapsed:.1f}s: "
+            f"{total_files / elapsed:.1f} videos/s, {total_bytes / 1e6 / elapsed:.1f} MB/s, {failed} failed."
+        ))
+
+    def iter_entries(self, source: Path, default_category: str):
+        if source.is_dir():
+            for root, _, files in os.walk(source):
+                for name in sorted(files):
+                    path = Path(root) / name
+                    if path.suffix.lower() not in VIDEO_EXTENSIONS:
+                        continue
+                    yield {
+                        'path': path,
+                        'title': path.stem.replace('_', ' ').replace('-', ' ').strip(),
+                        'description': '',
+                        'category': default_category if Path(root) == source else Path(root).name,
+                    }
+            return
+
+        for line_number, row in self.iter_manifest_rows(source):
+            try:
+                entry = self.parse_row(row, source, default_category)
+            except ValueError as e:
+                self.invalid_rows += 1
+                self.stderr.write(f"Skipping {source.name} line {line_number}: {e}")
+                continue
+            yield entry
+
+    def iter_manifest_rows(self, source: Path):
+        if source.suffix == '.csv':
+            with source.open(newline='', encoding='utf-8') as f:
+                reader = csv.DictReader(f)
+                for row in reader:
+                    yield reader.line_num, row
+        elif source.suffix in ('.jsonl', '.ndjson'):
+            with source.open(encoding='utf-8') as f:
+                for line_number, line in enumerate(f, start=1):
+                    if not line.strip():
+                        continue
+                    try:
+                        yield line_number, json.loads(line)
+                    except ValueError as e:
+                        yield line_number, e
+        else:
+            raise CommandError("Manifest must be a .csv or .jsonl file")
+
+    def parse_row(self, row, source: Path, default_category: str) -> dict:
+        if isinstance(row, ValueError):
+            raise ValueError(f"invalid JSON ({row})")
+        if not isinstance(row, dict):
+            raise ValueError("expected an object with path, title, description, category")
+        if not isinstance(row.get('path'), str) or not row['path'].strip():
+            raise ValueError("missing path")
+
+        path = (source.parent / row['path'].strip()).resolve()
+        if not path.is_file():
+            raise ValueError(f"file not found: {path}")
+        return {
+            'path': path,
+            'title': str(row.get('title') or path.stem),
+            'description': str(row.get('description') or ''),
+            'category': str(row.get('category') or default_category),
+        }
+
+    def store_file(self, path: Path) -> str:
+        with path.open('rb') as f:
+            return default_storage.save(f"videos/{path.name}", File(f, name=path.name))
+
+    def wait_for_capacity(self, max_pending: int):
+        queue = django_rq.get_queue('default')
+        registry = StartedJobRegistry(queue=queue)
+
+        while queue.count + registry.count > max_pending:
+            time.sleep(5)
+
+    def load_checkpoint(self, path: Path) -> set:
+        if not path.exists():
+            return set()
+        return {line.strip() for line in path.read_text(encoding='utf-8').splitlines() if line.strip()}
+
+    def save_checkpoint(self, path: Path, ingested: list):
+        with path.open('a', encoding='utf-8') as f:
+            f.write("".join(f"{p}\n" for p in ingested))
+            f.flush()
+            os.fsync(f.fileno())
@@ -0,0 +1,100 @@
+import shutil, signal, subprocess
+
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from video_app.models import Video
+from video_app.api.tasks import (
+    HLS_VARIANTS, AUDIO_BITRATE_KBPS, get_scaled_width, get_variant_encode_args, write_master_playlist
+)
+from video_app.api.utils import get_hls_root_dir
+
+
+class Command(BaseCommand):
+    help = "Encode a live source (RTMP/SRT URL or a local file) into sliding-window HLS playlists for a live title."
+
+    def add_arguments(self, parser):
+        parser.add_argument('video_id', type=int)
+        parser.add_argument('--source', help='Input URL or file; defaults to the video\'s live_source.')
+        parser.add_argument('--loop', action='store_true', help='Loop a local file forever to simulate a stream.')
+        parser.add_argument('--listen', action='store_true', help='Act as the RTMP server and wait for a publisher.')
+        parser.add_argument('--duration', type=float, help='Stop after this many seconds of input.')
+        parser.add_argument('--variants', help='Comma-separated rendition names (default: all HLS_VARIANTS).')
+
+    def handle(self, *args, **options):
+        video = Video.objects.filter(id=options['video_id']).first()
+        if video is None or not video.is_live:
+            raise CommandError(f"Video {options['video_id']} does not exist or is not a live title.")
+
+        source = options['source'] or video.live_source
+        if not source:
+            raise CommandError("No source given and the video has no live_source.")
+
+        names = options['variants'].split(",") if options['variants'] else [v["name"] for v in HLS_VARIANTS]
+        variants = [v for v in HLS_VARIANTS if v["name"] in names]
+        if not variants:
+            raise CommandError(f"Unknown variants: {options['variants']}")
+
+        output_root = get_hls_root_dir(video.id)
+        for v in variants:
+            shutil.rmtree(output_root / v["name"], ignore_errors=True)
+            (output_root / v["name"]).mkdir(parents=True)
+        self.write_master(output_root, variants)
+
+        cmd = self.build_command(source, output_root, variants, options)
+        self.stdout.write(f"Live ingest for video {video.id} from {source} ({', '.join(names)})")
+
+        process = subprocess.Popen(cmd)
+        try:
+            returncode = process.wait()
+        except KeyboardInterrupt:
+            process.send_signal(signal.SIGINT)
+            returncode = process.wait()
+
+        if returncode not in (0, 255):
+            raise CommandError(f"ffmpeg exited with code {returncode}")
+        self.stdout.write(f"Live ingest for video {video.id} ended.")
+
+    def build_command(self, source: str, output_root: Path, variants: list, options: dict) -> list:
+        hls_time = int(getattr(settings, 'LIVE_SEGMENT_SECONDS', 2))
+        window = int(getattr(settings, 'LIVE_WINDOW_SEGMENTS', 6))
+
+        cmd = ["ffmpeg", "-hide_banner", "-loglevel", "warning", "-y"]
+        if Path(source).exists():
+            cmd.append("-re")
+            if options['loop']:
+                cmd += ["-stream_loop", "-1"]
+        elif options['listen']:
+            cmd += ["-listen", "1"]
+        if options['duration']:
+            cmd += ["-t", str(options['duration'])]
+        cmd += ["-i", source]
+
+        for v in variants:
+            variant_dir = output_root / v["name"]
+            cmd += [
+                "-map", "0:v:0", "-map", "0:a:0?",
+                *get_variant_encode_args(v["height"], f"{v['maxrate']}k", f"{v['bufsize']}k", hls_time, True),
+                "-f", "hls",
+                "-hls_time", str(hls_time),
+                "-hls_list_size", str(window),
+                "-hls_delete_threshold", "2",
+                "-hls_flags", "delete_segments+independent_segments+temp_file+program_date_time",
+                "-hls_segment_filename", str(variant_dir / "seg_%05d.ts"),
+                str(variant_dir / "index.m3u8"),
+            ]
+        return cmd
+
+    def write_master(self, output_root: Path, variants: list):
+        write_master_playlist(output_root, [
+            {
+                "name": v["name"],
+                "height": v["height"],
+                "width": get_scaled_width(None, v["height"]),
+                "bandwidth": (v["maxrate"] + AUDIO_BITRATE_KBPS) * 1000,
+                "playlist_rel": f"{v['name']}/index.m3u8",
+            }
+            for v in variants
+        ])
@@ -0,0 +1,70 @@
+import os, re, subprocess, sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+BOOT_SCRIPTS = {
+    "web": "import core.wsgi; from django.urls import get_resolver; get_resolver().url_patterns",
+    "worker": "import django; django.setup(); import core.worker, video_app.api.tasks, auth_app.api.tasks",
+}
+
+# Modules that must stay off the web boot path; views import them on first use.
+DEFERRED_MODULES = {
+    "web": ["video_app.api.tasks", "auth_app.api.tasks"],
+    "worker": [],
+}
+
+IMPORT_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( +)(\S+)")
+
+
+def parse_importtime(output: str) -> list:
+    entries = []
+    for line in output.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            entries.append((module, int(self_us), int(cumulative_us), len(indent) == 1))
+    return entries
+
+
+class Command(BaseCommand):
+    help = "Profile module import cost of a web or worker boot with -X importtime and enforce a time budget."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--target', choices=sorted(BOOT_SCRIPTS), default='web')
+        parser.add_argument('--limit', type=int, default=20, help='Print the N most expensive imports.')
+        parser.add_argument('--budget-ms', type=float, default=None,
+                            help='Fail if total import time exceeds this (default: IMPORT_TIME_BUDGET_MS).')
+        parser.add_argument('--runs', type=int, default=3, help='Take the fastest of N boots to reduce noise.')
+
+    def handle(self, *args, **options):
+        target = options['target']
+        budget = options['budget_ms'] or getattr(settings, 'IMPORT_TIME_BUDGET_MS', {}).get(target)
+
+        entries = min((self.run_boot(target) for _ in range(max(options['runs'], 1))), key=self.total_us)
+        total_ms = self.total_us(entries) / 1000
+
+        for module, self_us, cumulative_us, _ in sorted(entries, key=lambda e: e[2], reverse=True)[:options['limit']]:
+            self.stdout.write(f"{cumulative_us / 1000:9.1f} ms  {self_us / 1000:8.1f} ms self  {module}")
+        self.stdout.write(f"Total import time ({target}): {total_ms:.1f} ms across {len(entries)} modules")
+
+        loaded = {entry[0] for entry in entries}
+        eager = [module for module in DEFERRED_MODULES[target] if module in loaded]
+        if eager:
+            raise CommandError(f"Deferred modules imported during {target} boot: {', '.join(eager)}")
+        if budget and total_ms > budget:
+            raise CommandError(f"Import time {total_ms:.1f} ms exceeds budget of {budget:.0f} ms for {target} boot.")
+
+    def run_boot(self, target: str) -> list:
+        env = {**os.environ, "DJANGO_SETTINGS_MODULE": os.environ.get("DJANGO_SETTINGS_MODULE", settings.SETTINGS_MODULE)}
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", BOOT_SCRIPTS[target]],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+        )
+        if result.returncode != 0:
+            raise CommandError(f"{target} boot failed:\n{result.stderr[-2000:]}")
+        return parse_importtime(result.stderr)
+
+    def total_us(self, entries: list) -> int:
+        return sum(cumulative_us for _, _, cumulative_us, top_level in entries if top_level)
@@ -0,0 +1,17 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from core.jobs import build_job_payload
+from video_app.api.tasks import reconcile_media_storage
+
+
+class Command(BaseCommand):
+    help = "Report (and optionally delete) media files and HLS trees that no Video row references."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reclaim', action='store_true', help='Delete the orphaned files instead of only reporting them.')
+
+    def handle(self, *args, **options):
+        report = reconcile_media_storage(build_job_payload(reclaim=options['reclaim']))
+        self.stdout.write(json.dumps(report, indent=2))
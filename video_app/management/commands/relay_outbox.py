@@ -0,0 +1,37 @@
+import time
+
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from video_app.api.outbox import dispatch_pending_jobs, purge_dispatched_jobs
+
+
+class Command(BaseCommand):
+    help = "Push pending outbox jobs to Redis. Runs continuously unless --once is given."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Drain the outbox once and exit.')
+        parser.add_argument('--interval', type=float, default=2.0, help='Seconds between polls.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--retention-days', type=int, default=7, help='Delete dispatched rows older than this.')
+
+    def handle(self, *args, **options):
+        retention = timedelta(days=options['retention_days'])
+        last_purge = 0.0
+
+        while True:
+            close_old_connections()
+            dispatched = dispatch_pending_jobs(batch_size=options['batch_size'])
+            if dispatched:
+                self.stdout.write(f"Dispatched {dispatched} outbox jobs.")
+
+            if time.monotonic() - last_purge > 3600:
+                purged = purge_dispatched_jobs(retention)
+                if purged:
+                    self.stdout.write(f"Purged {purged} dispatched outbox rows.")
+                last_purge = time.monotonic()
+
+            if options['once']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,33 @@
+import time, django_rq
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.jobs import build_job_payload
+
+
+class Command(BaseCommand):
+    help = "Enqueue the jobs listed in settings.PERIODIC_JOBS at their configured intervals."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Enqueue every due job once and exit.')
+        parser.add_argument('--tick', type=float, default=5.0, help='Seconds between schedule checks.')
+
+    def handle(self, *args, **options):
+        while True:
+            for job in getattr(settings, 'PERIODIC_JOBS', []):
+                self.enqueue_if_due(job)
+
+            if options['once']:
+                break
+            time.sleep(options['tick'])
+
+    def enqueue_if_due(self, job: dict):
+        queue = django_rq.get_queue(job.get('queue', 'default'))
+        lock_key = f"videoflix:periodic:{job['func']}"
+
+        if not queue.connection.set(lock_key, 1, nx=True, ex=int(job['interval'])):
+            return
+
+        queue.enqueue(job['func'], build_job_payload(**job.get('kwargs', {})))
+        self.stdout.write(f"Enqueued periodic job {job['func']}")
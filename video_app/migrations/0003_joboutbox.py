@@ -0,0 +1,29 @@
+# Generated by Django 6.0.1 on 2026-10-19 17:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('video_app', '0002_rename_thumbnail_url_video_thumbnail'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JobOutbox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('func', models.CharField(max_length=200)),
+                ('payload', models.JSONField()),
+                ('queue', models.CharField(default='default', max_length=50)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('dispatched_at', models.DateTimeField(blank=True, null=True)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True)),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('dispatched_at__isnull', True)), fields=['id'], name='joboutbox_pending_idx'), models.Index(fields=['dispatched_at'], name='joboutbox_dispatched_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-19 18:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('video_app', '0004_renditionjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='joboutbox',
+            name='max_retries',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 6.0.1 on 2026-10-19 20:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('video_app', '0006_watchprogress'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='video',
+            name='view_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='VideoViewBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket_start', models.DateTimeField()),
+                ('segment_hits', models.PositiveIntegerField(default=0)),
+                ('unique_viewers', models.PositiveIntegerField(default=0)),
+                ('video', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='view_buckets', to='video_app.video')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['bucket_start'], name='videoviewbucket_start_idx')],
+                'constraints': [models.UniqueConstraint(fields=('video', 'bucket_start'), name='unique_video_view_bucket')],
+            },
+        ),
+    ]
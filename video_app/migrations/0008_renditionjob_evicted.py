@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-19 20:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('video_app', '0007_view_stats'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='renditionjob',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('complete', 'Complete'), ('failed', 'Failed'), ('evicted', 'Evicted')], default='pending', max_length=20),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-19 21:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('video_app', '0008_renditionjob_evicted'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='video',
+            name='encoding_ladder',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
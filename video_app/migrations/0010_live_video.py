@@ -0,0 +1,28 @@
+# Generated by Django 6.0.1 on 2026-10-19 21:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('video_app', '0009_video_encoding_ladder'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='video',
+            name='is_live',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='video',
+            name='live_source',
+            field=models.CharField(blank=True, max_length=500),
+        ),
+        migrations.AlterField(
+            model_name='video',
+            name='video_file',
+            field=models.FileField(blank=True, upload_to='videos/'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 6.0.1 on 2026-10-19 22:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('video_app', '0010_live_video'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QoERollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rendition', models.CharField(max_length=20)),
+                ('bucket_start', models.DateTimeField()),
+                ('startups', models.PositiveIntegerField(default=0)),
+                ('startup_ms', models.PositiveBigIntegerField(default=0)),
+                ('rebuffers', models.PositiveIntegerField(default=0)),
+                ('rebuffer_ms', models.PositiveBigIntegerField(default=0)),
+                ('switches', models.PositiveIntegerField(default=0)),
+                ('play_ms', models.PositiveBigIntegerField(default=0)),
+                ('video', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='qoe_rollups', to='video_app.video')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['bucket_start'], name='qoerollup_start_idx')],
+                'constraints': [models.UniqueConstraint(fields=('video', 'rendition', 'bucket_start'), name='unique_qoe_rollup')],
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 6.0.1 on 2026-10-19 22:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('video_app', '0011_qoerollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VideoKey',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key_index', models.PositiveIntegerField()),
+                ('key', models.BinaryField(max_length=16)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('video', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='keys', to='video_app.video')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('video', 'key_index'), name='unique_video_key')],
+            },
+        ),
+    ]
@@ -1,14 +1,139 @@
 from django.db import models
+from django.contrib.auth.models import User
 
 # Create your models here.
 
 class Video(models.Model):
     title = models.CharField(max_length=200)
     description = models.TextField()
-    video_file = models.FileField(upload_to='videos/')
+    video_file = models.FileField(upload_to='videos/', blank=True)
     thumbnail = models.FileField(upload_to='thumbnails/', null=True, blank=True)
     category = models.CharField(max_length=100)
     created_at = models.DateTimeField(auto_now_add=True)
+    view_count = models.PositiveIntegerField(default=0)
+    encoding_ladder = models.JSONField(default=dict, blank=True)
+    is_live = models.BooleanField(default=False)
+    live_source = models.CharField(max_length=500, blank=True)
     
     def __str__(self):
-        return self.title
\ No newline at end of file
+        return self.title
+
+class JobOutbox(models.Model):
+    func = models.CharField(max_length=200)
+    payload = models.JSONField()
+    queue = models.CharField(max_length=50, default='default')
+    max_retries = models.PositiveSmallIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    dispatched_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['id'], condition=models.Q(dispatched_at__isnull=True), name='joboutbox_pending_idx'),
+            models.Index(fields=['dispatched_at'], name='joboutbox_dispatched_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.func} ({self.queue})"
+
+
+class RenditionJob(models.Model):
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('complete', 'Complete'),
+        ('failed', 'Failed'),
+        ('evicted', 'Evicted'),
+    ]
+
+    video = models.ForeignKey(Video, on_delete=models.CASCADE, related_name='rendition_jobs')
+    name = models.CharField(max_length=20)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['video', 'name'], name='unique_rendition_job'),
+        ]
+
+    def __str__(self):
+        return f"{self.video_id}/{self.name} ({self.status})"
+
+
+class WatchProgress(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='watch_progress')
+    video = models.ForeignKey(Video, on_delete=models.CASCADE, related_name='watch_progress')
+    position = models.FloatField(default=0)
+    duration = models.FloatField(default=0)
+    updated_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'video'], name='unique_watch_progress'),
+        ]
+        indexes = [
+            models.Index(fields=['user', '-updated_at'], name='watchprogress_recent_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id}/{self.video_id} @ {self.position:.0f}s"
+
+
+class VideoViewBucket(models.Model):
+    video = models.ForeignKey(Video, on_delete=models.CASCADE, related_name='view_buckets')
+    bucket_start = models.DateTimeField()
+    segment_hits = models.PositiveIntegerField(default=0)
+    unique_viewers = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['video', 'bucket_start'], name='unique_video_view_bucket'),
+        ]
+        indexes = [
+            models.Index(fields=['bucket_start'], name='videoviewbucket_start_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.video_id} @ {self.bucket_start}"
+
+
+class QoERollup(models.Model):
+    video = models.ForeignKey(Video, on_delete=models.CASCADE, related_name='qoe_rollups')
+    rendition = models.CharField(max_length=20)
+    bucket_start = models.DateTimeField()
+    startups = models.PositiveIntegerField(default=0)
+    startup_ms = models.PositiveBigIntegerField(default=0)
+    rebuffers = models.PositiveIntegerField(default=0)
+    rebuffer_ms = models.PositiveBigIntegerField(default=0)
+    switches = models.PositiveIntegerField(default=0)
+    play_ms = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['video', 'rendition', 'bucket_start'], name='unique_qoe_rollup'),
+        ]
+        indexes = [
+            models.Index(fields=['bucket_start'], name='qoerollup_start_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.video_id}/{self.rendition} @ {self.bucket_start}"
+
+
+class VideoKey(models.Model):
+    video = models.ForeignKey(Video, on_delete=models.CASCADE, related_name='keys')
+    key_index = models.PositiveIntegerField()
+    key = models.BinaryField(max_length=16)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['video', 'key_index'], name='unique_video_key'),
+        ]
+
+    def __str__(self):
+        return f"{self.video_id}/key {self.key_index}"
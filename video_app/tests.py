@@ -1,3 +1,1055 @@
-from django.test import TestCase
+import gzip, json, os, tempfile, threading, time, unittest
+from io import StringIO
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from redis.exceptions import RedisError
+from rest_framework_simplejwt.tokens import AccessToken
+from rq.serializers import JSONSerializer
+
+try:
+    import fakeredis
+except ImportError:
+    fakeredis = None
+
+from core.sizing import plan_processes
+from core.db_router import REPLICA_STICKY_COOKIE, ReplicaMiddleware, ReplicaRouter
+from core.jobs import build_job_payload
+from .models import Video, JobOutbox, RenditionJob, WatchProgress, VideoViewBucket, QoERollup
+from .api.outbox import dispatch_pending_jobs
+from .api.utils import get_hls_root_dir, make_staging_dir
+from .api.storage import get_media_root
+from .api import tasks, readahead, thumbnails, view_counts
+from .api.encryption import encrypt_hls_variant
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class PreviewAssetsTests(TestCase):
+    def create_video(self):
+        with self.captureOnCommitCallbacks(execute=False):
+            return Video.objects.create(title='Test', description='', category='Drama', video_file='videos/test.mp4')
+
+    @override_settings(HLS_SEPARATE_AUDIO=True)
+    def test_probe_failure_falls_back_to_default_transcode(self):
+        video = self.create_video()
+        queue = mock.MagicMock()
+        with mock.patch.object(tasks, 'Dependency'), mock.patch.object(tasks, 'probe_video', side_effect=RuntimeError('ffprobe failed')), \
+                mock.patch.object(tasks, 'analyze_complexity') as analyze, \
+                mock.patch('django_rq.get_queue', return_value=queue):
+            result = tasks.process_video_to_hls(build_job_payload(video_id=video.id))
+
+        analyze.assert_not_called()
+        payloads = [c.args[1] for c in queue.enqueue.call_args_list if c.args[0] is tasks.process_single_variant]
+        self.assertEqual(len(payloads), result['variants_enqueued'])
+        self.assertTrue(all(p['probe'] is None and not p['separate_audio'] for p in payloads))
+
+    def test_finalize_keeps_highest_contrast_poster_and_writes_sprite_vtt(self):
+        video = self.create_video()
+        preview_dir = Path(tempfile.mkdtemp())
+        frames = {"00": bytes([128] * 64), "01": bytes(range(0, 256, 4))}
+        for index, pixels in frames.items():
+            (preview_dir / f"score_{index}.pgm").write_bytes(b"P5 8 8 255\n" + pixels)
+            (preview_dir / f"poster_{index}.jpg").write_bytes(f"poster-{index}".encode())
+        (preview_dir / "sprite_000.jpg").write_bytes(b"sprite")
+
+        tasks.finalize_preview_assets(video.id, preview_dir, {"duration": 25, "width": 1280, "height": 720})
+
+        video.refresh_from_db()
+        self.assertEqual(video.thumbnail.name, f"thumbnails/video_{video.id}.jpg")
+        self.assertEqual(Path(video.thumbnail.path).read_bytes(), b"poster-01")
+        self.assertEqual(sorted(p.name for p in preview_dir.iterdir()), ["sprite_000.jpg", "sprites.vtt"])
+        vtt = (preview_dir / "sprites.vtt").read_text().splitlines()
+        self.assertIn("00:00:10.000 --> 00:00:20.000", vtt)
+        self.assertIn("sprite_000.jpg#xywh=160,0,160,90", vtt)
+        self.assertIn("00:00:20.000 --> 00:00:25.000", vtt)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class JobPayloadTests(TestCase):
+    def create_video(self, **kwargs):
+        with self.captureOnCommitCallbacks(execute=False):
+            video = Video.objects.create(
+                title='Test', description='Test', category='Drama', video_file='videos/test.mp4', **kwargs)
+        return video, JobOutbox.objects.latest('id')
+
+    def test_post_save_enqueues_small_json_payload(self):
+        video, entry = self.create_video()
+
+        self.assertEqual(entry.func, 'video_app.api.tasks.process_video_to_hls')
+        self.assertEqual(entry.payload, {"v": 1, "video_id": video.id})
+
+        job_data = JSONSerializer.dumps((entry.func, None, (entry.payload,), {}))
+        self.assertLess(len(job_data), 128)
+
+    def test_job_skips_video_deleted_after_enqueue(self):
+        video, entry = self.create_video()
+        payload = entry.payload
+        video.delete()
+
+        with mock.patch.object(tasks, 'probe_video') as probe_video:
+            result = tasks.process_video_to_hls(payload)
+
+        self.assertTrue(result["skipped"])
+        probe_video.assert_not_called()
+
+    def test_thumbnail_set_after_enqueue_is_not_overwritten(self):
+        video, _ = self.create_video()
+        Video.objects.filter(id=video.id).update(thumbnail='thumbnails/custom.jpg')
+
+        self.assertFalse(tasks.save_video_thumbnail(video.id, Path('/nonexistent/poster.jpg')))
+        video.refresh_from_db()
+        self.assertEqual(video.thumbnail.name, 'thumbnails/custom.jpg')
+
+    def test_unknown_payload_version_is_rejected(self):
+        with self.assertRaises(ValueError):
+            tasks.process_video_to_hls({"v": 99, "video_id": 1})
+
+    def test_variant_payload_reloads_video_file(self):
+        video, _ = self.create_video()
+        Video.objects.filter(id=video.id).update(video_file='videos/replaced.mp4')
+        payload = build_job_payload(video_id=video.id, variant='480p', probe=None, with_previews=False)
+
+        with mock.patch.object(tasks, 'transcode_variant_to_hls', return_value='index.m3u8') as transcode:
+            tasks.process_single_variant(payload)
+
+        self.assertEqual(transcode.call_args.kwargs['input_path'].name, 'replaced.mp4')
+
+
+
+class OutboxTests(TestCase):
+    def create_video(self):
+        return Video.objects.create(title='Test', description='Test', category='Drama', video_file='videos/test.mp4')
+
+    def test_job_is_dispatched_only_after_commit(self):
+        with mock.patch('video_app.api.outbox.push_entries_to_redis') as push:
+            with self.captureOnCommitCallbacks(execute=True) as callbacks:
+                self.create_video()
+                push.assert_not_called()
+
+        self.assertEqual(len(callbacks), 1)
+        push.assert_called_once()
+        self.assertFalse(JobOutbox.objects.filter(dispatched_at__isnull=True).exists())
+
+    def test_commit_hook_dispatches_only_its_own_job(self):
+        with self.captureOnCommitCallbacks(execute=False):
+            for _ in range(3):
+                self.create_video()
+
+        with mock.patch('video_app.api.outbox.push_entries_to_redis') as push:
+            with self.captureOnCommitCallbacks(execute=True):
+                video = self.create_video()
+
+        self.assertEqual([e.payload["video_id"] for e in push.call_args.args[0]], [video.id])
+        self.assertEqual(JobOutbox.objects.filter(dispatched_at__isnull=True).count(), 3)
+
+    def test_redis_outage_leaves_jobs_for_the_relay(self):
+        with self.captureOnCommitCallbacks(execute=False):
+            for _ in range(3):
+                self.create_video()
+
+        with mock.patch('video_app.api.outbox.push_entries_to_redis', side_effect=RedisError('down')):
+            self.assertEqual(dispatch_pending_jobs(), 0)
+        self.assertEqual(JobOutbox.objects.filter(dispatched_at__isnull=True, attempts=1).count(), 3)
+
+        with mock.patch('video_app.api.outbox.push_entries_to_redis') as push:
+            self.assertEqual(dispatch_pending_jobs(batch_size=2), 3)
+        self.assertEqual(push.call_count, 2)
+
+
+@unittest.skipUnless(fakeredis, "fakeredis is not installed")
+@override_settings(THUMBNAIL_CACHE_MAX_BYTES=100)
+class ThumbnailVariantTests(TestCase):
+    def setUp(self):
+        media_override = self.settings(MEDIA_ROOT=tempfile.mkdtemp())
+        media_override.enable()
+        self.addCleanup(media_override.disable)
+        self.source = get_media_root() / 'thumbnails' / 'poster.jpg'
+        self.source.parent.mkdir(parents=True, exist_ok=True)
+        self.source.write_bytes(b'jpeg')
+        patcher = mock.patch('video_app.api.thumbnails.get_redis_connection', return_value=fakeredis.FakeRedis())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def fake_render(self, delay=0.0, failing=(), error="ffmpeg failed: (code 1) Unknown encoder 'libaom-av1'"):
+        def render(source_path, target, width, fmt):
+            if fmt['ext'] in failing:
+                raise RuntimeError(error)
+            time.sleep(delay)
+            target.parent.mkdir(parents=True, exist_ok=True)
+            target.write_bytes(b'x' * 60)
+        return mock.patch.object(thumbnails, 'render_thumbnail_variant', side_effect=render)
+
+    def test_failed_format_is_remembered_and_skipped(self):
+        with self.fake_render(failing=('avif',)) as render:
+            for video_id in (1, 2):
+                path, mime = thumbnails.get_thumbnail_variant(video_id, self.source, 320, 'image/avif,image/webp')
+                self.assertEqual(mime, 'image/webp')
+
+        self.assertEqual([c.args[3]['ext'] for c in render.call_args_list], ['avif', 'webp', 'webp'])
+
+    def test_bad_source_only_skips_its_own_variant(self):
+        with self.fake_render(failing=('avif',), error='ffmpeg failed: (code 1) Invalid data found') as render:
+            for video_id in (1, 1, 2):
+                path, mime = thumbnails.get_thumbnail_variant(video_id, self.source, 320, 'image/avif,image/webp')
+                self.assertEqual(mime, 'image/webp')
+
+        self.assertEqual([c.args[3]['ext'] for c in render.call_args_list], ['avif', 'webp', 'avif', 'webp'])
+
+    def test_concurrent_misses_render_once(self):
+        results = []
+        with self.fake_render(delay=0.2) as render:
+            workers = [threading.Thread(target=lambda: results.append(
+                thumbnails.get_thumbnail_variant(1, self.source, 320, 'image/webp'))) for _ in range(3)]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+
+        self.assertEqual(render.call_count, 1)
+        self.assertEqual(len({path for path, _ in results}), 1)
+
+    def test_eviction_runs_in_the_periodic_job(self):
+        with self.fake_render():
+            for video_id in (1, 2):
+                thumbnails.get_thumbnail_variant(video_id, self.source, 320, '')
+        self.assertEqual(len(list(thumbnails.get_thumbnail_cache_dir().glob('*/*'))), 2)
+
+        self.assertEqual(tasks.evict_thumbnail_cache(build_job_payload())['reclaimed_bytes'], 60)
+        self.assertEqual(len(list(thumbnails.get_thumbnail_cache_dir().glob('*/*'))), 1)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class IngestVideosTests(TestCase):
+    def test_invalid_manifest_rows_are_reported_and_skipped(self):
+        source_dir = Path(tempfile.mkdtemp())
+        (source_dir / 'good.mp4').write_bytes(b'video')
+        manifest = source_dir / 'manifest.jsonl'
+        manifest.write_text("\n".join([
+            json.dumps({"path": "good.mp4", "title": "Good", "category": "Drama"}),
+            json.dumps({"title": "No path"}),
+            "{not json",
+            json.dumps({"path": "missing.mp4"}),
+        ]) + "\n")
+
+        err = StringIO()
+        with mock.patch('video_app.management.commands.ingest_videos.Command.wait_for_capacity'):
+            call_command('ingest_videos', str(manifest), stdout=StringIO(), stderr=err)
+
+        self.assertEqual(list(Video.objects.values_list('title', flat=True)), ['Good'])
+        self.assertEqual(JobOutbox.objects.count(), 1)
+        for line in ("line 2: missing path", "line 3: invalid JSON", "line 4: file not found"):
+            self.assertIn(line, err.getvalue())
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class CrashSafeTranscodeTests(TestCase):
+    def setUp(self):
+        with self.captureOnCommitCallbacks(execute=False):
+            self.video = Video.objects.create(
+                title='Test', description='Test', category='Drama', video_file='videos/test.mp4')
+        self.payload = build_job_payload(video_id=self.video.id, variant='720p', probe=None, with_previews=False)
+        self.variant_dir = get_hls_root_dir(self.video.id) / '720p'
+
+    def fake_transcode(self, fail=False):
+        def transcode(output_dir, **kwargs):
+            (output_dir / 'seg_00000.ts').write_bytes(b'partial')
+            if fail:
+                raise RuntimeError('worker died')
+            (output_dir / 'index.m3u8').write_text('#EXTM3U\n')
+            return str(output_dir / 'index.m3u8')
+        return transcode
+
+    def test_failed_attempt_publishes_nothing_and_retry_completes(self):
+        with mock.patch.object(tasks, 'transcode_variant_to_hls', side_effect=self.fake_transcode(fail=True)):
+            with self.assertRaises(RuntimeError):
+                tasks.process_single_variant(self.payload)
+
+        self.assertFalse(self.variant_dir.exists())
+        self.assertEqual(list(get_hls_root_dir(self.video.id).iterdir()), [])
+        job = RenditionJob.objects.get(video=self.video, name='720p')
+        self.assertEqual((job.status, job.attempts), ('failed', 1))
+
+        with mock.patch.object(tasks, 'transcode_variant_to_hls', side_effect=self.fake_transcode()):
+            tasks.process_single_variant(self.payload)
+
+        self.assertTrue((self.variant_dir / 'index.m3u8').exists())
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('complete', 2))
+
+        with mock.patch.object(tasks, 'transcode_variant_to_hls') as transcode:
+            self.assertTrue(tasks.process_single_variant(self.payload)['skipped'])
+        transcode.assert_not_called()
+
+    def test_sweeper_removes_abandoned_staging_dirs(self):
+        staging_dir = make_staging_dir(get_hls_root_dir(self.video.id), '1080p')
+        os.utime(staging_dir, (0, 0))
+
+        result = tasks.sweep_transcode_orphans(build_job_payload())
+
+        self.assertEqual(result['removed_dirs'], 1)
+        self.assertFalse(staging_dir.exists())
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), STORAGE_DELETE_BATCH_PAUSE=0, STORAGE_RECONCILE_GRACE=0)
+class StorageReaperTests(TestCase):
+    def setUp(self):
+        patcher = mock.patch('video_app.api.tasks.delete_total_viewers')
+        self.delete_total_viewers = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def create_video(self):
+        with self.captureOnCommitCallbacks(execute=False):
+            return Video.objects.create(
+                title='Test', description='Test', category='Drama', video_file='videos/test.mp4')
+
+    def write_file(self, relative_path, size=10):
+        path = get_media_root() / relative_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b'x' * size)
+        return path
+
+    def test_delete_is_queued_and_runs_in_background(self):
+        video = self.create_video()
+        source = self.write_file('videos/test.mp4')
+        segments = [self.write_file(f'hls/{video.id}/480p/seg_{i:05d}.ts') for i in range(3)]
+
+        with self.captureOnCommitCallbacks(execute=False):
+            video.delete()
+
+        self.assertTrue(source.exists())
+        entry = JobOutbox.objects.latest('id')
+        self.assertEqual(entry.func, 'video_app.api.tasks.delete_video_storage')
+        self.assertEqual(entry.max_retries, 3)
+
+        result = tasks.delete_video_storage(entry.payload)
+
+        self.assertEqual(result['removed_files'], 4)
+        self.assertFalse(source.exists() or any(s.exists() for s in segments))
+        self.assertFalse(get_hls_root_dir(video.id).exists())
+        self.delete_total_viewers.assert_called_once_with(entry.payload['video_id'])
+
+    def test_retry_removes_trash_left_by_failed_delete(self):
+        video = self.create_video()
+        leftover = self.write_file(f'hls/.staging-trash-{video.id}-abc123/480p/seg_00001.ts')
+
+        result = tasks.delete_video_storage(build_job_payload(video_id=video.id, files=[]))
+
+        self.assertEqual(result['removed_files'], 1)
+        self.assertFalse(leftover.parent.parent.exists())
+
+    def test_sweeper_and_reconcile_remove_stale_trash(self):
+        stale = [self.write_file(f'hls/.staging-trash-{n}-abc123/480p/seg_00001.ts').parent.parent for n in (1, 2)]
+        for path in stale:
+            os.utime(path, (0, 0))
+
+        self.assertEqual(tasks.sweep_transcode_orphans(build_job_payload())['removed_dirs'], 2)
+        self.assertFalse(any(path.exists() for path in stale))
+
+        trash = self.write_file('hls/.staging-trash-3-abc123/index.m3u8', size=40).parent
+        os.utime(trash, (0, 0))
+        report = tasks.reconcile_media_storage(build_job_payload(reclaim=True))
+        self.assertEqual(report['orphans']['trash'], {"count": 1, "bytes": 40})
+        self.assertFalse(trash.exists())
+
+    def test_reconcile_reports_and_reclaims_orphans(self):
+        video = self.create_video()
+        kept = self.write_file('videos/test.mp4')
+        orphan_file = self.write_file('videos/orphan.mp4', size=100)
+        orphan_tree = self.write_file(f'hls/{video.id + 1000}/480p/index.m3u8', size=50)
+
+        report = tasks.reconcile_media_storage(build_job_payload(reclaim=False))
+        self.assertEqual(report['orphaned_bytes'], 150)
+        self.assertTrue(orphan_file.exists())
+
+        tasks.reconcile_media_storage(build_job_payload(reclaim=True))
+        self.assertTrue(kept.exists())
+        self.assertFalse(orphan_file.exists() or orphan_tree.exists())
+
+
+class MetricsTests(TestCase):
+    def scrape(self, **extra):
+        with mock.patch('core.metrics.generate_latest', return_value=b''):
+            return self.client.get('/metrics', **extra).status_code
+
+    @override_settings(METRICS_TOKEN='')
+    def test_without_token_only_direct_internal_scrapes_are_allowed(self):
+        self.assertEqual(self.scrape(REMOTE_ADDR='10.1.2.3'), 200)
+        self.assertEqual(self.scrape(REMOTE_ADDR='203.0.113.7'), 403)
+        self.assertEqual(self.scrape(REMOTE_ADDR='10.1.2.3', HTTP_X_FORWARDED_FOR='203.0.113.7'), 403)
+        with override_settings(METRICS_ALLOWED_NETWORKS=[]):
+            self.assertEqual(self.scrape(REMOTE_ADDR='127.0.0.1'), 403)
+
+    @override_settings(METRICS_TOKEN='scrape-secret')
+    def test_token_is_required_when_configured(self):
+        self.assertEqual(self.scrape(REMOTE_ADDR='127.0.0.1'), 403)
+        self.assertEqual(self.scrape(HTTP_AUTHORIZATION='Bearer wrong'), 403)
+        self.assertEqual(self.scrape(REMOTE_ADDR='203.0.113.7', HTTP_AUTHORIZATION='Bearer scrape-secret'), 200)
+
+    def test_middleware_records_latency_and_queries_per_view(self):
+        from prometheus_client import REGISTRY
+        user = User.objects.create_user('metrics@example.com', 'metrics@example.com', 'secret-pass-123')
+        self.client.cookies['access_token'] = str(AccessToken.for_user(user))
+
+        def sample(name):
+            return REGISTRY.get_sample_value(name, {'view': 'VideoListView'}) or 0
+
+        before = sample('videoflix_request_db_queries_count'), sample('videoflix_request_db_queries_sum')
+        self.assertEqual(self.client.get('/api/video/').status_code, 200)
+
+        self.assertEqual(sample('videoflix_request_db_queries_count'), before[0] + 1)
+        self.assertGreaterEqual(sample('videoflix_request_db_queries_sum'), before[1] + 1)
+        self.assertIsNotNone(REGISTRY.get_sample_value(
+            'videoflix_request_duration_seconds_count', {'view': 'VideoListView', 'method': 'GET', 'status': '200'}))
+
+
+@unittest.skipUnless(fakeredis, "fakeredis is not installed")
+class ProfilingTests(TestCase):
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis()
+        patcher = mock.patch('core.profiling.get_redis_connection', return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @override_settings(PROFILING_MAX_STATEMENTS=2)
+    def test_sql_profile_is_trimmed_and_expires(self):
+        from core.profiling import store_profile
+        store_profile("VideoListView", {}, {f"SELECT {i}": float(i) for i in range(5)})
+
+        key = 'videoflix:profile:sql:VideoListView'
+        self.assertEqual(self.redis.zrange(key, 0, -1), [b"SELECT 3", b"SELECT 4"])
+        self.assertGreater(self.redis.ttl(key), 0)
+
+    def test_token_profiles_request(self):
+        from core.profiling import make_profile_token
+        user = User.objects.create_user('profile@example.com', 'profile@example.com', 'secret-pass-123')
+        self.client.cookies['access_token'] = str(AccessToken.for_user(user))
+
+        self.client.get('/api/video/', HTTP_X_PROFILE_TOKEN=make_profile_token())
+
+        self.assertEqual(self.redis.hget('videoflix:profile:samples', 'VideoListView'), b"1")
+        self.assertTrue(self.redis.zcard('videoflix:profile:sql:VideoListView'))
+
+    def test_in_lists_of_any_length_are_one_statement(self):
+        from core.profiling import QueryRecorder
+        recorder = QueryRecorder()
+        for ids in ([1], [1, 2, 3]):
+            recorder(lambda *args: None, f"SELECT * FROM t WHERE id IN ({', '.join(['%s'] * len(ids))})", ids, False, {})
+        self.assertEqual(list(recorder.queries), ["SELECT * FROM t WHERE id IN (...)"])
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), ALLOWED_HOSTS=['.bench.example'])
+class StreamingBenchmarkTests(TransactionTestCase):
+    def test_bench_reports_latency_and_queries_per_endpoint(self):
+        out = StringIO()
+        with mock.patch('video_app.api.outbox.dispatch_pending_jobs'), \
+                mock.patch('video_app.api.views.record_segment_hit'):
+            # One login per minute per IP: viewers must not share the bench's address.
+            rates = {**settings.REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'], 'login': '1/min'}
+            with override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': rates}):
+                call_command('bench_streaming', videos=2, viewers=2, segments=2, segment_kb=1, speed=0, stdout=out)
+
+        report = json.loads(out.getvalue())
+        self.assertEqual(set(report['endpoints']), {'login', 'catalogue', 'playlist', 'segment'})
+        self.assertEqual(report['endpoints']['segment']['requests'], 4)
+        self.assertEqual(sum(e['errors'] for e in report['endpoints'].values()), 0)
+        self.assertIn('p99_ms', report['endpoints']['catalogue'])
+        self.assertGreaterEqual(report['db_connections']['opened'], 2)
+
+    def test_bench_fails_when_requests_error(self):
+        out = StringIO()
+        with mock.patch('video_app.api.outbox.dispatch_pending_jobs'), \
+                self.assertRaisesMessage(CommandError, "Requests failed: catalogue 1"):
+            call_command('bench_streaming', videos=1, viewers=1, segments=1, segment_kb=1, speed=0,
+                         host='other.example', stdout=out)
+        self.assertEqual(json.loads(out.getvalue())['endpoints']['login']['errors'], 1)
+
+
+@unittest.skipUnless(fakeredis, "fakeredis is not installed")
+class WatchProgressTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('viewer@example.com', 'viewer@example.com', 'secret-pass-123')
+        self.client.cookies['access_token'] = str(AccessToken.for_user(self.user))
+        self.video = Video.objects.create(title="Test", description="", category="Test", video_file="videos/test.mp4")
+        patcher = mock.patch('video_app.api.progress.get_redis_connection', return_value=fakeredis.FakeRedis())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def send_heartbeat(self, position):
+        return self.client.post(f'/api/video/{self.video.id}/progress/',
+                                {'position': position, 'duration': 600}, content_type='application/json')
+
+    def test_heartbeats_are_buffered_until_flush(self):
+        with self.assertNumQueries(1):
+            self.send_heartbeat(30)
+        self.assertEqual(self.send_heartbeat(120).status_code, 204)
+        self.assertFalse(WatchProgress.objects.exists())
+
+        response = self.client.get('/api/video/continue-watching/')
+        self.assertEqual([(v['id'], v['position']) for v in response.json()], [(self.video.id, 120)])
+
+        report = tasks.flush_watch_progress(build_job_payload())
+        self.assertEqual(report, {"users": 1, "rows": 1})
+        self.assertEqual(WatchProgress.objects.get(user=self.user, video=self.video).position, 120)
+
+        self.send_heartbeat(240)
+        tasks.flush_watch_progress(build_job_payload())
+        self.assertEqual(WatchProgress.objects.get(user=self.user, video=self.video).position, 240)
+
+    def test_continue_watching_falls_back_to_database(self):
+        WatchProgress.objects.create(user=self.user, video=self.video, position=90, duration=600,
+                                     updated_at=timezone.now())
+
+        response = self.client.get('/api/video/continue-watching/')
+        self.assertEqual(response.json()[0]['position'], 90)
+
+
+@unittest.skipUnless(fakeredis, "fakeredis is not installed")
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'view-count-tests'},
+})
+class ViewCountTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.videos = [
+            Video.objects.create(title=f"Video {i}", description="", category="Test", video_file="videos/test.mp4")
+            for i in range(2)
+        ]
+        for video in self.videos:
+            segment = get_hls_root_dir(video.id) / "480p" / "seg_00000.ts"
+            segment.parent.mkdir(parents=True, exist_ok=True)
+            segment.write_bytes(b"ts")
+        self.redis = fakeredis.FakeRedis()
+        for target in ('core.throttling.get_redis_connection', 'video_app.api.view_counts.get_redis_connection'):
+            patcher = mock.patch(target, return_value=self.redis)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        view_counts._pending_hits.clear()
+
+    def watch(self, user, video, segments=2):
+        self.client.cookies['access_token'] = str(AccessToken.for_user(user))
+        self.client.cookies['playback_session'] = f"{user.id:032x}"
+        for _ in range(segments):
+            self.client.get(f'/api/video/{video.id}/480p/seg_00000.ts/')
+
+    def test_segment_hits_roll_up_into_counts_and_trending(self):
+        users = [User.objects.create_user(f'u{i}@example.com', f'u{i}@example.com', 'pw-123456') for i in range(3)]
+        for user in users:
+            self.watch(user, self.videos[1])
+        self.watch(users[0], self.videos[0])
+        view_counts.flush_segment_hits()
+
+        report = tasks.rollup_view_counts(build_job_payload())
+        self.assertEqual(report, {"buckets": 2, "videos": 2})
+        bucket = VideoViewBucket.objects.get(video=self.videos[1])
+        self.assertEqual((bucket.segment_hits, bucket.unique_viewers), (6, 3))
+
+        tasks.rollup_view_counts(build_job_payload())
+        self.videos[1].refresh_from_db()
+        self.assertEqual(self.videos[1].view_count, 3)
+
+        response = self.client.get('/api/video/?ordering=trending')
+        self.assertEqual([v['id'] for v in response.json()], [self.videos[1].id, self.videos[0].id])
+
+    def test_segment_is_served_when_readahead_fails(self):
+        user = User.objects.create_user('u@example.com', 'u@example.com', 'pw-123456')
+        with mock.patch('video_app.api.views.prefetch_next_segments', side_effect=OSError('stale file handle')):
+            self.client.cookies['access_token'] = str(AccessToken.for_user(user))
+            self.client.cookies['playback_session'] = 'a' * 32
+            response = self.client.get(f'/api/video/{self.videos[0].id}/480p/seg_00000.ts/')
+
+        self.assertEqual((response.status_code, b"".join(response.streaming_content)), (200, b"ts"))
+        response.close()
+        self.assertEqual(view_counts._pending_hits[(view_counts.get_bucket(), self.videos[0].id)][0], 1)
+
+    def test_viewer_watching_across_hours_counts_once(self):
+        current = view_counts.get_bucket()
+        view_counts.write_segment_hits({
+            (current - 1, self.videos[0].id): [5, {1}],
+            (current, self.videos[0].id): [5, {1, 2}],
+            (current, self.videos[1].id): [1, {3}],
+            (current - 1, self.videos[1].id): [1, {4}],
+        })
+        view_counts.write_segment_hits({(current - 1, self.videos[1].id): [1, {5}]})
+
+        tasks.rollup_view_counts(build_job_payload())
+        tasks.rollup_view_counts(build_job_payload())
+        self.assertEqual(VideoViewBucket.objects.filter(video=self.videos[0]).count(), 2)
+        self.assertEqual(
+            list(Video.objects.filter(id__in=[v.id for v in self.videos]).order_by('id').values_list('view_count', flat=True)),
+            [2, 3],
+        )
+
+        user = User.objects.create_user('trending@example.com', 'trending@example.com', 'pw-123456')
+        self.client.cookies['access_token'] = str(AccessToken.for_user(user))
+        response = self.client.get('/api/video/?ordering=trending')
+        self.assertEqual([v['id'] for v in response.json()], [self.videos[1].id, self.videos[0].id])
+
+    @override_settings(VIEW_HIT_FLUSH_INTERVAL=3600, VIEW_HIT_FLUSH_MAX_KEYS=2)
+    def test_hits_are_buffered_and_written_in_one_batch(self):
+        with mock.patch.object(self.redis, 'pipeline', wraps=self.redis.pipeline) as pipeline:
+            view_counts.record_segment_hit(self.videos[0].id, 1)
+            view_counts.record_segment_hit(self.videos[0].id, 2)
+            self.assertEqual(pipeline.call_count, 0)
+            view_counts.record_segment_hit(self.videos[1].id, 1)
+            self.assertEqual(pipeline.call_count, 1)
+
+        buckets = {b["video_id"]: b for b in view_counts.read_view_buckets([view_counts.get_bucket()])}
+        self.assertEqual((buckets[self.videos[0].id]["segment_hits"], buckets[self.videos[0].id]["unique_viewers"]), (2, 2))
+        self.assertEqual(buckets[self.videos[1].id]["segment_hits"], 1)
+
+    @override_settings(VIEW_HIT_FLUSH_INTERVAL=0.05)
+    def test_idle_buffer_is_flushed_by_timer(self):
+        view_counts.flush_segment_hits()
+        view_counts.record_segment_hit(self.videos[0].id, 1)
+        self.assertEqual(self.redis.hgetall(view_counts.get_hits_key(view_counts.get_bucket())), {})
+
+        deadline = time.monotonic() + 5
+        while view_counts._pending_hits and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(self.redis.hget(view_counts.get_hits_key(view_counts.get_bucket()), self.videos[0].id), b"1")
+
+
+@unittest.skipUnless(fakeredis, "fakeredis is not installed")
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), TRANSCODE_POLICY='lazy')
+class LazyTranscodeTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('viewer@example.com', 'viewer@example.com', 'secret-pass-123')
+        self.client.cookies['access_token'] = str(AccessToken.for_user(self.user))
+        with mock.patch('video_app.api.signals.enqueue_on_commit'):
+            self.video = Video.objects.create(title="Test", description="", category="Test", video_file="videos/test.mp4")
+        base = get_hls_root_dir(self.video.id) / tasks.HLS_VARIANTS[0]["name"] / "index.m3u8"
+        base.parent.mkdir(parents=True, exist_ok=True)
+        base.write_text("#EXTM3U\n")
+        patcher = mock.patch('video_app.api.renditions.get_redis_connection', return_value=fakeredis.FakeRedis())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_ingest_encodes_only_base_rendition(self):
+        queue = mock.Mock()
+        with mock.patch('video_app.api.tasks.probe_video', return_value={"duration": 10}), \
+                mock.patch('video_app.api.tasks.analyze_complexity', return_value=500), \
+                mock.patch('video_app.api.tasks.django_rq.get_queue', return_value=queue), \
+                mock.patch('video_app.api.tasks.Dependency'):
+            report = tasks.process_video_to_hls(build_job_payload(video_id=self.video.id))
+        self.assertEqual(report["variants_enqueued"], 1)
+
+    def test_concurrent_playlist_requests_trigger_one_encode(self):
+        with mock.patch('video_app.api.outbox.dispatch_pending_jobs'):
+            responses = [self.client.get(f'/api/video/{self.video.id}/1080p/index.m3u8') for _ in range(3)]
+
+        self.assertEqual({r.status_code for r in responses}, {503})
+        self.assertIn('Retry-After', responses[0])
+        entry = JobOutbox.objects.get()
+        self.assertEqual((entry.queue, entry.payload["variant"]), ('high', '1080p'))
+
+    def test_failed_encode_frees_lock_after_last_retry(self):
+        url = f'/api/video/{self.video.id}/1080p/index.m3u8'
+        with mock.patch('video_app.api.outbox.dispatch_pending_jobs'):
+            self.assertEqual(self.client.get(url).status_code, 503)
+        payload = JobOutbox.objects.get().payload
+
+        for retries_left, expected_status, expected_code in ((2, 'pending', 503), (0, 'failed', 404)):
+            with mock.patch.object(tasks, 'transcode_variant_to_hls', side_effect=RuntimeError('encode failed')), \
+                    mock.patch('video_app.api.tasks.get_current_job', return_value=mock.Mock(retries_left=retries_left)), \
+                    self.assertRaises(RuntimeError):
+                tasks.process_single_variant(payload)
+            self.assertEqual(RenditionJob.objects.get(video=self.video, name='1080p').status, expected_status)
+            with mock.patch('video_app.api.outbox.dispatch_pending_jobs'):
+                self.assertEqual(self.client.get(url).status_code, expected_code)
+        self.assertEqual(JobOutbox.objects.count(), 1)
+
+    def test_cold_renditions_are_evicted_but_base_is_kept(self):
+        variant_dir = get_hls_root_dir(self.video.id) / "720p"
+        variant_dir.mkdir()
+        (variant_dir / "index.m3u8").write_text("#EXTM3U\n")
+        for name in ("480p", "720p"):
+            self.client.get(f'/api/video/{self.video.id}/{name}/index.m3u8')
+
+        with override_settings(RENDITION_COLD_AFTER=-1):
+            report = tasks.evict_cold_renditions(build_job_payload())
+
+        self.assertEqual(report["evicted"], 1)
+        self.assertFalse(variant_dir.exists())
+        self.assertTrue((get_hls_root_dir(self.video.id) / "480p" / "index.m3u8").exists())
+
+
+class PerTitleLadderTests(TestCase):
+    def setUp(self):
+        media_override = self.settings(MEDIA_ROOT=tempfile.mkdtemp())
+        media_override.enable()
+        self.addCleanup(media_override.disable)
+
+    def test_ladder_follows_complexity_within_caps(self):
+        probe = {"width": 1280, "height": 720}
+        simple = tasks.build_encoding_ladder(10, probe)
+        busy = tasks.build_encoding_ladder(5000, probe)
+
+        self.assertLess(simple["1080p"]["maxrate"], busy["1080p"]["maxrate"])
+        self.assertEqual(busy["1080p"]["maxrate"], int(5350 * tasks.LADDER_MAX_RATIO))
+        self.assertEqual(simple["480p"]["width"], 854)
+
+    def test_master_playlist_reports_measured_bandwidth(self):
+        video = Video.objects.create(title='Test', description='', category='Drama', video_file='videos/test.mp4')
+        variant_dir = get_hls_root_dir(video.id) / "480p"
+        variant_dir.mkdir(parents=True)
+        (variant_dir / "seg_00000.ts").write_bytes(b"x" * 4000)
+        (variant_dir / "seg_00001.ts").write_bytes(b"x" * 1000)
+        (variant_dir / "index.m3u8").write_text(
+            "#EXTM3U\n#EXTINF:4.0,\nseg_00000.ts\n#EXTINF:2.0,\nseg_00001.ts\n#EXT-X-ENDLIST\n")
+
+        tasks.create_master_playlist(build_job_payload(video_id=video.id))
+
+        master = (get_hls_root_dir(video.id) / "master.m3u8").read_text()
+        self.assertIn("BANDWIDTH=8000,AVERAGE-BANDWIDTH=6666,RESOLUTION=854x480", master)
+
+    def test_master_playlist_references_shared_audio_group(self):
+        video = Video.objects.create(title='Test', description='', category='Drama', video_file='videos/test.mp4')
+        for name, size in (("480p", 4000), ("audio", 400)):
+            rendition_dir = get_hls_root_dir(video.id) / name
+            rendition_dir.mkdir(parents=True)
+            (rendition_dir / "seg_00000.ts").write_bytes(b"x" * size)
+            (rendition_dir / "index.m3u8").write_text("#EXTM3U\n#EXTINF:4.0,\nseg_00000.ts\n#EXT-X-ENDLIST\n")
+
+        tasks.create_master_playlist(build_job_payload(video_id=video.id))
+
+        master = (get_hls_root_dir(video.id) / "master.m3u8").read_text().splitlines()
+        self.assertIn('#EXT-X-MEDIA:TYPE=AUDIO,GROUP-ID="aud",NAME="Default",DEFAULT=YES,AUTOSELECT=YES,'
+                      'URI="audio/index.m3u8"', master)
+        self.assertIn('BANDWIDTH=8800,AVERAGE-BANDWIDTH=8800', master[3])
+        self.assertTrue(master[3].endswith('AUDIO="aud"'))
+        self.assertEqual(master[-1], "audio/index.m3u8")
+
+    def test_master_playlist_is_not_published_without_separate_audio(self):
+        video = Video.objects.create(title='Test', description='', category='Drama', video_file='videos/test.mp4')
+        variant_dir = get_hls_root_dir(video.id) / "480p"
+        variant_dir.mkdir(parents=True)
+        (variant_dir / "seg_00000.ts").write_bytes(b"x" * 4000)
+        (variant_dir / "index.m3u8").write_text("#EXTM3U\n#EXTINF:4.0,\nseg_00000.ts\n#EXT-X-ENDLIST\n")
+
+        with self.assertRaises(RuntimeError):
+            tasks.create_master_playlist(build_job_payload(video_id=video.id, separate_audio=True))
+        self.assertFalse((get_hls_root_dir(video.id) / "master.m3u8").exists())
+
+
+@unittest.skipUnless(fakeredis, "fakeredis is not installed")
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), MAX_CONCURRENT_STREAMS=2)
+class ConcurrentStreamTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_user('viewer@example.com', 'viewer@example.com', 'secret-pass-123')
+        self.client.cookies['access_token'] = str(AccessToken.for_user(user))
+        self.videos = [
+            Video.objects.create(title=f"Video {i}", description="", category="Test", video_file="videos/test.mp4")
+            for i in range(3)
+        ]
+        for video in self.videos:
+            segment = get_hls_root_dir(video.id) / "480p" / "seg_00000.ts"
+            segment.parent.mkdir(parents=True, exist_ok=True)
+            segment.write_bytes(b"ts")
+        for target in ('core.throttling.get_redis_connection', 'video_app.api.view_counts.get_redis_connection'):
+            patcher = mock.patch(target, return_value=fakeredis.FakeRedis())
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def get_segment(self, video, session, address='203.0.113.7'):
+        self.client.cookies['playback_session'] = session
+        return self.client.get(f'/api/video/{video.id}/480p/seg_00000.ts/', REMOTE_ADDR=address).status_code
+
+    def test_third_stream_is_rejected_until_one_goes_idle(self):
+        statuses = [self.get_segment(video, 'a' * 32) for video in self.videos]
+        self.assertEqual(statuses, [200, 200, 429])
+
+        self.assertEqual(self.get_segment(self.videos[0], 'a' * 32), 200)
+
+    def test_streams_are_keyed_by_playback_session_not_address(self):
+        # Two devices behind one NAT watching the same title are two streams.
+        self.assertEqual(self.get_segment(self.videos[0], 'a' * 32), 200)
+        self.assertEqual(self.get_segment(self.videos[0], 'b' * 32), 200)
+        self.assertEqual(self.get_segment(self.videos[0], 'c' * 32), 429)
+        # A device switching networks stays the same stream.
+        self.assertEqual(self.get_segment(self.videos[0], 'a' * 32, address='198.51.100.9'), 200)
+
+    def test_playlist_issues_the_playback_session(self):
+        self.assertEqual(self.client.get(f'/api/video/{self.videos[0].id}/480p/seg_00000.ts/').status_code, 403)
+
+        (get_hls_root_dir(self.videos[0].id) / "480p" / "index.m3u8").write_text("#EXTM3U\n")
+        response = self.client.get(f'/api/video/{self.videos[0].id}/480p/index.m3u8')
+        self.assertRegex(response.cookies['playback_session'].value, r'^[0-9a-f]{32}$')
+        self.assertEqual(self.client.get(f'/api/video/{self.videos[0].id}/480p/seg_00000.ts/').status_code, 200)
+
+
+@unittest.skipUnless(fakeredis, "fakeredis is not installed")
+class WorkerClassTests(unittest.TestCase):
+    def test_high_queue_forks_only_transcodes(self):
+        from rq.worker import Worker
+        from core.worker import DjangoSimpleWorker
+        worker = DjangoSimpleWorker(['high'], connection=fakeredis.FakeRedis())
+
+        with mock.patch.object(Worker, 'fork_work_horse') as fork, mock.patch.object(Worker, 'monitor_work_horse'), \
+                mock.patch.object(DjangoSimpleWorker, 'perform_job') as perform, \
+                mock.patch.object(DjangoSimpleWorker, 'prepare_execution'):
+            for func_name in ('auth_app.api.tasks.send_verification_email', 'video_app.api.tasks.process_single_variant'):
+                worker.execute_job(mock.Mock(func_name=func_name), mock.Mock())
+
+        self.assertEqual(perform.call_count, 1)
+        self.assertEqual(fork.call_count, 1)
+
+
+@override_settings(DATABASE_REPLICAS=['replica0'])
+class ReplicaRouterTests(TestCase):
+    def route(self, request, view):
+        seen = {}
+
+        def get_response(request):
+            seen['db'] = ReplicaRouter().db_for_read(Video)
+            view()
+            seen['db_after'] = ReplicaRouter().db_for_read(Video)
+            return HttpResponse()
+
+        response = ReplicaMiddleware(get_response)(request)
+        return seen, response
+
+    def test_safe_reads_use_replica_until_a_write(self):
+        seen, response = self.route(RequestFactory().get('/api/video/'), lambda: ReplicaRouter().db_for_write(Video))
+        self.assertEqual((seen['db'], seen['db_after']), ('replica0', None))
+        self.assertIn(REPLICA_STICKY_COOKIE, response.cookies)
+
+    def test_sticky_cookie_pins_reads_to_primary(self):
+        request = RequestFactory().get('/api/video/')
+        request.COOKIES[REPLICA_STICKY_COOKIE] = '1'
+        seen, response = self.route(request, lambda: None)
+        self.assertIsNone(seen['db'])
+        self.assertNotIn(REPLICA_STICKY_COOKIE, response.cookies)
+
+    def test_reads_outside_requests_use_primary(self):
+        self.assertIsNone(ReplicaRouter().db_for_read(Video))
+
+    def test_query_counting_wraps_every_alias(self):
+        from core.metrics import execute_wrapper_all
+        aliases = [mock.MagicMock(), mock.MagicMock()]
+        with mock.patch('core.metrics.connections.all', return_value=aliases), execute_wrapper_all(len):
+            pass
+        for conn in aliases:
+            conn.execute_wrapper.assert_called_once_with(len)
+
+
+class ProcessSizingTests(unittest.TestCase):
+    def setUp(self):
+        overrides = ("WEB_CONCURRENCY", "GUNICORN_THREADS", "RQ_DEFAULT_WORKERS", "RQ_HIGH_WORKERS", "FFMPEG_THREADS")
+        patcher = mock.patch.dict(os.environ, {name: "" for name in overrides})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_reserves_encode_cpus_away_from_web_workers(self):
+        plan = plan_processes(cpus=8, memory_mb=16384)
+        self.assertEqual((plan["web_cpus"], plan["encode_cpus"]), (4, 4))
+        self.assertEqual(plan["web_workers"], 9)
+        self.assertEqual(plan["rq_default_workers"] * plan["ffmpeg_threads"], plan["encode_cpus"])
+
+    def test_memory_limit_caps_web_workers(self):
+        plan = plan_processes(cpus=8, memory_mb=2048)
+        self.assertLess(plan["web_workers"], 9)
+        self.assertGreaterEqual(plan["web_workers"], 1)
+
+
+class ImportTimeBudgetTests(unittest.TestCase):
+    def test_web_boot_within_budget_and_defers_task_modules(self):
+        out = StringIO()
+        call_command('profile_imports', target='web', runs=1, limit=5, stdout=out)
+        self.assertIn("Total import time (web)", out.getvalue())
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), LIVE_BLOCKING_POLL_INTERVAL=0.02)
+class LivePlaylistTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('live@example.com', 'live@example.com', 'secret-pass-123')
+        self.client.cookies['access_token'] = str(AccessToken.for_user(self.user))
+        self.video = Video.objects.create(title="Live", description="", category="Live", is_live=True)
+        self.playlist = get_hls_root_dir(self.video.id) / "480p" / "index.m3u8"
+        self.playlist.parent.mkdir(parents=True, exist_ok=True)
+        self.write_playlist(sequence=3, segments=3)
+
+    def write_playlist(self, sequence: int, segments: int):
+        lines = ["#EXTM3U", "#EXT-X-VERSION:6", "#EXT-X-TARGETDURATION:1", f"#EXT-X-MEDIA-SEQUENCE:{sequence}"]
+        for msn in range(sequence, sequence + segments):
+            lines += ["#EXTINF:1.000000,", f"seg_{msn:05d}.ts"]
+        tmp = self.playlist.with_suffix(".tmp")
+        tmp.write_text("\n".join(lines) + "\n")
+        os.replace(tmp, self.playlist)
+
+    def test_live_playlist_is_short_lived_and_advertises_blocking_reload(self):
+        response = self.client.get(f'/api/video/{self.video.id}/480p/index.m3u8')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b"CAN-BLOCK-RELOAD=YES", response.content)
+        self.assertEqual(response['Cache-Control'], 'private, max-age=1')
+        self.assertFalse(JobOutbox.objects.exists())
+
+    def test_blocking_reload_waits_for_next_segment(self):
+        writer = threading.Timer(0.2, self.write_playlist, kwargs={"sequence": 4, "segments": 3})
+        writer.start()
+        start = time.monotonic()
+        response = self.client.get(f'/api/video/{self.video.id}/480p/index.m3u8', {"_HLS_msn": 6})
+        writer.join()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertGreaterEqual(time.monotonic() - start, 0.15)
+        self.assertIn(b"seg_00006.ts", response.content)
+
+    def test_blocking_reload_rejects_far_future_and_times_out(self):
+        response = self.client.get(f'/api/video/{self.video.id}/480p/index.m3u8', {"_HLS_msn": 9})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(f'/api/video/{self.video.id}/480p/index.m3u8', {"_HLS_msn": 6})
+        self.assertEqual(response.status_code, 503)
+
+    def test_waiters_over_the_cap_get_the_current_playlist_without_blocking(self):
+        with override_settings(LIVE_BLOCKING_MAX_WAITERS=0):
+            start = time.monotonic()
+            response = self.client.get(f'/api/video/{self.video.id}/480p/index.m3u8', {"_HLS_msn": 6})
+
+        self.assertLess(time.monotonic() - start, 0.5)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Cache-Control'], 'private, max-age=1')
+        self.assertIn(b"seg_00005.ts", response.content)
+
+
+@unittest.skipUnless(hasattr(os, 'posix_fadvise'), "posix_fadvise is not available")
+class SegmentReadaheadTests(unittest.TestCase):
+    def setUp(self):
+        self.variant_dir = Path(tempfile.mkdtemp())
+        for i in range(4):
+            (self.variant_dir / f"seg_{i:05d}.ts").write_bytes(b"ts")
+        readahead._recent_advice.clear()
+
+    def test_advises_following_segments_once_until_end_of_rendition(self):
+        with override_settings(HLS_READAHEAD_SEGMENTS=5), mock.patch('os.posix_fadvise') as fadvise:
+            self.assertEqual(readahead.prefetch_next_segments(self.variant_dir / "seg_00001.ts"), 2)
+            self.assertEqual(readahead.prefetch_next_segments(self.variant_dir / "seg_00001.ts"), 0)
+        self.assertEqual(fadvise.call_count, 2)
+        self.assertEqual(fadvise.call_args.args[3], os.POSIX_FADV_WILLNEED)
+
+    def test_segment_written_later_is_advised_once_it_exists(self):
+        with override_settings(HLS_READAHEAD_SEGMENTS=1), mock.patch('os.posix_fadvise'):
+            self.assertEqual(readahead.prefetch_next_segments(self.variant_dir / "seg_00003.ts"), 0)
+            (self.variant_dir / "seg_00004.ts").write_bytes(b"ts")
+            self.assertEqual(readahead.prefetch_next_segments(self.variant_dir / "seg_00003.ts"), 1)
+
+
+@unittest.skipUnless(fakeredis, "fakeredis is not installed")
+class QoETelemetryTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_user('qoe@example.com', 'qoe@example.com', 'secret-pass-123')
+        self.client.cookies['access_token'] = str(AccessToken.for_user(user))
+        with mock.patch('video_app.api.signals.enqueue_on_commit'):
+            self.video = Video.objects.create(title="Test", description="", category="Test", video_file="videos/test.mp4")
+        self.redis = fakeredis.FakeRedis()
+        for target in ('core.throttling.get_redis_connection', 'video_app.api.qoe.get_redis_connection'):
+            patcher = mock.patch(target, return_value=self.redis)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def post_beacon(self, events):
+        return self.client.generic('POST', '/api/video/qoe/', gzip.compress(json.dumps(events).encode()),
+                                   content_type='text/plain', HTTP_CONTENT_ENCODING='gzip')
+
+    def test_beacons_are_streamed_per_batch_and_rolled_up_in_bulk(self):
+        events = [
+            {"type": "startup", "video_id": self.video.id, "rendition": "720p", "value": 800},
+            {"type": "rebuffer", "video_id": self.video.id, "rendition": "720p", "value": 1500},
+            {"type": "switch", "video_id": self.video.id, "rendition": "480p"},
+            {"type": "play", "video_id": self.video.id, "rendition": "480p", "value": 30000},
+        ]
+        with self.assertNumQueries(0):
+            response = self.post_beacon(events)
+        self.assertEqual(response.status_code, 202)
+        self.post_beacon(events[:2])
+        self.assertEqual(self.redis.xlen('videoflix:qoe:events'), 2)
+
+        call_command('consume_qoe_events', once=True, block_ms=1, stdout=StringIO())
+
+        rows = {row.rendition: row for row in QoERollup.objects.all()}
+        self.assertEqual((rows["720p"].startups, rows["720p"].startup_ms, rows["720p"].rebuffer_ms), (2, 1600, 3000))
+        self.assertEqual((rows["480p"].switches, rows["480p"].play_ms), (1, 30000))
+        self.assertEqual(self.redis.xpending('videoflix:qoe:events', 'qoe-rollup')["pending"], 0)
+
+    def test_rejects_malformed_batches(self):
+        self.assertEqual(self.post_beacon([{"type": "unknown", "video_id": self.video.id}]).status_code, 400)
+        self.assertEqual(self.client.post('/api/video/qoe/', 'not json', content_type='text/plain').status_code, 400)
+        for value in (float("inf"), float("nan"), 1e30, -5):
+            event = {"type": "play", "video_id": self.video.id, "rendition": "480p", "value": value}
+            self.assertEqual(self.post_beacon([event]).status_code, 400)
+        self.assertEqual(self.post_beacon([{"type": "play", "video_id": 1e30}]).status_code, 400)
+        nested = b"[" * 100_000 + b"]" * 100_000
+        self.assertEqual(self.client.post('/api/video/qoe/', nested, content_type='application/json').status_code, 400)
+
+    def test_poison_beacons_are_dead_lettered_and_the_rest_rolled_up(self):
+        self.redis.xadd('videoflix:qoe:events', {"user": 1, "events": json.dumps([["play", self.video.id, "480p", 10 ** 30]])})
+        self.redis.xadd('videoflix:qoe:events', {"user": 1, "events": json.dumps([["play", self.video.id, "480p", 500]])})
+
+        call_command('consume_qoe_events', once=True, block_ms=1, stdout=StringIO(), stderr=StringIO())
+
+        self.assertEqual(QoERollup.objects.get().play_ms, 500)
+        self.assertEqual(self.redis.xlen('videoflix:qoe:dead'), 1)
+        self.assertEqual(self.redis.xpending('videoflix:qoe:events', 'qoe-rollup')["pending"], 0)
+
+    def test_rollups_for_a_new_bucket_are_added_not_overwritten(self):
+        from video_app.api.qoe import QOE_COUNTER_FIELDS
+        from video_app.api.services import add_qoe_rollups
+        key = (self.video.id, "720p", timezone.now().replace(minute=0, second=0, microsecond=0))
+        counters = {**dict.fromkeys(QOE_COUNTER_FIELDS, 0), "startups": 1, "startup_ms": 700}
+        for _ in range(2):
+            add_qoe_rollups({key: counters}, QOE_COUNTER_FIELDS)
+        row = QoERollup.objects.get()
+        self.assertEqual((row.startups, row.startup_ms), (2, 1400))
+
+
+@unittest.skipUnless(fakeredis, "fakeredis is not installed")
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), HLS_KEY_ROTATION_SEGMENTS=2, CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'segment-encryption-tests'},
+})
+class SegmentEncryptionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        user = User.objects.create_user('keys@example.com', 'keys@example.com', 'secret-pass-123')
+        self.client.cookies['access_token'] = str(AccessToken.for_user(user))
+        with mock.patch('video_app.api.signals.enqueue_on_commit'):
+            self.video = Video.objects.create(title="Test", description="", category="Test", video_file="videos/test.mp4")
+        self.variant_dir = get_hls_root_dir(self.video.id) / "480p"
+        self.variant_dir.mkdir(parents=True)
+        self.segments = {f"seg_{i:05d}.ts": os.urandom(1000 + i) for i in range(3)}
+        lines = ["#EXTM3U", "#EXT-X-VERSION:3", "#EXT-X-TARGETDURATION:4", "#EXT-X-MEDIA-SEQUENCE:0"]
+        for name, data in self.segments.items():
+            (self.variant_dir / name).write_bytes(data)
+            lines += ["#EXTINF:4.000000,", name]
+        (self.variant_dir / "index.m3u8").write_text("\n".join(lines + ["#EXT-X-ENDLIST"]) + "\n")
+        patcher = mock.patch('core.throttling.get_redis_connection', return_value=fakeredis.FakeRedis())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_segments_are_encrypted_with_rotating_keys_served_from_cache(self):
+        from cryptography.hazmat.primitives import padding
+        from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+
+        self.assertEqual(encrypt_hls_variant(self.variant_dir, self.video.id), 3)
+        playlist = (self.variant_dir / "index.m3u8").read_text()
+        self.assertEqual([line for line in playlist.splitlines() if line.startswith("#EXT-X-KEY")], [
+            '#EXT-X-KEY:METHOD=AES-128,URI="../keys/0/"',
+            '#EXT-X-KEY:METHOD=AES-128,URI="../keys/1/"',
+        ])
+
+        response = self.client.get(f'/api/video/{self.video.id}/keys/1/')
+        self.assertEqual(response.status_code, 200)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(f'/api/video/{self.video.id}/keys/1/').content, response.content)
+
+        decryptor = Cipher(algorithms.AES(response.content), modes.CBC((2).to_bytes(16, "big"))).decryptor()
+        unpadder = padding.PKCS7(128).unpadder()
+        data = decryptor.update((self.variant_dir / "seg_00002.ts").read_bytes()) + decryptor.finalize()
+        self.assertEqual(unpadder.update(data) + unpadder.finalize(), self.segments["seg_00002.ts"])
+        self.assertEqual(self.client.get(f'/api/video/{self.video.id}/keys/7/').status_code, 404)